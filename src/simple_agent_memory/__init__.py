@@ -2,6 +2,7 @@ from .short_term import ShortTermMemory
 from .long_term.file_memory import FileMemory
 from .long_term.graph_memory import GraphMemory
 from .maintenance import Maintenance, MaintenanceRunner
+from .llm_cache import SemanticCache
 from .types import MemoryItem, Triplet, Checkpoint, RetrievalResult
 from .tool_instructions import (
     FILE_MEMORY_TOOL_INSTRUCTIONS,
@@ -14,6 +15,7 @@ __all__ = [
     "GraphMemory",
     "Maintenance",
     "MaintenanceRunner",
+    "SemanticCache",
     "MemoryItem",
     "Triplet",
     "Checkpoint",
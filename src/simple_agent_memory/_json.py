@@ -0,0 +1,20 @@
+from __future__ import annotations
+
+import json
+from typing import Any
+
+try:
+    import orjson
+except ImportError:  # optional speedup
+    orjson = None
+
+# orjson.JSONDecodeError subclasses json.JSONDecodeError, so callers keep
+# catching the stdlib exception either way.
+loads = orjson.loads if orjson is not None else json.loads
+
+
+def dumps(obj: Any) -> bytes:
+    # Non-string keys are stringified, as the stdlib does.
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, separators=(",", ":")).encode()
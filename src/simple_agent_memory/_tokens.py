@@ -0,0 +1,24 @@
+from __future__ import annotations
+
+from functools import lru_cache
+
+try:
+    import tiktoken
+except ImportError:  # optional exact counts
+    tiktoken = None
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    try:
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        return None
+
+
+def count_tokens(text: str) -> int:
+    # BPE count with tiktoken, otherwise the ~4 characters per token rule.
+    enc = _encoding() if tiktoken is not None else None
+    if enc is None:
+        return len(text) >> 2
+    return len(enc.encode(text, disallowed_special=()))
@@ -1,27 +1,154 @@
 from __future__ import annotations
 
+import asyncio
+import hashlib
 import json
 import re
 import inspect
-from typing import Any
+import weakref
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any
 
-from .types import LLMCallable
+from . import _json
+from .types import LLMCallable, _is_async_callable
 
+if TYPE_CHECKING:
+    from .llm_cache import SemanticCache
 
-async def invoke(llm: LLMCallable, prompt: str) -> str:
-    result = llm(prompt)
+_FENCE_START = re.compile(r"^```(?:json)?\s*")
+_FENCE_END = re.compile(r"\s*```$")
+# Boolean prompts ask for exactly YES or NO, so only the head of the reply is scanned.
+_YES_RE = re.compile(r"\bYES\b", re.IGNORECASE)
+_YES_SCAN_CHARS = 256
+
+_EXACT_CACHE_SIZE = 512
+# Keyed by _llm_id(llm) so the cache does not keep clients alive; the weak
+# reference stored with each reply guards against a recycled id.
+_EXACT_CACHE: OrderedDict[tuple[Any, str], tuple[weakref.ref, str]] = OrderedDict()
+_INFLIGHT: dict[tuple[Any, str], tuple[asyncio.Task[str], list[int]]] = {}
+
+
+def _strip_fences(raw: str) -> str:
+    cleaned = raw.strip()
+    if cleaned.startswith("```"):
+        cleaned = _FENCE_START.sub("", cleaned, count=1)
+    if cleaned.endswith("```"):
+        cleaned = _FENCE_END.sub("", cleaned, count=1)
+    return cleaned
+
+
+def _prompt_key(prompt: str) -> str:
+    return hashlib.blake2b(prompt.encode(), digest_size=16).hexdigest()
+
+
+def _llm_id(llm: LLMCallable) -> Any:
+    # Bound methods are recreated on each attribute access, so their own id
+    # is neither stable nor unique; the instance and function ids are.
+    if inspect.ismethod(llm):
+        return id(llm.__self__), id(llm.__func__)
+    return id(llm)
+
+
+def _cache_get(llm: LLMCallable, digest: str) -> str | None:
+    key = (_llm_id(llm), digest)
+    entry = _EXACT_CACHE.get(key)
+    if entry is None:
+        return None
+    if entry[0]() != llm:
+        del _EXACT_CACHE[key]
+        return None
+    _EXACT_CACHE.move_to_end(key)
+    return entry[1]
+
+
+def _cache_put(llm: LLMCallable, digest: str, raw: str) -> None:
+    # A bound method (client.complete) is a fresh object on every access, so
+    # a plain weak reference to it would die at once; track its parts instead.
+    try:
+        ref = weakref.WeakMethod(llm) if inspect.ismethod(llm) else weakref.ref(llm)
+    except TypeError:
+        return
+    key = (_llm_id(llm), digest)
+    _EXACT_CACHE[key] = (ref, raw)
+    _EXACT_CACHE.move_to_end(key)
+    if len(_EXACT_CACHE) > _EXACT_CACHE_SIZE:
+        _EXACT_CACHE.popitem(last=False)
+
+
+def _land(key: tuple[Any, str], flight: tuple[asyncio.Task[str], list[int]]) -> None:
+    if _INFLIGHT.get(key) is flight:
+        del _INFLIGHT[key]
+
+
+async def _call(llm: LLMCallable, prompt: str) -> str:
+    if _is_async_callable(llm):
+        result = llm(prompt)
+    else:
+        # Sync clients would block the loop for the whole request.
+        result = await asyncio.to_thread(llm, prompt)
     if inspect.isawaitable(result):
-        return await result
+        result = await result
+    return result
+
+
+async def invoke(llm: LLMCallable, prompt: str, *, cache: bool = False) -> str:
+    digest = _prompt_key(prompt)
+    if cache:
+        cached = _cache_get(llm, digest)
+        if cached is not None:
+            return cached
+    # Concurrent identical calls (e.g. backfills memorizing the same text)
+    # share one in-flight request. It runs as its own task, so cancelling one
+    # caller leaves the others waiting; it is cancelled once none are left.
+    loop = asyncio.get_running_loop()
+    flight_key = (_llm_id(llm), digest)
+    flight = _INFLIGHT.get(flight_key)
+    if flight is None or flight[0].get_loop() is not loop:
+        flight = _INFLIGHT[flight_key] = (loop.create_task(_call(llm, prompt)), [0])
+        flight[0].add_done_callback(lambda _: _land(flight_key, flight))
+    task, waiters = flight
+    waiters[0] += 1
+    try:
+        result = await asyncio.shield(task)
+    finally:
+        waiters[0] -= 1
+        if not waiters[0] and not task.done():
+            _land(flight_key, flight)
+            task.cancel()
+    if cache:
+        _cache_put(llm, digest, result)
     return result
 
 
-async def parse_json_response(llm: LLMCallable, prompt: str, max_retries: int = 2) -> Any:
-    raw = await invoke(llm, prompt)
+async def parse_json_response(
+    llm: LLMCallable,
+    prompt: str,
+    max_retries: int = 2,
+    *,
+    cache: SemanticCache | None = None,
+    cache_key: str | None = None,
+    cache_kind: str = "json",
+    exact_cache: bool = True,
+) -> Any:
+    # cache_key/cache_kind let callers match on the variable inputs alone;
+    # by default the whole prompt is embedded. exact_cache=False skips the
+    # per-prompt reply cache, for LLMs sampled with temperature > 0.
+    if cache_key is None:
+        cache_key = prompt
+    if cache is not None:
+        hit, value = await cache.get(cache_key, kind=cache_kind)
+        if hit:
+            return value
+    # Only a reply that parses is remembered, under the original prompt, so
+    # a malformed first answer is not replayed and a corrected retry is.
+    digest = _prompt_key(prompt)
+    raw = _cache_get(llm, digest) if exact_cache else None
+    remember = exact_cache and raw is None
+    if raw is None:
+        raw = await invoke(llm, prompt)
     for attempt in range(max_retries + 1):
-        cleaned = re.sub(r"^```(?:json)?\s*", "", raw.strip())
-        cleaned = re.sub(r"\s*```$", "", cleaned)
         try:
-            return json.loads(cleaned)
+            value = _json.loads(_strip_fences(raw))
         except json.JSONDecodeError as exc:
             if attempt >= max_retries:
                 raise
@@ -34,8 +161,32 @@ async def parse_json_response(llm: LLMCallable, prompt: str, max_retries: int =
                 f"Invalid response:\n{raw}\n"
             )
             raw = await invoke(llm, retry_prompt)
+            remember = exact_cache
+            continue
+        if remember:
+            _cache_put(llm, digest, raw)
+        if cache is not None:
+            await cache.put(cache_key, value, kind=cache_kind)
+        return value
 
 
-async def parse_bool_response(llm: LLMCallable, prompt: str) -> bool:
-    raw = await invoke(llm, prompt)
-    return "YES" in raw.upper()
+async def parse_bool_response(
+    llm: LLMCallable,
+    prompt: str,
+    *,
+    cache: SemanticCache | None = None,
+    cache_key: str | None = None,
+    cache_kind: str = "bool",
+    exact_cache: bool = True,
+) -> bool:
+    if cache_key is None:
+        cache_key = prompt
+    if cache is not None:
+        hit, value = await cache.get(cache_key, kind=cache_kind)
+        if hit:
+            return value
+    raw = await invoke(llm, prompt, cache=exact_cache)
+    value = _YES_RE.search(raw, 0, _YES_SCAN_CHARS) is not None
+    if cache is not None:
+        await cache.put(cache_key, value, kind=cache_kind)
+    return value
@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+import hashlib
+import inspect
+import json
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+
+from .types import EmbedCallable
+
+
+def _scoped_kind(kind: str, context: str) -> str:
+    # Folds the fixed part of a prompt into the kind, so only the variable
+    # part needs embedding and different contexts never share an entry.
+    return f"{kind}:{hashlib.blake2b(context.encode(), digest_size=16).hexdigest()}"
+
+
+class SemanticCache:
+    def __init__(self, embed: EmbedCallable, threshold: float = 0.95, maxsize: int = 1024):
+        self._embed = embed
+        self._threshold = threshold
+        self._maxsize = maxsize
+        self._vectors: np.ndarray | None = None
+        self._kinds: list[str] = []
+        self._values: list[Any] = []
+        self._next = 0
+        self._last: tuple[str, np.ndarray] | None = None
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    async def get(self, prompt: str, kind: str = "json") -> tuple[bool, Any]:
+        best = self._match(await self._vector(prompt), kind)
+        if best is None:
+            return False, None
+        return True, self._values[best]
+
+    async def put(self, prompt: str, value: Any, kind: str = "json") -> None:
+        vec = await self._vector(prompt)
+        # A prompt that would already hit replaces that entry's value rather
+        # than taking a second slot.
+        best = self._match(vec, kind)
+        if best is not None:
+            self._values[best] = value
+            return
+        if self._vectors is None:
+            self._vectors = np.zeros((self._maxsize, vec.shape[0]), dtype=np.float32)
+        if len(self._values) < self._maxsize:
+            self._vectors[len(self._values)] = vec
+            self._kinds.append(kind)
+            self._values.append(value)
+            return
+        self._vectors[self._next] = vec
+        self._kinds[self._next] = kind
+        self._values[self._next] = value
+        self._next = (self._next + 1) % self._maxsize
+
+    def clear(self) -> None:
+        self._vectors = None
+        self._kinds = []
+        self._values = []
+        self._next = 0
+        self._last = None
+
+    def save(self, path: str | Path) -> None:
+        n = len(self._values)
+        vectors = self._vectors[:n] if self._vectors is not None else np.zeros((0, 0), dtype=np.float32)
+        with open(path, "wb") as f:
+            np.savez(
+                f,
+                vectors=vectors,
+                kinds=np.array(self._kinds, dtype=str),
+                values=np.array([json.dumps(v) for v in self._values], dtype=str),
+            )
+
+    def load(self, path: str | Path) -> None:
+        self.clear()
+        with np.load(path, allow_pickle=False) as data:
+            vectors = data["vectors"]
+            kinds = data["kinds"].tolist()
+            values = [json.loads(v) for v in data["values"].tolist()]
+        keep = min(len(values), self._maxsize)
+        if keep == 0:
+            return
+        self._vectors = np.zeros((self._maxsize, vectors.shape[1]), dtype=np.float32)
+        self._vectors[:keep] = vectors[-keep:]
+        self._kinds = kinds[-keep:]
+        self._values = values[-keep:]
+
+    def _match(self, vec: np.ndarray, kind: str) -> int | None:
+        n = len(self._values)
+        if n == 0:
+            return None
+        scores = self._vectors[:n] @ vec
+        mask = np.fromiter((k == kind for k in self._kinds), dtype=bool, count=n)
+        scores = np.where(mask, scores, -1.0)
+        best = int(np.argmax(scores))
+        return best if scores[best] >= self._threshold else None
+
+    async def _vector(self, prompt: str) -> np.ndarray:
+        # get() and put() for the same prompt run back to back on a miss;
+        # remember the last vector so the prompt is embedded once.
+        if self._last is not None and self._last[0] == prompt:
+            return self._last[1]
+        result = self._embed(prompt)
+        embedding = await result if inspect.isawaitable(result) else result
+        vec = np.asarray(embedding, dtype=np.float32)
+        norm = float(np.sqrt(vec @ vec))
+        if norm:
+            vec = vec / norm
+        self._last = (prompt, vec)
+        return vec
@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+import asyncio
+import atexit
+import importlib.util
+from typing import Any
+
+import httpx
+
+from .. import _json
+
+_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=50, keepalive_expiry=60)
+# HTTP/2 is negotiated via ALPN on TLS hosts; plain-http local servers stay on HTTP/1.1.
+_HTTP2 = importlib.util.find_spec("h2") is not None
+
+_CLIENT: httpx.Client | None = None
+_ASYNC_CLIENT: httpx.AsyncClient | None = None
+_ASYNC_LOOP: asyncio.AbstractEventLoop | None = None
+
+
+def get_client() -> httpx.Client:
+    global _CLIENT
+    if _CLIENT is None or _CLIENT.is_closed:
+        _CLIENT = httpx.Client(timeout=300, limits=_LIMITS, http2=_HTTP2)
+    return _CLIENT
+
+
+async def get_async_client() -> httpx.AsyncClient:
+    # Pooled connections are bound to the loop that opened them, so a new
+    # loop (e.g. a second asyncio.run) gets its own client.
+    global _ASYNC_CLIENT, _ASYNC_LOOP
+    loop = asyncio.get_running_loop()
+    if _ASYNC_CLIENT is None or _ASYNC_CLIENT.is_closed or _ASYNC_LOOP is not loop:
+        _ASYNC_CLIENT = httpx.AsyncClient(timeout=300, limits=_LIMITS, http2=_HTTP2)
+        _ASYNC_LOOP = loop
+    return _ASYNC_CLIENT
+
+
+def _json_request(payload: Any, headers: dict | None) -> dict:
+    return {
+        "content": _json.dumps(payload),
+        "headers": {**(headers or {}), "Content-Type": "application/json"},
+    }
+
+
+def post_json(url: str, payload: Any, headers: dict | None = None, timeout: float = 300) -> Any:
+    resp = get_client().post(url, timeout=timeout, **_json_request(payload, headers))
+    resp.raise_for_status()
+    return _json.loads(resp.content)
+
+
+async def apost_json(url: str, payload: Any, headers: dict | None = None, timeout: float = 300) -> Any:
+    client = await get_async_client()
+    resp = await client.post(url, timeout=timeout, **_json_request(payload, headers))
+    resp.raise_for_status()
+    return _json.loads(resp.content)
+
+
+async def aclose_clients() -> None:
+    global _CLIENT, _ASYNC_CLIENT, _ASYNC_LOOP
+    if _ASYNC_CLIENT is not None and _ASYNC_LOOP is asyncio.get_running_loop():
+        await _ASYNC_CLIENT.aclose()
+    _ASYNC_CLIENT = None
+    _ASYNC_LOOP = None
+    if _CLIENT is not None:
+        _CLIENT.close()
+        _CLIENT = None
+
+
+@atexit.register
+def _close_at_exit() -> None:
+    global _CLIENT, _ASYNC_CLIENT
+    if _CLIENT is not None:
+        _CLIENT.close()
+        _CLIENT = None
+    if _ASYNC_CLIENT is not None and _ASYNC_LOOP is not None:
+        if not _ASYNC_LOOP.is_closed() and not _ASYNC_LOOP.is_running():
+            _ASYNC_LOOP.run_until_complete(_ASYNC_CLIENT.aclose())
+        _ASYNC_CLIENT = None
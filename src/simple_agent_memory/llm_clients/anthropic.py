@@ -3,28 +3,43 @@ from __future__ import annotations
 from typing import Callable, Coroutine
 
 
-def create_anthropic_client(model: str, max_tokens: int = 4096, **kwargs) -> Callable[[str], str]:
+def _content(prompt: str, prompt_cache: bool) -> str | list[dict]:
+    if not prompt_cache:
+        return prompt
+    cache_control = {"type": "ephemeral"}
+    # Prompts rendered from the built-in templates carry their static prefix;
+    # caching only that block lets calls with different inputs share it.
+    prefix = getattr(prompt, "stable_prefix", "")
+    if prefix and len(prefix) < len(prompt) and prompt.startswith(prefix):
+        return [
+            {"type": "text", "text": prefix, "cache_control": cache_control},
+            {"type": "text", "text": prompt[len(prefix):]},
+        ]
+    return [{"type": "text", "text": prompt, "cache_control": cache_control}]
+
+
+def create_anthropic_client(model: str, max_tokens: int = 4096, enable_prompt_cache: bool = False, **kwargs) -> Callable[[str], str]:
     from anthropic import Anthropic
     client = Anthropic(**kwargs)
 
     def call(prompt: str) -> str:
         resp = client.messages.create(
             model=model, max_tokens=max_tokens,
-            messages=[{"role": "user", "content": prompt}],
+            messages=[{"role": "user", "content": _content(prompt, enable_prompt_cache)}],
         )
         return resp.content[0].text
 
     return call
 
 
-def create_anthropic_async_client(model: str, max_tokens: int = 4096, **kwargs) -> Callable[[str], Coroutine]:
+def create_anthropic_async_client(model: str, max_tokens: int = 4096, enable_prompt_cache: bool = False, **kwargs) -> Callable[[str], Coroutine]:
     from anthropic import AsyncAnthropic
     client = AsyncAnthropic(**kwargs)
 
     async def call(prompt: str) -> str:
         resp = await client.messages.create(
             model=model, max_tokens=max_tokens,
-            messages=[{"role": "user", "content": prompt}],
+            messages=[{"role": "user", "content": _content(prompt, enable_prompt_cache)}],
         )
         return resp.content[0].text
 
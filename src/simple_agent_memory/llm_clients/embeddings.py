@@ -1,122 +1,265 @@
 from __future__ import annotations
 
+import asyncio
 import os
-from typing import Callable, Coroutine
+from array import array
+from collections import OrderedDict
+from typing import Awaitable, Callable, Coroutine
+
+import numpy as np
 
 OLLAMA_EMBED_URL = "http://localhost:11434/api/embed"
 LMSTUDIO_EMBED_URL = "http://localhost:1234/v1/embeddings"
-
-
-def create_openai_embedder(model: str, **kwargs) -> Callable[[str], list[float]]:
+OPENROUTER_EMBED_URL = "https://openrouter.ai/api/v1/embeddings"
+DEFAULT_EMBED_CACHE_SIZE = 4096
+
+
+def _ordered(data: list[dict]) -> list[list[float]]:
+    return [d["embedding"] for d in sorted(data, key=lambda d: d.get("index", 0))]
+
+
+def _codec(as_numpy: bool) -> tuple[Callable, Callable]:
+    # Cache entries are compact float32 buffers. With as_numpy the cached
+    # read-only array itself is returned, so hits cost no copy at all.
+    if as_numpy:
+        def store(vec) -> np.ndarray:
+            arr = np.asarray(vec, dtype=np.float32)
+            arr.flags.writeable = False
+            return arr
+
+        return store, lambda arr: arr
+    return (lambda vec: array("f", vec)), (lambda arr: arr.tolist())
+
+
+def _checked(vecs: list[list[float]], texts: list[str]) -> list[list[float]]:
+    if len(vecs) != len(texts):
+        raise ValueError(f"embedder returned {len(vecs)} vectors for {len(texts)} texts")
+    return vecs
+
+
+def _cached(
+    embed_many: Callable[[list[str]], list[list[float]]], maxsize: int, as_numpy: bool = False
+) -> Callable[[str], list[float]]:
+    cache: OrderedDict[str, array | np.ndarray] = OrderedDict()
+    store, load = _codec(as_numpy)
+
+    def cached_embed_many(texts: list[str]) -> list[list[float]]:
+        if maxsize <= 0:
+            vecs = embed_many(texts)
+            return [store(v) for v in vecs] if as_numpy else vecs
+        found: dict[str, array | np.ndarray] = {}
+        missing: list[str] = []
+        for text in dict.fromkeys(texts):
+            vec = cache.get(text)
+            if vec is None:
+                missing.append(text)
+            else:
+                cache.move_to_end(text)
+                found[text] = vec
+        if missing:
+            vecs = _checked(embed_many(missing), missing)
+            for text, vec in zip(missing, vecs):
+                found[text] = cache[text] = store(vec)
+            while len(cache) > maxsize:
+                cache.popitem(last=False)
+        return [load(found[t]) for t in texts]
+
+    def cached_embed(text: str) -> list[float]:
+        return cached_embed_many([text])[0]
+
+    cached_embed.embed_many = cached_embed_many
+    cached_embed.cache_clear = cache.clear
+    return cached_embed
+
+
+def _cached_async(
+    embed_many: Callable[[list[str]], Awaitable[list[list[float]]]], maxsize: int, as_numpy: bool = False
+) -> Callable[[str], Coroutine]:
+    # Futures rather than values, so concurrent callers for the same text
+    # share one in-flight request. Each request runs as its own task, so
+    # cancelling one caller leaves the others waiting; it is cancelled once
+    # none of its waiters are left.
+    cache: OrderedDict[str, asyncio.Future] = OrderedDict()
+    flights: dict[asyncio.Future, tuple[asyncio.Task, list[int], list[str], list[asyncio.Future]]] = {}
+    store, load = _codec(as_numpy)
+
+    def drop(missing: list[str], futures: list[asyncio.Future]) -> None:
+        # Unresolved futures of a cancelled request leave the cache at once,
+        # so later calls start a fresh request instead of joining this one.
+        for text, fut in zip(missing, futures):
+            if not fut.done():
+                fut.cancel()
+                if cache.get(text) is fut:
+                    del cache[text]
+
+    async def fill(missing: list[str], futures: list[asyncio.Future]) -> None:
+        try:
+            vecs = _checked(await embed_many(missing), missing)
+        except Exception as exc:
+            for text, fut in zip(missing, futures):
+                if cache.get(text) is fut:
+                    del cache[text]
+                fut.set_exception(exc)
+                fut.exception()
+            return
+        for fut, vec in zip(futures, vecs):
+            fut.set_result(store(vec))
+
+    async def cached_embed_many(texts: list[str]) -> list[list[float]]:
+        if maxsize <= 0:
+            vecs = _checked(await embed_many(texts), texts)
+            return [store(v) for v in vecs] if as_numpy else vecs
+        loop = asyncio.get_running_loop()
+        futures: dict[str, asyncio.Future] = {}
+        missing: list[str] = []
+        for text in dict.fromkeys(texts):
+            fut = cache.get(text)
+            if fut is not None and fut.get_loop() is loop and not fut.cancelled():
+                cache.move_to_end(text)
+            else:
+                fut = cache[text] = loop.create_future()
+                missing.append(text)
+            futures[text] = fut
+        while len(cache) > maxsize:
+            cache.popitem(last=False)
+
+        if missing:
+            pending = [futures[t] for t in missing]
+            flight = (loop.create_task(fill(missing, pending)), [0], missing, pending)
+            for fut in pending:
+                flights[fut] = flight
+
+            def land(_: asyncio.Task) -> None:
+                for fut in pending:
+                    if flights.get(fut) is flight:
+                        del flights[fut]
+                # A request cancelled before it started never resolves its futures.
+                drop(missing, pending)
+
+            flight[0].add_done_callback(land)
+
+        mine = {id(f): f for f in (flights.get(fut) for fut in futures.values()) if f is not None}
+        for _, waiters, _, _ in mine.values():
+            waiters[0] += 1
+        try:
+            results = {text: await asyncio.shield(fut) for text, fut in futures.items()}
+        finally:
+            for task, waiters, flight_texts, flight_futures in mine.values():
+                waiters[0] -= 1
+                if not waiters[0] and not task.done():
+                    task.cancel()
+                    drop(flight_texts, flight_futures)
+        return [load(results[t]) for t in texts]
+
+    async def cached_embed(text: str) -> list[float]:
+        return (await cached_embed_many([text]))[0]
+
+    cached_embed.embed_many = cached_embed_many
+    cached_embed.cache_clear = cache.clear
+    return cached_embed
+
+
+def create_openai_embedder(model: str, embed_cache_size: int = DEFAULT_EMBED_CACHE_SIZE, as_numpy: bool = False, **kwargs) -> Callable[[str], list[float]]:
     from openai import OpenAI
     client = OpenAI(**kwargs)
 
-    def embed(text: str) -> list[float]:
-        resp = client.embeddings.create(model=model, input=text)
-        return resp.data[0].embedding
+    def embed_many(texts: list[str]) -> list[list[float]]:
+        resp = client.embeddings.create(model=model, input=texts)
+        return [d.embedding for d in sorted(resp.data, key=lambda d: d.index)]
 
-    return embed
+    return _cached(embed_many, embed_cache_size, as_numpy)
 
 
-def create_openai_async_embedder(model: str, **kwargs) -> Callable[[str], Coroutine]:
+def create_openai_async_embedder(model: str, embed_cache_size: int = DEFAULT_EMBED_CACHE_SIZE, as_numpy: bool = False, **kwargs) -> Callable[[str], Coroutine]:
     from openai import AsyncOpenAI
     client = AsyncOpenAI(**kwargs)
 
-    async def embed(text: str) -> list[float]:
-        resp = await client.embeddings.create(model=model, input=text)
-        return resp.data[0].embedding
+    async def embed_many(texts: list[str]) -> list[list[float]]:
+        resp = await client.embeddings.create(model=model, input=texts)
+        return [d.embedding for d in sorted(resp.data, key=lambda d: d.index)]
 
-    return embed
+    return _cached_async(embed_many, embed_cache_size, as_numpy)
 
 
-def create_gemini_embedder(model: str, **kwargs) -> Callable[[str], list[float]]:
+def create_gemini_embedder(model: str, embed_cache_size: int = DEFAULT_EMBED_CACHE_SIZE, as_numpy: bool = False, **kwargs) -> Callable[[str], list[float]]:
     import google.generativeai as genai
     if "api_key" in kwargs:
         genai.configure(api_key=kwargs.pop("api_key"))
 
-    def embed(text: str) -> list[float]:
-        resp = genai.embed_content(model=model, content=text, **kwargs)
+    def embed_many(texts: list[str]) -> list[list[float]]:
+        resp = genai.embed_content(model=model, content=texts, **kwargs)
         return resp["embedding"]
 
-    return embed
+    return _cached(embed_many, embed_cache_size, as_numpy)
 
 
-def create_ollama_embedder(model: str, base_url: str = OLLAMA_EMBED_URL) -> Callable[[str], list[float]]:
-    import httpx
+def create_ollama_embedder(model: str, base_url: str = OLLAMA_EMBED_URL, embed_cache_size: int = DEFAULT_EMBED_CACHE_SIZE, as_numpy: bool = False) -> Callable[[str], list[float]]:
+    from ._http import post_json
 
-    def embed(text: str) -> list[float]:
-        resp = httpx.post(base_url, json={"model": model, "input": text}, timeout=300)
-        resp.raise_for_status()
-        return resp.json()["embeddings"][0]
+    def embed_many(texts: list[str]) -> list[list[float]]:
+        data = post_json(base_url, {"model": model, "input": texts}, timeout=300)
+        return data["embeddings"]
 
-    return embed
+    return _cached(embed_many, embed_cache_size, as_numpy)
 
 
-def create_ollama_async_embedder(model: str, base_url: str = OLLAMA_EMBED_URL) -> Callable[[str], Coroutine]:
-    import httpx
+def create_ollama_async_embedder(model: str, base_url: str = OLLAMA_EMBED_URL, embed_cache_size: int = DEFAULT_EMBED_CACHE_SIZE, as_numpy: bool = False) -> Callable[[str], Coroutine]:
+    from ._http import apost_json
 
-    async def embed(text: str) -> list[float]:
-        async with httpx.AsyncClient() as client:
-            resp = await client.post(base_url, json={"model": model, "input": text}, timeout=300)
-            resp.raise_for_status()
-            return resp.json()["embeddings"][0]
+    async def embed_many(texts: list[str]) -> list[list[float]]:
+        data = await apost_json(base_url, {"model": model, "input": texts}, timeout=300)
+        return data["embeddings"]
 
-    return embed
+    return _cached_async(embed_many, embed_cache_size, as_numpy)
 
 
-def create_lmstudio_embedder(model: str, base_url: str = LMSTUDIO_EMBED_URL) -> Callable[[str], list[float]]:
-    import httpx
+def create_lmstudio_embedder(model: str, base_url: str = LMSTUDIO_EMBED_URL, embed_cache_size: int = DEFAULT_EMBED_CACHE_SIZE, as_numpy: bool = False) -> Callable[[str], list[float]]:
+    from ._http import post_json
 
-    def embed(text: str) -> list[float]:
-        resp = httpx.post(base_url, json={"model": model, "input": text}, timeout=300)
-        resp.raise_for_status()
-        return resp.json()["data"][0]["embedding"]
+    def embed_many(texts: list[str]) -> list[list[float]]:
+        data = post_json(base_url, {"model": model, "input": texts}, timeout=300)
+        return _ordered(data["data"])
 
-    return embed
+    return _cached(embed_many, embed_cache_size, as_numpy)
 
 
-def create_lmstudio_async_embedder(model: str, base_url: str = LMSTUDIO_EMBED_URL) -> Callable[[str], Coroutine]:
-    import httpx
+def create_lmstudio_async_embedder(model: str, base_url: str = LMSTUDIO_EMBED_URL, embed_cache_size: int = DEFAULT_EMBED_CACHE_SIZE, as_numpy: bool = False) -> Callable[[str], Coroutine]:
+    from ._http import apost_json
 
-    async def embed(text: str) -> list[float]:
-        async with httpx.AsyncClient() as client:
-            resp = await client.post(base_url, json={"model": model, "input": text}, timeout=300)
-            resp.raise_for_status()
-            return resp.json()["data"][0]["embedding"]
+    async def embed_many(texts: list[str]) -> list[list[float]]:
+        data = await apost_json(base_url, {"model": model, "input": texts}, timeout=300)
+        return _ordered(data["data"])
 
-    return embed
+    return _cached_async(embed_many, embed_cache_size, as_numpy)
 
 
-def create_openrouter_embedder(model: str, api_key: str | None = None) -> Callable[[str], list[float]]:
-    import httpx
+def create_openrouter_embedder(model: str, api_key: str | None = None, embed_cache_size: int = DEFAULT_EMBED_CACHE_SIZE, as_numpy: bool = False) -> Callable[[str], list[float]]:
+    from ._http import post_json
     key = api_key or os.environ["OPENROUTER_API_KEY"]
 
-    def embed(text: str) -> list[float]:
-        resp = httpx.post(
-            "https://openrouter.ai/api/v1/embeddings",
-            json={"model": model, "input": text},
-            headers={"Authorization": f"Bearer {key}", "Content-Type": "application/json"},
+    def embed_many(texts: list[str]) -> list[list[float]]:
+        data = post_json(
+            OPENROUTER_EMBED_URL,
+            {"model": model, "input": texts},
+            headers={"Authorization": f"Bearer {key}"},
             timeout=120,
         )
-        resp.raise_for_status()
-        return resp.json()["data"][0]["embedding"]
+        return _ordered(data["data"])
 
-    return embed
+    return _cached(embed_many, embed_cache_size, as_numpy)
 
 
-def create_openrouter_async_embedder(model: str, api_key: str | None = None) -> Callable[[str], Coroutine]:
-    import httpx
+def create_openrouter_async_embedder(model: str, api_key: str | None = None, embed_cache_size: int = DEFAULT_EMBED_CACHE_SIZE, as_numpy: bool = False) -> Callable[[str], Coroutine]:
+    from ._http import apost_json
     key = api_key or os.environ["OPENROUTER_API_KEY"]
 
-    async def embed(text: str) -> list[float]:
-        async with httpx.AsyncClient() as client:
-            resp = await client.post(
-                "https://openrouter.ai/api/v1/embeddings",
-                json={"model": model, "input": text},
-                headers={"Authorization": f"Bearer {key}", "Content-Type": "application/json"},
-                timeout=120,
-            )
-            resp.raise_for_status()
-            return resp.json()["data"][0]["embedding"]
-
-    return embed
+    async def embed_many(texts: list[str]) -> list[list[float]]:
+        data = await apost_json(
+            OPENROUTER_EMBED_URL,
+            {"model": model, "input": texts},
+            headers={"Authorization": f"Bearer {key}"},
+            timeout=120,
+        )
+        return _ordered(data["data"])
+
+    return _cached_async(embed_many, embed_cache_size, as_numpy)
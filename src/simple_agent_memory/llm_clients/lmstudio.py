@@ -13,23 +13,20 @@ def _build_payload(model: str, prompt: str) -> dict:
 
 
 def create_lmstudio_client(model: str, base_url: str = LMSTUDIO_BASE_URL) -> Callable[[str], str]:
-    import httpx
+    from ._http import post_json
 
     def call(prompt: str) -> str:
-        resp = httpx.post(base_url, json=_build_payload(model, prompt), timeout=300)
-        resp.raise_for_status()
-        return resp.json()["choices"][0]["message"]["content"]
+        data = post_json(base_url, _build_payload(model, prompt), timeout=300)
+        return data["choices"][0]["message"]["content"]
 
     return call
 
 
 def create_lmstudio_async_client(model: str, base_url: str = LMSTUDIO_BASE_URL) -> Callable[[str], Coroutine]:
-    import httpx
+    from ._http import apost_json
 
     async def call(prompt: str) -> str:
-        async with httpx.AsyncClient() as client:
-            resp = await client.post(base_url, json=_build_payload(model, prompt), timeout=300)
-            resp.raise_for_status()
-            return resp.json()["choices"][0]["message"]["content"]
+        data = await apost_json(base_url, _build_payload(model, prompt), timeout=300)
+        return data["choices"][0]["message"]["content"]
 
     return call
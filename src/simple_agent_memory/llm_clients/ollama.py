@@ -14,23 +14,20 @@ def _build_payload(model: str, prompt: str) -> dict:
 
 
 def create_ollama_client(model: str, base_url: str = OLLAMA_BASE_URL) -> Callable[[str], str]:
-    import httpx
+    from ._http import post_json
 
     def call(prompt: str) -> str:
-        resp = httpx.post(base_url, json=_build_payload(model, prompt), timeout=300)
-        resp.raise_for_status()
-        return resp.json()["message"]["content"]
+        data = post_json(base_url, _build_payload(model, prompt), timeout=300)
+        return data["message"]["content"]
 
     return call
 
 
 def create_ollama_async_client(model: str, base_url: str = OLLAMA_BASE_URL) -> Callable[[str], Coroutine]:
-    import httpx
+    from ._http import apost_json
 
     async def call(prompt: str) -> str:
-        async with httpx.AsyncClient() as client:
-            resp = await client.post(base_url, json=_build_payload(model, prompt), timeout=300)
-            resp.raise_for_status()
-            return resp.json()["message"]["content"]
+        data = await apost_json(base_url, _build_payload(model, prompt), timeout=300)
+        return data["message"]["content"]
 
     return call
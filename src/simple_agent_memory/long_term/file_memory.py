@@ -1,21 +1,82 @@
 from __future__ import annotations
 
+import asyncio
 import inspect
+import re
+import time
+from collections import OrderedDict
 from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Awaitable, TypeVar
 
+import numpy as np
+
+from .._tokens import count_tokens
 from ..llm import invoke, parse_bool_response, parse_json_response
+from ..llm_cache import SemanticCache, _scoped_kind
 from ..prompts import CLASSIFY_ITEMS, EXTRACT_ITEMS, GENERATE_QUERY, SELECT_CATEGORIES, SUFFICIENCY_CHECK
+from ..prompts._template import compile_prompt
 from ..storage.base import Storage
-from ..types import EmbedCallable, LLMCallable, MemoryItem, RetrievalResult, _id, _now
+from ..types import EmbedCallable, Embedding, LLMCallable, MemoryItem, RetrievalResult, _id, _is_async_callable, _now
 from ..vector.base import VectorStore
 from ..tool_instructions import FILE_MEMORY_TOOL_INSTRUCTIONS
 
+_render_classify_items = compile_prompt(CLASSIFY_ITEMS)
+_render_extract_items = compile_prompt(EXTRACT_ITEMS)
+_render_generate_query = compile_prompt(GENERATE_QUERY)
+_render_select_categories = compile_prompt(SELECT_CATEGORIES)
+_render_sufficiency_check = compile_prompt(SUFFICIENCY_CHECK)
+
+_T = TypeVar("_T")
+_HEADING_RE = re.compile(r"\s*#+\s*(.*?)\s*$")
+
+
+def _render_items(items: list[MemoryItem], heading: str = "## Detailed Items") -> str:
+    return heading + "\n" + "\n".join(["- " + i.content for i in items])
+
+
+def _render_resources(resources: list[str]) -> str:
+    return "## Raw Context\n" + "\n---\n".join(resources[:3])
+
+
+def _join_sections(*sections: str) -> str:
+    return "\n\n".join([s for s in sections if s])
+
+
+def _merged_keys(general: dict[str, str], persistent: dict[str, str]) -> list[str]:
+    return sorted({**general, **persistent})
+
+
+def _posix(dt: datetime) -> float:
+    return (dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)).timestamp()
+
+
+def _unit(vec: Embedding) -> np.ndarray:
+    arr = np.asarray(vec, dtype=np.float32)
+    norm = float(np.sqrt(arr @ arr))
+    return arr / norm if norm else arr
+
+
+def _discard(task: asyncio.Task | None) -> None:
+    if task is None:
+        return
+    task.cancel()
+    task.add_done_callback(lambda t: t.cancelled() or t.exception())
+
 
 class FileMemory:
     tool_use_instruction = FILE_MEMORY_TOOL_INSTRUCTIONS
     _RELEVANCE_THRESHOLD = 0.7
+    _FILE_HIT_SCORE = 0.8
     _DECAY_HALF_LIFE_DAYS = 30.0
     _ACCESS_WEIGHT = 0.7
+    _MAX_CONCURRENCY = 16
+    _SUMMARY_VECTOR_CACHE_SIZE = 256
+    _QUERY_VECTOR_CACHE_SIZE = 512
+    _CATEGORY_TTL = 1.0
+    _RETRIEVE_CACHE_SIZE = 64
+    _CLASSIFY_SPLIT_OVER = 16
+    _CLASSIFY_BATCH = 10
 
     def __init__(
         self,
@@ -25,6 +86,11 @@ class FileMemory:
         vector_store: VectorStore | None = None,
         embed: EmbedCallable | None = None,
         tool_mode: bool = False,
+        llm_cache: SemanticCache | None = None,
+        prefetch: bool = True,
+        sufficiency_gate: tuple[float, float] | None = None,
+        retrieve_cache_ttl: float = 0.0,
+        skip_duplicates: bool = False,
     ):
         self.user_id = user_id
         self._storage = storage
@@ -33,7 +99,21 @@ class FileMemory:
         self._llm = llm
         self._vector = vector_store
         self._embed = embed
+        self._embed_is_async = _is_async_callable(embed)
+        self._embed_many = getattr(embed, "embed_many", None)
+        self._embed_many_is_async = _is_async_callable(self._embed_many)
         self._tool_mode = tool_mode
+        self._llm_cache = llm_cache
+        self._prefetch = prefetch
+        self._sufficiency_gate = sufficiency_gate
+        self._category_cache: tuple[float, list[str]] | None = None
+        self._summary_vectors: OrderedDict[tuple[str, str], np.ndarray] = OrderedDict()
+        self._query_vectors: OrderedDict[str, asyncio.Future] = OrderedDict()
+        self._retrieve_cache_ttl = retrieve_cache_ttl
+        if skip_duplicates and getattr(storage, "find_resource", None) is None:
+            raise ValueError("skip_duplicates requires a storage with find_resource")
+        self._skip_duplicates = skip_duplicates
+        self._retrieve_cache: OrderedDict[tuple, tuple[float, str]] = OrderedDict()
 
     async def memorize(
         self,
@@ -41,47 +121,74 @@ class FileMemory:
         *,
         items: list[dict] | None = None,
     ) -> list[MemoryItem]:
-        resource_id = await self._storage.save_resource(self.user_id, text)
+        # Re-ingesting identical text would only re-extract the same items;
+        # agent-supplied items are still stored against the existing resource.
+        existing = await self._storage.find_resource(self.user_id, text) if self._skip_duplicates else None
+        if existing is not None and not self._tool_mode:
+            return []
+        self._retrieve_cache.clear()
+        resource_id = existing or await self._storage.save_resource(self.user_id, text)
         if self._tool_mode:
+            now = _now()
             raw_items = items if items is not None else ([{"content": text, "category": "general"}] if text else [])
-            classified = []
-            for item in raw_items:
-                cat = item.get("category") or item.get("category_hint") or "general"
-                classified.append({"content": item.get("content", ""), "category": cat})
+            mems = [
+                MemoryItem(
+                    id=_id(), user_id=self.user_id, content=item.get("content", ""),
+                    category=item.get("category") or item.get("category_hint") or "general",
+                    source_id=resource_id, created_at=now, accessed_at=now,
+                )
+                for item in raw_items
+            ]
         else:
-            raw_items = await self._extract_items(text)
-            classified = await self._classify_items(raw_items)
-
-        saved_items: list[MemoryItem] = []
-
-        for item in classified:
-            cat = item.get("category", "general")
-            content = item.get("content", "")
-
-            mem = MemoryItem(
-                id=_id(), user_id=self.user_id, content=content,
-                category=cat, source_id=resource_id,
-            )
-            if self._embed and self._vector:
-                result = self._embed(mem.content)
-                mem.embedding = await result if inspect.isawaitable(result) else result
-            await self._storage.save_item(mem)
-            if self._vector and mem.embedding:
-                await self._vector.add(
-                    id=mem.id,
-                    text=mem.content,
-                    embedding=mem.embedding,
-                    metadata={
-                        "user_id": self.user_id,
-                        "category": mem.category,
-                        "type": "item",
-                        "created_at": mem.created_at.isoformat(),
-                        "accessed_at": mem.accessed_at.isoformat(),
-                    },
+            classified = await self._classify_items(await self._extract_items(text))
+            now = _now()
+            mems = [
+                MemoryItem(
+                    id=_id(), user_id=self.user_id, content=item.get("content", ""),
+                    category=item.get("category", "general"), source_id=resource_id,
+                    created_at=now, accessed_at=now,
                 )
-            saved_items.append(mem)
-
-        return saved_items
+                for item in classified
+            ]
+        if self._embed and self._vector and mems:
+            embeddings = await self._embed_batch([mem.content for mem in mems])
+            for mem, embedding in zip(mems, embeddings):
+                mem.embedding = embedding
+
+        sem = asyncio.Semaphore(self._MAX_CONCURRENCY)
+        save_items = getattr(self._storage, "save_items", None)
+        if save_items is not None:
+            await save_items(mems)
+        else:
+            await asyncio.gather(*(self._bounded(sem, self._storage.save_item(mem)) for mem in mems))
+        if self._vector:
+            stamp, ts = now.isoformat(), now.timestamp()
+            base_meta = {
+                "user_id": self.user_id, "type": "item",
+                "created_at": stamp, "accessed_at": stamp,
+                "created_at_ts": ts, "accessed_at_ts": ts,
+            }
+            indexed = [mem for mem in mems if mem.embedding is not None and len(mem.embedding)]
+            metadatas = [
+                {**base_meta, "category": mem.category, "tokens": count_tokens(mem.content)}
+                for mem in indexed
+            ]
+            add_many = getattr(self._vector, "add_many", None)
+            if add_many is not None:
+                await add_many(
+                    [mem.id for mem in indexed],
+                    [mem.content for mem in indexed],
+                    [mem.embedding for mem in indexed],
+                    metadatas,
+                )
+            else:
+                await asyncio.gather(*(
+                    self._bounded(sem, self._vector.add(
+                        id=mem.id, text=mem.content, embedding=mem.embedding, metadata=meta,
+                    ))
+                    for mem, meta in zip(indexed, metadatas)
+                ))
+        return mems
 
     async def retrieve(
         self,
@@ -90,6 +197,27 @@ class FileMemory:
         level: str = "auto",
         categories: list[str] | None = None,
         search_query: str | None = None,
+    ) -> str:
+        if self._retrieve_cache_ttl <= 0:
+            return await self._retrieve(query, level, categories, search_query)
+        key = (level, query, tuple(categories or ()), search_query)
+        cached = self._retrieve_cache.get(key)
+        if cached is not None and time.monotonic() - cached[0] < self._retrieve_cache_ttl:
+            self._retrieve_cache.move_to_end(key)
+            return cached[1]
+        result = await self._retrieve(query, level, categories, search_query)
+        self._retrieve_cache[key] = (time.monotonic(), result)
+        self._retrieve_cache.move_to_end(key)
+        while len(self._retrieve_cache) > self._RETRIEVE_CACHE_SIZE:
+            self._retrieve_cache.popitem(last=False)
+        return result
+
+    async def _retrieve(
+        self,
+        query: str,
+        level: str,
+        categories: list[str] | None,
+        search_query: str | None,
     ) -> str:
         level = self._normalize_level(level)
         semantic_only = level == "semantic"
@@ -106,186 +234,328 @@ class FileMemory:
                 use_llm_query=not self._tool_mode,
             )
 
-        semantic_context = ""
+        # The semantic lookup is independent of the base level, so it runs
+        # alongside it. Access counters from both are written in one batch.
+        semantic_task: asyncio.Task | None = None
         if semantic_after:
-            semantic_context = await self._semantic_context(
+            semantic_task = asyncio.create_task(self._semantic_hits(
                 query,
                 search_query=search_query,
                 use_llm_query=not self._tool_mode,
+            ))
+        # Sections are collected and joined once at the end.
+        parts: list[str] = []
+        touched: list[MemoryItem] = []
+        try:
+            await self._retrieve_base(
+                query, base_level, categories, search_query or query, parts, touched
             )
-
-        def append_semantic(result: str) -> str:
-            if semantic_context:
-                return result + ("\n\n" if result else "") + semantic_context
-            return result
-
-        effective_query = search_query or query
+            if semantic_task is not None:
+                selected, semantic_items = await semantic_task
+                touched.extend(semantic_items)
+                parts.append(self._format_context(selected))
+        except BaseException:
+            _discard(semantic_task)
+            raise
+        await self._touch_items(touched)
+        return _join_sections(*parts)
+
+    async def _retrieve_base(
+        self,
+        query: str,
+        base_level: str,
+        categories: list[str] | None,
+        effective_query: str,
+        parts: list[str],
+        touched: list[MemoryItem],
+    ) -> None:
         if self._tool_mode:
             if base_level == "items" or base_level == "resources":
-                items = await self._storage.search_items(self.user_id, effective_query)
-                if items:
-                    for item in items:
-                        item.access_count += 1
-                        item.accessed_at = _now()
-                        await self._storage.update_item(item)
-                    item_text = "\n".join(f"- {i.content}" for i in items)
-                    result = f"## Retrieved Items\n{item_text}"
-                else:
-                    result = ""
                 if base_level == "resources":
-                    resources = await self._storage.search_resources(self.user_id, effective_query)
-                    if resources:
-                        result = (result + "\n\n") if result else ""
-                        result += "## Raw Context\n" + "\n---\n".join(resources[:3])
-                return append_semantic(result)
+                    items, resources = await asyncio.gather(
+                        self._storage.search_items(self.user_id, effective_query),
+                        self._storage.search_resources(self.user_id, effective_query),
+                    )
+                else:
+                    items, resources = await self._storage.search_items(self.user_id, effective_query), []
+                touched.extend(items)
+                if items:
+                    parts.append(_render_items(items, "## Retrieved Items"))
+                if resources:
+                    parts.append(_render_resources(resources))
+                return
 
             # summaries only
-            cats = categories or await self._storage.list_categories(self.user_id)
-            general: dict[str, str] = {}
-            persistent: dict[str, str] = {}
-            for cat in cats:
-                g = await self._storage.load_category(self.user_id, cat)
-                if g:
-                    general[cat] = g
-                p = await self._storage.load_persistent_category(self.user_id, cat)
-                if p:
-                    persistent[cat] = p
-            result = self._format_summaries(general, persistent) if general or persistent else ""
-            return append_semantic(result)
-
-        all_categories = await self._storage.list_categories(self.user_id)
-        relevant = categories or (await self._select_categories(query, all_categories) if all_categories else [])
-        if not relevant and all_categories:
-            relevant = all_categories
-        general: dict[str, str] = {}
-        persistent: dict[str, str] = {}
-        for cat in relevant:
-            g = await self._storage.load_category(self.user_id, cat)
-            if g:
-                general[cat] = g
-            p = await self._storage.load_persistent_category(self.user_id, cat)
-            if p:
-                persistent[cat] = p
-
-        if base_level == "summaries":
-            result = self._format_summaries(general, persistent)
-            return append_semantic(result)
-
-        if base_level == "items":
-            items = await self._storage.search_items(self.user_id, effective_query)
-            if items:
-                item_text = "\n".join(f"- {i.content}" for i in items)
-                for item in items:
-                    item.access_count += 1
-                    item.accessed_at = _now()
-                    await self._storage.update_item(item)
-                result = self._format_summaries(general, persistent) + f"\n\n## Detailed Items\n{item_text}"
-                return append_semantic(result)
-            result = self._format_summaries(general, persistent)
-            return append_semantic(result)
-
+            cats = categories or await self._list_categories()
+            general, persistent = await self._load_summaries(cats)
+            parts.append(self._format_summaries(general, persistent))
+            return
+
+        # Item/resource searches do not depend on the selected categories, so
+        # they run while categories are chosen and summaries load.
+        search: asyncio.Future | None = None
         if base_level == "resources":
-            items = await self._storage.search_items(self.user_id, effective_query)
-            item_section = ""
-            if items:
-                item_text = "\n".join(f"- {i.content}" for i in items)
-                for item in items:
-                    item.access_count += 1
-                    item.accessed_at = _now()
-                    await self._storage.update_item(item)
-                item_section = f"\n\n## Detailed Items\n{item_text}"
-
-            resources = await self._storage.search_resources(self.user_id, effective_query)
-            if resources:
-                result = (
-                    self._format_summaries(general, persistent)
-                    + item_section
-                    + "\n\n## Raw Context\n"
-                    + "\n---\n".join(resources[:3])
-                )
-                return append_semantic(result)
-            result = self._format_summaries(general, persistent) + item_section
-            return append_semantic(result)
-
-        if general or persistent:
-            if await self._is_sufficient(query, general, persistent):
-                result = self._format_summaries(general, persistent)
-                return append_semantic(result)
+            search = asyncio.gather(
+                self._storage.search_items(self.user_id, effective_query),
+                self._storage.search_resources(self.user_id, effective_query),
+            )
+        elif base_level == "items" or (base_level == "auto" and self._prefetch):
+            # In auto mode most insufficient verdicts fall through to an item
+            # search; the prefetch is dropped if the summaries suffice.
+            search = asyncio.ensure_future(self._storage.search_items(self.user_id, effective_query))
+        try:
+            all_categories = await self._list_categories()
+            relevant = categories or (await self._select_categories(query, all_categories) if all_categories else [])
+            if not relevant and all_categories:
+                relevant = all_categories
+            general, persistent = await self._load_summaries(relevant)
+            cats = _merged_keys(general, persistent)
+            parts.append(self._format_summaries(general, persistent, cats))
+
+            if base_level == "summaries":
+                return
+
+            if base_level == "items":
+                items = await search
+                touched.extend(items)
+                if items:
+                    parts.append(_render_items(items))
+                return
 
-        items = await self._storage.search_items(self.user_id, effective_query)
+            if base_level == "resources":
+                items, resources = await search
+                touched.extend(items)
+                if items:
+                    parts.append(_render_items(items))
+                if resources:
+                    parts.append(_render_resources(resources))
+                return
+
+            if (general or persistent) and await self._is_sufficient(query, general, persistent, cats):
+                _discard(search)
+                return
+        except BaseException:
+            _discard(search)
+            raise
+
+        if search is not None:
+            items = await search
+        else:
+            items = await self._storage.search_items(self.user_id, effective_query)
         if items:
-            item_text = "\n".join(f"- {i.content}" for i in items)
-            for item in items:
-                item.access_count += 1
-                item.accessed_at = _now()
-                await self._storage.update_item(item)
-            result = self._format_summaries(general, persistent) + f"\n\n## Detailed Items\n{item_text}"
-            return append_semantic(result)
+            touched.extend(items)
+            parts.append(_render_items(items))
+            return
 
         resources = await self._storage.search_resources(self.user_id, effective_query)
         if resources:
-            result = (
-                self._format_summaries(general, persistent)
-                + "\n\n## Raw Context\n"
-                + "\n---\n".join(resources[:3])
-            )
-            return append_semantic(result)
+            parts.append(_render_resources(resources))
+
+    async def _embed_batch(self, texts: list[str]) -> list[list[float]]:
+        if self._embed_many is not None:
+            if self._embed_many_is_async:
+                return await self._embed_many(texts)
+            result = self._embed_many(texts)
+            return await result if inspect.isawaitable(result) else result
+
+        sem = asyncio.Semaphore(self._MAX_CONCURRENCY)
+
+        async def one(text: str) -> list[float]:
+            async with sem:
+                return await self._embed_one(text)
+
+        unique = list(dict.fromkeys(texts))
+        vectors = dict(zip(unique, await asyncio.gather(*(one(t) for t in unique))))
+        return [vectors[t] for t in texts]
+
+    async def _query_embedding(self, query: str) -> Embedding:
+        # Tasks rather than values, so the semantic search and the sufficiency
+        # gate share one embedding call when they run concurrently.
+        loop = asyncio.get_running_loop()
+        task = self._query_vectors.get(query)
+        if task is None or task.get_loop() is not loop or task.cancelled():
+            task = self._query_vectors[query] = loop.create_task(self._embed_one(query))
+            while len(self._query_vectors) > self._QUERY_VECTOR_CACHE_SIZE:
+                self._query_vectors.popitem(last=False)
+        else:
+            self._query_vectors.move_to_end(query)
+        try:
+            return await asyncio.shield(task)
+        except Exception:
+            if self._query_vectors.get(query) is task:
+                del self._query_vectors[query]
+            raise
+
+    async def _embed_one(self, text: str) -> Embedding:
+        # Coroutine functions are detected once in __init__; other callables
+        # may still hand back an awaitable (e.g. a partial over an async def).
+        if self._embed_is_async:
+            return await self._embed(text)
+        result = self._embed(text)
+        return await result if inspect.isawaitable(result) else result
 
-        result = self._format_summaries(general, persistent)
-        return append_semantic(result)
+    @staticmethod
+    async def _bounded(sem: asyncio.Semaphore, aw: Awaitable[_T]) -> _T:
+        async with sem:
+            return await aw
+
+    async def _touch_items(self, items: list[MemoryItem]) -> None:
+        if not items:
+            return
+        now = _now()
+        for item in items:
+            item.access_count += 1
+            item.accessed_at = now
+        touch_items = getattr(self._storage, "touch_items", None)
+        if touch_items is not None:
+            await touch_items([item.id for item in items], now)
+            return
+        # Without an in-storage increment, write back the counters bumped above.
+        sem = asyncio.Semaphore(self._MAX_CONCURRENCY)
+        await asyncio.gather(*(self._bounded(sem, self._storage.update_item(item)) for item in items))
+
+    async def _list_categories(self) -> list[str]:
+        # One retrieve/memorize asks for the category list from several places;
+        # categories only change during maintenance, so a short TTL is enough.
+        cached = self._category_cache
+        if cached is not None and time.monotonic() - cached[0] < self._CATEGORY_TTL:
+            return cached[1]
+        categories = await self._storage.list_categories(self.user_id)
+        self._category_cache = (time.monotonic(), categories)
+        return categories
+
+    async def _load_summaries(self, cats: list[str]) -> tuple[dict[str, str], dict[str, str]]:
+        if not cats:
+            return {}, {}
+        load_summaries = getattr(self._storage, "load_summaries", None)
+        if load_summaries is None:
+            return await self._load_summaries_each(cats)
+        rows = await load_summaries(self.user_id, cats)
+        general = {c: rows[c][0] for c in cats if c in rows and rows[c][0]}
+        persistent = {c: rows[c][1] for c in cats if c in rows and rows[c][1]}
+        return general, persistent
+
+    async def _load_summaries_each(self, cats: list[str]) -> tuple[dict[str, str], dict[str, str]]:
+        # A category that fails to load is left out rather than failing the retrieve.
+        loaded = await asyncio.gather(
+            *(self._storage.load_category(self.user_id, c) for c in cats),
+            *(self._storage.load_persistent_category(self.user_id, c) for c in cats),
+            return_exceptions=True,
+        )
+        general = {c: g for c, g in zip(cats, loaded[:len(cats)]) if g and isinstance(g, str)}
+        persistent = {c: p for c, p in zip(cats, loaded[len(cats):]) if p and isinstance(p, str)}
+        return general, persistent
 
     async def _extract_items(self, text: str) -> list[dict]:
-        return await parse_json_response(self._llm, EXTRACT_ITEMS.format(text=text))
+        return await parse_json_response(self._llm, _render_extract_items(text=text))
 
     async def _classify_items(self, items: list[dict]) -> list[dict]:
-        categories = await self._storage.list_categories(self.user_id)
+        categories = await self._list_categories()
         if not categories and all("category_hint" in i for i in items):
             for i in items:
                 i["category"] = i.get("category_hint", "general")
             return items
 
-        items_text = "\n".join(f'- {i.get("content", "")}' for i in items)
         cat_text = ", ".join(categories) if categories else "(none yet — create new ones)"
-        result = await parse_json_response(
-            self._llm, CLASSIFY_ITEMS.format(categories=cat_text, items=items_text)
-        )
-        return result
+        # Long extractions are classified as parallel shorter prompts.
+        if len(items) > self._CLASSIFY_SPLIT_OVER:
+            batches = [items[i:i + self._CLASSIFY_BATCH] for i in range(0, len(items), self._CLASSIFY_BATCH)]
+        else:
+            batches = [items]
+        results = await asyncio.gather(*(
+            parse_json_response(
+                self._llm,
+                _render_classify_items(
+                    categories=cat_text,
+                    items="\n".join([f'- {i.get("content", "")}' for i in batch]),
+                ),
+            )
+            for batch in batches
+        ))
+        if len(results) == 1:
+            return results[0]
+        return [item for result in results for item in result]
 
     async def _select_categories(self, query: str, categories: list[str]) -> list[str]:
         cat_text = ", ".join(categories)
         result = await parse_json_response(
-            self._llm, SELECT_CATEGORIES.format(query=query, categories=cat_text)
+            self._llm,
+            _render_select_categories(query=query, categories=cat_text),
+            cache=self._llm_cache,
+            cache_key=query,
+            cache_kind=_scoped_kind("categories", cat_text),
         )
-        return [c for c in result if c in categories]
-
-    async def _is_sufficient(self, query: str, general: dict[str, str], persistent: dict[str, str]) -> bool:
+        allowed = set(categories)
+        return [c for c in result if isinstance(c, str) and c in allowed]
+
+    async def _is_sufficient(
+        self, query: str, general: dict[str, str], persistent: dict[str, str], cats: list[str] | None = None
+    ) -> bool:
+        if self._sufficiency_gate and self._embed:
+            # Clear hits and misses by embedding similarity skip the LLM call.
+            low, high = self._sufficiency_gate
+            similarity = await self._summary_similarity(query, [*general.items(), *persistent.items()])
+            if similarity >= high:
+                return True
+            if similarity < low:
+                return False
+        if cats is None:
+            cats = _merged_keys(general, persistent)
         parts: list[str] = []
-        for cat in sorted(set(general) | set(persistent)):
-            if cat in general:
-                parts.append(f"### {cat} (general)\n{general[cat]}")
-            if cat in persistent:
-                parts.append(f"### {cat} (persistent)\n{persistent[cat]}")
+        for cat, g, p in zip(cats, map(general.get, cats), map(persistent.get, cats)):
+            if g is not None:
+                parts.append(f"### {cat} (general)\n{g}")
+            if p is not None:
+                parts.append(f"### {cat} (persistent)\n{p}")
         summary_text = "\n\n".join(parts)
+        # Near-identical queries against the same summaries share a verdict.
         return await parse_bool_response(
-            self._llm, SUFFICIENCY_CHECK.format(query=query, summaries=summary_text)
+            self._llm,
+            _render_sufficiency_check(query=query, summaries=summary_text),
+            cache=self._llm_cache,
+            cache_key=query,
+            cache_kind=_scoped_kind("sufficiency", summary_text),
+        )
+
+    async def _summary_similarity(self, query: str, summaries: list[tuple[str, str]]) -> float:
+        if not summaries:
+            return 0.0
+        missing = [key for key in dict.fromkeys(summaries) if key not in self._summary_vectors]
+        query_vec, vectors = await asyncio.gather(
+            self._query_embedding(query),
+            self._embed_batch([text for _, text in missing]) if missing else asyncio.sleep(0, []),
         )
+        for key, vec in zip(missing, vectors):
+            self._summary_vectors[key] = _unit(vec)
+        for key in summaries:
+            self._summary_vectors.move_to_end(key)
+        while len(self._summary_vectors) > self._SUMMARY_VECTOR_CACHE_SIZE:
+            self._summary_vectors.popitem(last=False)
+        matrix = np.stack([self._summary_vectors[key] for key in summaries])
+        return float((matrix @ _unit(query_vec)).max())
 
     @staticmethod
-    def _format_summaries(general: dict[str, str], persistent: dict[str, str]) -> str:
-        parts: list[str] = []
-        for cat in sorted(set(general) | set(persistent)):
-            section_parts: list[str] = []
-            if cat in general:
-                section_parts.append(
-                    "General summary (all items):\n" + FileMemory._clean_summary(cat, general[cat])
-                )
-            if cat in persistent:
-                section_parts.append(
-                    "Persistent summary (long-lived items):\n" + FileMemory._clean_summary(cat, persistent[cat])
-                )
-            if section_parts:
-                parts.append(f"## {cat}\n" + "\n\n".join(section_parts))
-        return "\n\n".join(parts)
+    def _format_summaries(
+        general: dict[str, str], persistent: dict[str, str], cats: list[str] | None = None
+    ) -> str:
+        if cats is None:
+            cats = _merged_keys(general, persistent)
+        sections = map(FileMemory._format_section, cats, map(general.get, cats), map(persistent.get, cats))
+        return "\n\n".join([s for s in sections if s])
+
+    @staticmethod
+    @lru_cache(maxsize=256)
+    def _format_section(category: str, general: str | None, persistent: str | None) -> str:
+        section_parts: list[str] = []
+        if general is not None:
+            section_parts.append("General summary (all items):\n" + FileMemory._clean_summary(category, general))
+        if persistent is not None:
+            section_parts.append(
+                "Persistent summary (long-lived items):\n" + FileMemory._clean_summary(category, persistent)
+            )
+        if not section_parts:
+            return ""
+        return f"## {category}\n" + "\n\n".join(section_parts)
 
     @staticmethod
     def _normalize_level(level: str) -> str:
@@ -303,134 +573,246 @@ class FileMemory:
         use_llm_query: bool,
         max_tokens: int = 2000,
     ) -> str:
+        selected, items = await self._semantic_hits(
+            user_message, search_query=search_query, use_llm_query=use_llm_query, max_tokens=max_tokens
+        )
+        await self._touch_items(items)
+        return self._format_context(selected)
+
+    async def _semantic_hits(
+        self,
+        user_message: str,
+        *,
+        search_query: str | None,
+        use_llm_query: bool,
+        max_tokens: int = 2000,
+    ) -> tuple[list[RetrievalResult], list[MemoryItem]]:
         if search_query is None:
             if use_llm_query:
-                search_query = await invoke(self._llm, GENERATE_QUERY.format(message=user_message))
+                search_query = await self._generate_query(user_message)
             else:
                 search_query = user_message
 
-        candidates = await self._semantic_candidates(search_query)
+        now = _now()
+        candidates = await self._semantic_candidates(search_query, now)
         if not candidates:
-            return ""
+            return [], []
 
         item_map: dict[str, MemoryItem] = {
-            item.id: item for _, item in candidates if item is not None
+            item.id: item for _, item, _ in candidates if item is not None
         }
 
-        scored: list[tuple[float, RetrievalResult]] = []
-        for result, _ in candidates:
-            if result.score < self._RELEVANCE_THRESHOLD:
-                continue
-            scored.append((self._apply_decay(result), result))
-        scored.sort(key=lambda x: x[0], reverse=True)
+        kept = [(result, pre) for result, _, pre in candidates if result.score >= self._RELEVANCE_THRESHOLD]
+        relevant = [result for result, _ in kept]
+        # Keyword hits, and vectors that carry POSIX times, arrive already decayed.
+        decayed = np.fromiter(
+            (np.nan if pre is None else pre for _, pre in kept), dtype=np.float64, count=len(kept)
+        )
+        need = np.flatnonzero(np.isnan(decayed))
+        if len(need):
+            decayed[need] = self._decayed_scores([relevant[i] for i in need], now)
+        tokens = np.fromiter((r.token_est for r in relevant), dtype=np.int64, count=len(relevant))
+        order = self._top_order(decayed, tokens, max_tokens)
+        # Keep the longest prefix of the ranking that fits the budget.
+        order = order[:int(np.searchsorted(np.cumsum(tokens[order]), max_tokens, side="right"))]
 
         selected: list[RetrievalResult] = []
-        token_count = 0
-        for score, mem in scored:
-            tokens = len(mem.text) // 4
-            if token_count + tokens > max_tokens:
-                break
-            mem.score = score
+        for i in order:
+            mem = relevant[i]
+            mem.score = float(decayed[i])
             selected.append(mem)
-            token_count += tokens
-
-        updated: set[str] = set()
-        for mem in selected:
-            if not mem.item_id or mem.item_id in updated:
-                continue
-            item = item_map.get(mem.item_id)
-            if item is None:
-                item = await self._storage.get_item_by_id(mem.item_id)
-            if item:
-                item.access_count += 1
-                item.accessed_at = _now()
-                await self._storage.update_item(item)
-                updated.add(mem.item_id)
 
-        return self._format_context(selected)
+        ids = list(dict.fromkeys(mem.item_id for mem in selected if mem.item_id))
+        missing = [i for i in ids if i not in item_map]
+        if missing:
+            item_map.update((item.id, item) for item in await self._get_items_by_ids(missing))
+        return selected, [item_map[i] for i in ids if i in item_map]
+
+    async def _get_items_by_ids(self, item_ids: list[str]) -> list[MemoryItem]:
+        get_items_by_ids = getattr(self._storage, "get_items_by_ids", None)
+        if get_items_by_ids is not None:
+            return await get_items_by_ids(item_ids)
+        sem = asyncio.Semaphore(self._MAX_CONCURRENCY)
+        found = await asyncio.gather(
+            *(self._bounded(sem, self._storage.get_item_by_id(i)) for i in item_ids)
+        )
+        return [item for item in found if item is not None]
+
+    async def _generate_query(self, message: str) -> str:
+        # Rephrasing is deterministic enough to reuse for repeated and, with
+        # an llm_cache, near-identical messages. The cache embeds the message
+        # itself, not the template around it.
+        if self._llm_cache is not None:
+            hit, value = await self._llm_cache.get(message, kind="query")
+            if hit:
+                return value
+        query = await invoke(self._llm, _render_generate_query(message=message), cache=True)
+        if self._llm_cache is not None:
+            await self._llm_cache.put(message, query, kind="query")
+        return query
 
     async def _semantic_candidates(
-        self, query: str
-    ) -> list[tuple[RetrievalResult, MemoryItem | None]]:
-        results: list[tuple[RetrievalResult, MemoryItem | None]] = []
-
-        items = await self._storage.search_items(self.user_id, query)
-        for item in items:
-            results.append((
+        self, query: str, now: datetime
+    ) -> list[tuple[RetrievalResult, MemoryItem | None, float | None]]:
+        # Keyword and vector lookups are independent, so their latencies
+        # overlap. A failing side is dropped unless both fail.
+        if not (self._vector and self._embed):
+            return await self._file_candidates(query, now)
+        found = await asyncio.gather(
+            self._file_candidates(query, now),
+            self._vector_candidates(query, now),
+            return_exceptions=True,
+        )
+        errors = [r for r in found if isinstance(r, BaseException)]
+        if len(errors) == len(found) or any(not isinstance(e, Exception) for e in errors):
+            raise errors[0]
+        return [c for r in found if not isinstance(r, BaseException) for c in r]
+
+    async def _file_candidates(
+        self, query: str, now: datetime
+    ) -> list[tuple[RetrievalResult, MemoryItem | None, float | None]]:
+        search_decayed = getattr(self._storage, "search_items_decayed", None)
+        if search_decayed is not None:
+            hits = await search_decayed(
+                self.user_id, query,
+                score=self._FILE_HIT_SCORE,
+                half_life_days=self._DECAY_HALF_LIFE_DAYS,
+                access_weight=self._ACCESS_WEIGHT,
+                now=now,
+            )
+        else:
+            # A None score is decayed in Python along with the vector hits.
+            hits = [(item, None) for item in await self._storage.search_items(self.user_id, query)]
+        return [
+            (
                 RetrievalResult(
                     text=item.content,
-                    score=0.8,
+                    score=self._FILE_HIT_SCORE,
                     timestamp=item.created_at,
                     source="file",
                     item_id=item.id,
                     created_at=item.created_at,
                     accessed_at=item.accessed_at,
+                    token_est=item.tokens if item.tokens is not None else -1,
                 ),
                 item,
-            ))
-
-        if self._vector and self._embed:
-            emb_result = self._embed(query)
-            embedding = await emb_result if inspect.isawaitable(emb_result) else emb_result
-            vec_results = await self._vector.search(
-                embedding, top_k=20, filter={"user_id": self.user_id, "type": "item"}
+                decayed,
             )
-            for rid, score, meta in vec_results:
-                created_at = self._parse_ts(meta.get("created_at")) if meta.get("created_at") else None
-                accessed_at = self._parse_ts(meta.get("accessed_at")) if meta.get("accessed_at") else None
-                results.append((
-                    RetrievalResult(
-                        text=meta.get("text", rid),
-                        score=score,
-                        timestamp=created_at or _now(),
-                        source="vector",
-                        item_id=rid if meta.get("type") == "item" else None,
-                        created_at=created_at,
-                        accessed_at=accessed_at,
-                    ),
-                    None,
-                ))
-
+            for item, decayed in hits
+        ]
+
+    async def _vector_candidates(
+        self, query: str, now: datetime
+    ) -> list[tuple[RetrievalResult, MemoryItem | None, float | None]]:
+        embedding = await self._query_embedding(query)
+        vec_results = await self._vector.search(
+            embedding, top_k=20, filter={"user_id": self.user_id, "type": "item"}
+        )
+        if not vec_results:
+            return []
+        # Newer vectors carry POSIX times, which go straight into the decay
+        # arrays. Older ones (NaN here) are decayed from their ISO strings.
+        n = len(vec_results)
+        created_ts = np.fromiter(
+            (meta.get("created_at_ts", np.nan) for _, _, meta in vec_results), dtype=np.float64, count=n
+        )
+        accessed_ts = np.fromiter(
+            (meta.get("accessed_at_ts", np.nan) for _, _, meta in vec_results), dtype=np.float64, count=n
+        )
+        raw = np.fromiter((score for _, score, _ in vec_results), dtype=np.float64, count=n)
+        decayed = self._decay(raw, created_ts, np.fmax(accessed_ts, created_ts), now.timestamp())
+        pre = [None if np.isnan(d) else float(d) for d in decayed.tolist()]
+
+        results: list[tuple[RetrievalResult, MemoryItem | None, float | None]] = []
+        for (rid, score, meta), decayed_score in zip(vec_results, pre):
+            created_at = self._meta_time(meta, "created_at")
+            accessed_at = self._meta_time(meta, "accessed_at")
+            results.append((
+                RetrievalResult(
+                    text=meta.get("text", rid),
+                    score=score,
+                    timestamp=created_at or now,
+                    source="vector",
+                    item_id=rid if meta.get("type") == "item" else None,
+                    created_at=created_at,
+                    accessed_at=accessed_at,
+                    token_est=meta.get("tokens", -1),
+                    # Vectors that carry POSIX times were written with the
+                    # matching timezone-aware ISO string.
+                    timestamp_iso=meta.get("created_at", "") if "created_at_ts" in meta else "",
+                ),
+                None,
+                decayed_score,
+            ))
         return results
 
-    def _apply_decay(self, result: RetrievalResult) -> float:
-        now = _now()
-        created = result.created_at or result.timestamp
-        accessed = result.accessed_at or result.timestamp
-        if created.tzinfo is None:
-            created = created.replace(tzinfo=timezone.utc)
-        if accessed.tzinfo is None:
-            accessed = accessed.replace(tzinfo=timezone.utc)
-        if accessed < created:
-            accessed = created
+    @staticmethod
+    def _top_order(scores: np.ndarray, tokens: np.ndarray, max_tokens: int) -> np.ndarray:
+        # No more than max_tokens // min(tokens) + 1 candidates can be walked
+        # before the budget is hit, so only that many need a full ordering.
+        n = len(scores)
+        smallest = int(tokens.min()) if n else 0
+        k = min(n, max_tokens // smallest + 1) if smallest else n
+        if k >= n:
+            return np.argsort(-scores, kind="stable")
+        top = np.argpartition(-scores, k - 1)[:k]
+        return top[np.lexsort((top, -scores[top]))]
+
+    def _decayed_scores(self, results: list[RetrievalResult], now: datetime) -> np.ndarray:
+        if not results:
+            return np.empty(0)
+        created = np.fromiter(
+            (_posix(r.created_at or r.timestamp) for r in results), dtype=np.float64, count=len(results)
+        )
+        accessed = np.fromiter(
+            (_posix(r.accessed_at or r.timestamp) for r in results), dtype=np.float64, count=len(results)
+        )
+        scores = np.fromiter((r.score for r in results), dtype=np.float64, count=len(results))
+        return self._decay(scores, created, np.maximum(accessed, created), now.timestamp())
+
+    def _decay(
+        self, scores: np.ndarray, created: np.ndarray, accessed: np.ndarray, now_ts: float
+    ) -> np.ndarray:
+        # Times are POSIX seconds; accessed is never earlier than created.
         blended = created + (accessed - created) * self._ACCESS_WEIGHT
-        age_days = (now - blended).total_seconds() / 86400
-        return result.score / (1.0 + age_days / self._DECAY_HALF_LIFE_DAYS)
+        age_days = (now_ts - blended) / 86400
+        return scores / (1.0 + age_days / self._DECAY_HALF_LIFE_DAYS)
 
     @staticmethod
     def _parse_ts(value: str) -> datetime:
         dt = datetime.fromisoformat(value)
         return dt.astimezone(timezone.utc) if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
 
+    @staticmethod
+    def _meta_time(meta: dict, key: str) -> datetime | None:
+        # Newer vectors carry POSIX floats next to the ISO strings.
+        ts = meta.get(f"{key}_ts")
+        if ts is not None:
+            return datetime.fromtimestamp(ts, timezone.utc)
+        value = meta.get(key)
+        return FileMemory._parse_ts(value) if value else None
+
     @staticmethod
     def _format_context(memories: list[RetrievalResult]) -> str:
         if not memories:
             return ""
-        lines = ["=== RELEVANT MEMORIES ===\n"]
-        for m in memories:
-            lines.append(f"[{m.timestamp.isoformat()}] (confidence: {m.score:.2f})")
-            lines.append(f"{m.text}\n")
-        lines.append("=== END MEMORIES ===")
-        return "\n".join(lines)
+        # One string per memory, joined once.
+        body = "".join([
+            f"[{m.timestamp_iso or m.timestamp.isoformat()}] (confidence: {m.score:.2f})\n{m.text}\n\n"
+            for m in memories
+        ])
+        return "=== RELEVANT MEMORIES ===\n\n" + body + "=== END MEMORIES ==="
 
     @staticmethod
+    @lru_cache(maxsize=256)
     def _clean_summary(category: str, text: str) -> str:
+        # Summaries rarely change between retrievals, so results are memoized.
         lines = [l for l in text.strip().splitlines() if l.strip()]
-        while lines:
-            if lines[0].lstrip().startswith("#"):
-                heading = lines[0].lstrip("#").strip().lower()
-                if heading == category.lower():
-                    lines.pop(0)
-                    continue
-            break
-        return "\n".join(lines).strip()
+        target = category.lower()
+        start = 0
+        while start < len(lines):
+            heading = _HEADING_RE.match(lines[start])
+            if heading is None or heading[1].lower() != target:
+                break
+            start += 1
+        return "\n".join(lines[start:]).strip()
@@ -1,19 +1,33 @@
 from __future__ import annotations
 
+import asyncio
+import heapq
 import inspect
 import re
+from collections import OrderedDict
+from dataclasses import replace
 from datetime import datetime, timezone
 
 from ..llm import parse_bool_response, parse_json_response
+from ..llm_cache import SemanticCache, _scoped_kind
 from ..prompts import DETECT_CONFLICT, EXTRACT_TRIPLETS, GRAPH_PREDICATE_FILTER
+from ..prompts._template import compile_prompt
 from ..storage.base import Storage
 from ..tool_instructions import GRAPH_MEMORY_TOOL_INSTRUCTIONS
-from ..types import EmbedCallable, LLMCallable, RetrievalResult, Triplet, _now
+from ..types import EmbedCallable, Embedding, LLMCallable, RetrievalResult, Triplet, _is_async_callable, _now
 from ..vector.base import VectorStore
 
+_render_detect_conflict = compile_prompt(DETECT_CONFLICT)
+_render_extract_triplets = compile_prompt(EXTRACT_TRIPLETS)
+_render_graph_predicate_filter = compile_prompt(GRAPH_PREDICATE_FILTER)
+
 
 class GraphMemory:
     tool_use_instruction = GRAPH_MEMORY_TOOL_INSTRUCTIONS
+    _QUERY_VECTOR_CACHE_SIZE = 512
+    # With only a handful of predicates the LLM filter costs more than it prunes.
+    _PREDICATE_FILTER_MIN = 7
+    _STATUS_RANK = {"current": 0, "uncertain": 1, "past": 2, "past_replaced": 2}
 
     def __init__(
         self,
@@ -23,6 +37,8 @@ class GraphMemory:
         llm: LLMCallable | None = None,
         embed: EmbedCallable | None = None,
         tool_mode: bool = False,
+        llm_cache: SemanticCache | None = None,
+        skip_duplicates: bool = False,
     ):
         self.user_id = user_id
         self._storage = storage
@@ -33,15 +49,28 @@ class GraphMemory:
             raise ValueError("embed callable is required for graph memory")
         self._llm = llm
         self._embed = embed
+        self._embed_is_async = _is_async_callable(embed)
         self._tool_mode = tool_mode
+        self._llm_cache = llm_cache
+        if skip_duplicates and getattr(storage, "find_resource", None) is None:
+            raise ValueError("skip_duplicates requires a storage with find_resource")
+        self._skip_duplicates = skip_duplicates
+        self._query_vectors: OrderedDict[str, Embedding] = OrderedDict()
 
     async def memorize(self, text: str, *, triplets: list[dict] | None = None) -> list[Triplet]:
-        resource_id = await self._storage.save_resource(self.user_id, text)
+        existing = await self._storage.find_resource(self.user_id, text) if self._skip_duplicates else None
+        if existing is not None and not self._tool_mode:
+            return []
+        resource_id = existing or await self._storage.save_resource(self.user_id, text)
         if self._tool_mode:
             raw_triplets = triplets or []
         else:
             raw_triplets = self._clean_triplets(await self._extract_triplets(text))
         saved: list[Triplet] = []
+        # Triplets are written in one batch at the end; conflict checks see
+        # the stored ones plus those accepted earlier in this call.
+        replaced: set[int] = set()
+        now = _now()
 
         for raw in raw_triplets:
             status = str(raw.get("status", "current")).lower()
@@ -49,29 +78,48 @@ class GraphMemory:
                 status = "uncertain"
             triplet = Triplet(
                 subject=raw["subject"], predicate=raw["predicate"],
-                object=raw["object"], timestamp=_now(),
+                object=raw["object"], timestamp=now,
                 active=True,
                 status=status,
             )
 
             if not self._tool_mode and triplet.status == "current":
-                existing = await self._storage.get_triplets(self.user_id, subject=triplet.subject)
-                if existing and await self._has_conflict(triplet, existing):
+                known = await self._storage.get_triplets(self.user_id, subject=triplet.subject)
+                known += [
+                    t for i, t in enumerate(saved)
+                    if i not in replaced and t.subject == triplet.subject
+                ]
+                if known and await self._has_conflict(triplet, known):
                     await self._storage.deactivate_triplet(
                         self.user_id, triplet.subject, triplet.predicate
                     )
+                    replaced.update(
+                        i for i, t in enumerate(saved)
+                        if t.subject == triplet.subject and t.predicate == triplet.predicate
+                    )
 
-            await self._storage.save_triplet(self.user_id, triplet)
             saved.append(triplet)
 
+        await self._save_triplets([
+            replace(t, active=False, status="past_replaced") if i in replaced else t
+            for i, t in enumerate(saved)
+        ])
+
+        if existing is not None:
+            # The conversation vector for this text is already indexed.
+            return saved
+
         embedding = await self._get_embedding(text)
+        stamp, ts = now.isoformat(), now.timestamp()
         await self._vector.add(
             id=resource_id, text=text, embedding=embedding,
             metadata={
                 "user_id": self.user_id,
                 "type": "conversation",
-                "created_at": _now().isoformat(),
-                "accessed_at": _now().isoformat(),
+                "created_at": stamp,
+                "accessed_at": stamp,
+                "created_at_ts": ts,
+                "accessed_at_ts": ts,
             },
         )
         return saved
@@ -142,39 +190,49 @@ class GraphMemory:
             return vector_results
         return self._merge_results(self._rank_graph_results(graph_results), vector_results, prefer_order=True)
 
+    async def _save_triplets(self, triplets: list[Triplet]) -> None:
+        save_triplets = getattr(self._storage, "save_triplets", None)
+        if save_triplets is not None:
+            await save_triplets(self.user_id, triplets)
+            return
+        for triplet in triplets:
+            await self._storage.save_triplet(self.user_id, triplet)
+
     async def _extract_triplets(self, text: str) -> list[dict]:
-        return await parse_json_response(self._llm, EXTRACT_TRIPLETS.format(text=text))
+        return await parse_json_response(self._llm, _render_extract_triplets(text=text))
 
     async def _has_conflict(self, new: Triplet, existing: list[Triplet]) -> bool:
         same_predicate = [t for t in existing if t.predicate == new.predicate]
         if not same_predicate:
             return False
 
-        facts = "\n".join(f"- {t.subject} {t.predicate} {t.object}" for t in same_predicate)
+        facts = "\n".join([f"- {t.subject} {t.predicate} {t.object}" for t in same_predicate])
         return await parse_bool_response(
             self._llm,
-            DETECT_CONFLICT.format(
+            _render_detect_conflict(
                 subject=new.subject, predicate=new.predicate,
                 new_value=new.object, existing_facts=facts,
             ),
         )
 
     async def _vector_search(self, query: str) -> list[RetrievalResult]:
-        embedding = await self._get_embedding(query)
+        embedding = await self._query_embedding(query)
         results = await self._vector.search(
             embedding, top_k=20, filter={"user_id": self.user_id}
         )
-        return [
-            RetrievalResult(
+        now = _now()
+        out: list[RetrievalResult] = []
+        for rid, score, meta in results:
+            created_at = self._meta_time(meta, "created_at")
+            out.append(RetrievalResult(
                 text=meta.get("text", rid),
                 score=score,
-                timestamp=self._parse_ts(meta.get("created_at")) if meta.get("created_at") else _now(),
+                timestamp=created_at or now,
                 source="vector",
-                created_at=self._parse_ts(meta.get("created_at")) if meta.get("created_at") else None,
-                accessed_at=self._parse_ts(meta.get("accessed_at")) if meta.get("accessed_at") else None,
-            )
-            for rid, score, meta in results
-        ]
+                created_at=created_at,
+                accessed_at=self._meta_time(meta, "accessed_at"),
+            ))
+        return out
 
     async def _graph_search(self, query: str, *, expand: str) -> list[RetrievalResult]:
         entities = await self._extract_entities(query)
@@ -198,30 +256,19 @@ class GraphMemory:
         depth = depth_map[expand]
         filter_mode = "none" if expand in {"high", "full"} else ("expanded" if expand == "medium" else "base")
 
-        base_by_entity: dict[str, list[Triplet]] = {}
+        base_by_entity = await self._triplets_by_subject(entities)
         connected_by_entity: dict[str, list[Triplet]] = {}
         second_by_entity: dict[str, list[Triplet]] = {}
 
-        for entity in entities:
-            base_by_entity[entity] = await self._storage.get_triplets(self.user_id, subject=entity)
-
         if depth >= 1:
-            for triplets in base_by_entity.values():
-                for t in triplets:
-                    if t.object in connected_by_entity:
-                        continue
-                    connected_by_entity[t.object] = await self._storage.get_triplets(
-                        self.user_id, subject=t.object
-                    )
+            connected_by_entity = await self._triplets_by_subject(
+                [t.object for triplets in base_by_entity.values() for t in triplets]
+            )
 
         if depth >= 2:
-            for triplets in connected_by_entity.values():
-                for t in triplets:
-                    if t.object in second_by_entity:
-                        continue
-                    second_by_entity[t.object] = await self._storage.get_triplets(
-                        self.user_id, subject=t.object
-                    )
+            second_by_entity = await self._triplets_by_subject(
+                [t.object for triplets in connected_by_entity.values() for t in triplets]
+            )
 
         if query and filter_mode != "none":
             predicate_pool: set[str] = set()
@@ -232,12 +279,15 @@ class GraphMemory:
                     predicate_pool.update(t.predicate for t in triplets)
 
             predicates = sorted(predicate_pool)
-            if predicates:
-                pred_text = "\n".join(f"- {p}" for p in predicates)
+            if len(predicates) >= self._PREDICATE_FILTER_MIN:
+                pred_text = "\n".join([f"- {p}" for p in predicates])
                 try:
                     keep = await parse_json_response(
                         self._llm,
-                        GRAPH_PREDICATE_FILTER.format(query=query, predicates=pred_text),
+                        _render_graph_predicate_filter(query=query, predicates=pred_text),
+                        cache=self._llm_cache,
+                        cache_key=query,
+                        cache_kind=_scoped_kind("predicates", pred_text),
                     )
                     predicate_filter = {p for p in keep if p in predicates}
                 except Exception:
@@ -275,11 +325,30 @@ class GraphMemory:
 
         return results
 
+    async def _triplets_by_subject(self, subjects: list[str]) -> dict[str, list[Triplet]]:
+        unique = list(dict.fromkeys(subjects))
+        found = await asyncio.gather(
+            *(self._storage.get_triplets(self.user_id, subject=s) for s in unique)
+        )
+        return dict(zip(unique, found))
+
     async def _extract_entities(self, query: str) -> list[str]:
         prompt = f"Extract entity names from this query. Return a JSON array of strings.\n\nQuery: {query}\n\nReturn ONLY valid JSON."
         return await parse_json_response(self._llm, prompt)
 
+    async def _query_embedding(self, query: str) -> Embedding:
+        embedding = self._query_vectors.get(query)
+        if embedding is not None:
+            self._query_vectors.move_to_end(query)
+            return embedding
+        embedding = self._query_vectors[query] = await self._get_embedding(query)
+        while len(self._query_vectors) > self._QUERY_VECTOR_CACHE_SIZE:
+            self._query_vectors.popitem(last=False)
+        return embedding
+
     async def _get_embedding(self, text: str) -> list[float]:
+        if self._embed_is_async:
+            return await self._embed(text)
         result = self._embed(text)
         if inspect.isawaitable(result):
             return await result
@@ -290,17 +359,26 @@ class GraphMemory:
         dt = datetime.fromisoformat(value)
         return dt.astimezone(timezone.utc) if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
 
+    @staticmethod
+    def _meta_time(meta: dict, key: str) -> datetime | None:
+        ts = meta.get(f"{key}_ts")
+        if ts is not None:
+            return datetime.fromtimestamp(ts, timezone.utc)
+        value = meta.get(key)
+        return GraphMemory._parse_ts(value) if value else None
+
     @staticmethod
     def _merge_results(*result_lists: list[RetrievalResult], prefer_order: bool = False) -> list[RetrievalResult]:
         seen: set[str] = set()
         merged: list[RetrievalResult] = []
         for results in result_lists:
             for r in results:
-                if r.text not in seen:
-                    seen.add(r.text)
+                key = r.text.strip().casefold()
+                if key not in seen:
+                    seen.add(key)
                     merged.append(r)
         if not prefer_order:
-            merged.sort(key=lambda r: r.score, reverse=True)
+            return heapq.nlargest(20, merged, key=lambda r: r.score)
         return merged[:20]
 
     @staticmethod
@@ -313,17 +391,9 @@ class GraphMemory:
             timestamp=triplet.timestamp,
             source="graph",
             created_at=triplet.timestamp,
+            sort_key=GraphMemory._STATUS_RANK.get(status, 3),
         )
 
     @staticmethod
     def _rank_graph_results(results: list[RetrievalResult]) -> list[RetrievalResult]:
-        def status_rank(text: str) -> int:
-            if text.endswith("(current)"):
-                return 0
-            if text.endswith("(uncertain)"):
-                return 1
-            if text.endswith("(past)") or text.endswith("(past_replaced)"):
-                return 2
-            return 3
-
-        return sorted(results, key=lambda r: (status_rank(r.text), -r.score))
+        return sorted(results, key=lambda r: (r.sort_key, -r.score))
@@ -1,119 +1,319 @@
 from __future__ import annotations
 
 import asyncio
-from datetime import timedelta
+import inspect
+import re
+from datetime import datetime, timedelta
+from functools import lru_cache
 from pathlib import Path
 
 import numpy as np
 
+try:
+    import simsimd
+except ImportError:
+    simsimd = None
+
+try:
+    import cupy as cp
+except ImportError:
+    cp = None
+
+try:
+    from numba import njit
+except ImportError:
+    def njit(*args, **kwargs):
+        return lambda fn: fn
+
+from ._tokens import count_tokens
 from .llm import invoke
 from .prompts import COMPRESS_MEMORIES, EVOLVE_SUMMARY
+from .prompts._template import compile_prompt
 from .storage.base import Storage
 from .storage.sqlite_store import DEFAULT_DB_DIR, SQLiteStore
-from .types import EmbedCallable, LLMCallable, _now
+from .types import EmbedCallable, LLMCallable, MemoryItem, _is_async_callable, _now
 from .vector.base import VectorStore
 from .vector.numpy_store import NumpyVectorStore
+from .vector.quantize import quantize_int8
+
+_render_compress_memories = compile_prompt(COMPRESS_MEMORIES)
+_render_evolve_summary = compile_prompt(EVOLVE_SUMMARY)
 
 
 def _vector_db_path(db_path: str | Path | None) -> str:
     if db_path is None:
         DEFAULT_DB_DIR.mkdir(parents=True, exist_ok=True)
         return str(DEFAULT_DB_DIR / "vectors.db")
+    return _sibling_vector_path(str(db_path))
+
+
+@lru_cache(maxsize=64)
+def _sibling_vector_path(db_path: str) -> str:
     path = Path(db_path)
     suffix = path.suffix or ".db"
-    stem = path.with_suffix("").name
-    return str(path.with_name(f"{stem}_vectors{suffix}"))
+    return str(path.with_name(f"{path.stem}_vectors{suffix}"))
+
+
+_DEDUP_BLOCK = 256
+_SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+")
+# A full scan goes to the GPU once its N x N float32 scores would pass this.
+_GPU_MIN_BYTES = 256 << 20
+_GPU_BLOCK = 4096
+
+
+def _duplicate_pairs(
+    vecs: np.ndarray, threshold: float, quantize: str | None = None, rows: np.ndarray | None = None,
+    normalized: bool = False,
+) -> np.ndarray:
+    # (i, j) index pairs with i < j and cosine similarity above threshold.
+    # Rows are scored in blocks, so memory stays O(N * block) rather than
+    # O(N^2). With rows given, only those rows are scored (against every
+    # column), which is all an incremental scan needs.
+    vecs = np.ascontiguousarray(vecs, dtype=np.float32)
+    if quantize == "int8":
+        # Cosine ignores the per-row scale, so int8 rows compare directly;
+        # simsimd runs its int8 kernel on them.
+        vecs = quantize_int8(vecs)[0]
+    if cp is not None and rows is None and len(vecs) ** 2 * 4 > _GPU_MIN_BYTES:
+        try:
+            return _duplicate_pairs_gpu(vecs.astype(np.float32, copy=False), threshold)
+        except Exception:
+            # cupy imports without a usable device, or the device runs out
+            # of memory; the CPU path below gives the same pairs.
+            pass
+    work = vecs.astype(np.float32) if simsimd is None else vecs
+    sq = np.einsum("ij,ij->i", work, work, dtype=np.float32)
+    inv = np.divide(1.0, np.sqrt(sq), out=np.zeros_like(sq), where=sq > 0)
+    if simsimd is not None:
+        unit = None
+    elif normalized and quantize is None:
+        unit = work
+    else:
+        unit = work * inv[:, None]
+    empty = sq == 0
+
+    def scores(r: slice | np.ndarray, c: slice) -> np.ndarray:
+        if simsimd is not None:
+            return 1.0 - np.asarray(simsimd.cdist(vecs[r], vecs[c], metric="cosine"))
+        return unit[r] @ unit[c].T
+
+    pairs: list[np.ndarray] = []
+    if rows is None:
+        for start in range(0, len(vecs), _DEDUP_BLOCK):
+            stop = min(start + _DEDUP_BLOCK, len(vecs))
+            close = np.triu(scores(slice(start, stop), slice(start, None)) > threshold, k=1)
+            # Zero vectors have no direction; never treat them as duplicates.
+            close[empty[start:stop]] = False
+            close[:, empty[start:]] = False
+            pairs.append(np.argwhere(close) + start)
+    else:
+        rows = np.asarray(rows, dtype=np.intp)
+        fresh = np.zeros(len(vecs), dtype=bool)
+        fresh[rows] = True
+        cols = np.arange(len(vecs))
+        for start in range(0, len(rows), _DEDUP_BLOCK):
+            r = rows[start:start + _DEDUP_BLOCK]
+            close = scores(r, slice(None)) > threshold
+            # A pair of two scanned rows is kept from its lower row only.
+            close &= ~(fresh & (cols <= r[:, None]))
+            close[empty[r]] = False
+            close[:, empty] = False
+            a, b = np.nonzero(close)
+            pairs.append(np.column_stack([np.minimum(r[a], b), np.maximum(r[a], b)]))
+    return np.concatenate(pairs) if pairs else np.empty((0, 2), dtype=np.intp)
+
+
+def _duplicate_pairs_gpu(vecs: np.ndarray, threshold: float) -> np.ndarray:
+    d_vecs = cp.asarray(vecs)
+    sq = cp.einsum("ij,ij->i", d_vecs, d_vecs)
+    empty = sq == 0
+    unit = d_vecs / cp.where(empty, 1.0, cp.sqrt(sq))[:, None]
+    pairs: list[np.ndarray] = []
+    for start in range(0, len(vecs), _GPU_BLOCK):
+        stop = min(start + _GPU_BLOCK, len(vecs))
+        close = cp.triu(unit[start:stop] @ unit[start:].T > threshold, k=1)
+        close[empty[start:stop]] = False
+        close[:, empty[start:]] = False
+        pairs.append(cp.asnumpy(cp.argwhere(close)) + start)
+    return np.concatenate(pairs) if pairs else np.empty((0, 2), dtype=np.intp)
+
+
+@njit(cache=True)
+def _find(parent: np.ndarray, i: int) -> int:
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i
+
+
+@njit(cache=True)
+def _group_pairs(pairs: np.ndarray, n: int) -> np.ndarray:
+    # Union-find over the (i, j) pairs, so chains (a~b, b~c) land in one
+    # group. Returns each row's group root, always the lowest index.
+    parent = np.arange(n)
+    for e in range(pairs.shape[0]):
+        a = _find(parent, pairs[e, 0])
+        b = _find(parent, pairs[e, 1])
+        if a < b:
+            parent[b] = a
+        elif b < a:
+            parent[a] = b
+    for i in range(n):
+        parent[i] = _find(parent, i)
+    return parent
+
+
+def _unique_sentences(contents: list[str]) -> list[str]:
+    # Near-duplicates mostly repeat each other; send each sentence once.
+    seen: dict[str, str] = {}
+    for content in contents:
+        for sentence in _SENTENCE_SPLIT.split(content):
+            sentence = sentence.strip()
+            if sentence:
+                seen.setdefault(sentence.casefold(), sentence)
+    return list(seen.values())
+
+
+def _item_metadata(item: MemoryItem, user_id: str) -> dict:
+    return {
+        "user_id": user_id,
+        "category": item.category,
+        "type": "item",
+        "created_at": item.created_at.isoformat(),
+        "accessed_at": item.accessed_at.isoformat(),
+        "created_at_ts": item.created_at.timestamp(),
+        "accessed_at_ts": item.accessed_at.timestamp(),
+        "tokens": count_tokens(item.content),
+    }
+
+
+async def _index_items(vector: VectorStore, items: list[MemoryItem], user_id: str) -> None:
+    items = [i for i in items if i.embedding is not None and len(i.embedding)]
+    if not items:
+        return
+    add_many = getattr(vector, "add_many", None)
+    if add_many is not None:
+        await add_many(
+            [i.id for i in items],
+            [i.content for i in items],
+            [i.embedding for i in items],
+            [_item_metadata(i, user_id) for i in items],
+        )
+        return
+    for i in items:
+        await vector.add(id=i.id, text=i.content, embedding=i.embedding, metadata=_item_metadata(i, user_id))
 
 
 class MaintenanceRunner:
+    _MAX_CONCURRENCY = 16
+    _LLM_CONCURRENCY = 8
+
     def __init__(self, storage: Storage, llm: LLMCallable,
                  vector_store: VectorStore | None = None,
-                 embed: EmbedCallable | None = None):
+                 embed: EmbedCallable | None = None,
+                 dedup_quantize: str | None = None):
+        if dedup_quantize not in (None, "int8"):
+            raise ValueError(f"Unsupported dedup_quantize mode: {dedup_quantize!r}")
         self._storage = storage
         self._llm = llm
         self._vector = vector_store
         self._embed = embed
+        self._embed_is_async = _is_async_callable(embed)
+        self._embed_many = getattr(embed, "embed_many", None)
+        self._embed_many_is_async = _is_async_callable(self._embed_many)
+        self._dedup_quantize = dedup_quantize
 
     async def nightly(self, user_id: str) -> dict:
         stats = {"merged": 0, "promoted": 0, "summarized": 0}
 
+        # Taken before reading, so items written during the run are
+        # rescanned next time.
+        scan_at = _now()
+        # Storage without scan marks gets a full scan every night.
+        load_scan = getattr(self._storage, "load_merge_scan_at", None)
+        updated_since = getattr(self._storage, "get_item_ids_updated_since", None)
+        save_scan = getattr(self._storage, "save_merge_scan_at", None)
+        last_scan = await load_scan(user_id) if load_scan and updated_since and save_scan else None
         items = await self._storage.get_all_items(user_id)
         if not items:
             return stats
 
-        embeddings = [i for i in items if i.embedding]
+        merged_ids: set[str] = set()
+        by_id = {i.id: i for i in items}
+        ids, vecs, normalized = await self._embedding_matrix(user_id, by_id)
+        embeddings = [by_id[i] for i in ids]
         if len(embeddings) >= 2:
-            vecs = np.array([e.embedding for e in embeddings])
-            norms = np.linalg.norm(vecs, axis=1, keepdims=True)
-            norms = np.where(norms == 0, 1e-10, norms)
-            normalized = vecs / norms
-            sim_matrix = normalized @ normalized.T
-
-            merged_ids: set[str] = set()
-            for i in range(len(embeddings)):
-                if embeddings[i].id in merged_ids:
-                    continue
-                group = [embeddings[i]]
-                for j in range(i + 1, len(embeddings)):
-                    if embeddings[j].id not in merged_ids and sim_matrix[i, j] > 0.95:
-                        group.append(embeddings[j])
-                        merged_ids.add(embeddings[j].id)
-                if len(group) > 1:
-                    combined = " | ".join(g.content for g in group)
-                    merged_content = await invoke(
-                        self._llm, COMPRESS_MEMORIES.format(items=combined)
-                    )
-                    group[0].content = merged_content
-                    if self._embed and self._vector:
-                        result = self._embed(group[0].content)
-                        if asyncio.iscoroutine(result):
-                            group[0].embedding = await result
-                        else:
-                            group[0].embedding = result
-                    await self._storage.update_item(group[0])
-                    deleted_ids = [g.id for g in group[1:]]
-                    await self._storage.delete_items(deleted_ids)
-                    if self._vector and deleted_ids:
-                        await self._vector.delete(deleted_ids)
-                    if self._vector and group[0].embedding:
-                        await self._vector.add(
-                            id=group[0].id,
-                            text=group[0].content,
-                            embedding=group[0].embedding,
-                            metadata={
-                                "user_id": user_id,
-                                "category": group[0].category,
-                                "type": "item",
-                                "created_at": group[0].created_at.isoformat(),
-                                "accessed_at": group[0].accessed_at.isoformat(),
-                            },
-                        )
-                    stats["merged"] += len(group) - 1
+            rows = None
+            if last_scan is not None:
+                # Unchanged items were compared with each other last run;
+                # only updated ones need scoring against the rest.
+                updated = await updated_since(user_id, last_scan)
+                rows = np.array([k for k, i in enumerate(ids) if i in updated], dtype=np.intp)
+            pairs = _duplicate_pairs(vecs, 0.95, self._dedup_quantize, rows, normalized=normalized)
+            lead = _group_pairs(pairs.astype(np.int64), len(embeddings))
+            groups: dict[int, list[MemoryItem]] = {}
+            for j in np.flatnonzero(lead != np.arange(len(embeddings))).tolist():
+                i = int(lead[j])
+                groups.setdefault(i, [embeddings[i]]).append(embeddings[j])
+                merged_ids.add(embeddings[j].id)
+
+            leaders: list[MemoryItem] = []
+            for i in sorted(groups):
+                group = groups[i]
+                combined = " | ".join(_unique_sentences([g.content for g in group]))
+                merged_content = await invoke(
+                    self._llm, _render_compress_memories(items=combined)
+                )
+                group[0].content = merged_content
+                leaders.append(group[0])
+                stats["merged"] += len(group) - 1
+
+            if self._embed and self._vector and leaders:
+                vectors = await self._embed_batch([g.content for g in leaders])
+                for leader, vec in zip(leaders, vectors):
+                    leader.embedding = vec
+
+            # All merge writes go out as one batch per store.
+            deleted_ids = list(merged_ids)
+            await self._update_items(leaders)
+            await self._storage.delete_items(deleted_ids)
+            if self._vector:
+                await self._vector.delete(deleted_ids)
+                await _index_items(self._vector, leaders, user_id)
+        if save_scan is not None:
+            await save_scan(user_id, scan_at)
 
         hot = await self._storage.get_high_access_items(user_id)
         for item in hot:
             item.access_count += 1
-            await self._storage.update_item(item)
-            stats["promoted"] += 1
+        await self._update_items(hot)
+        stats["promoted"] += len(hot)
 
-        items = await self._storage.get_all_items(user_id)
+        # Merge leaders were updated in place; only the absorbed items drop out.
         by_cat: dict[str, list[str]] = {}
         for item in items:
-            by_cat.setdefault(item.category, []).append(item.content)
-
-        for cat, contents in by_cat.items():
-            existing = await self._storage.load_category(user_id, cat) or ""
-            items_text = "\n".join(f"- {c}" for c in contents)
-            updated = await invoke(
-                self._llm,
-                EVOLVE_SUMMARY.format(
-                    category=cat,
-                    existing=existing or "No existing summary.",
-                    new_items=items_text,
-                ),
-            )
+            if item.id not in merged_ids:
+                by_cat.setdefault(item.category, []).append(item.content)
+
+        summaries = await self._load_summaries(user_id, list(by_cat))
+        sem = asyncio.Semaphore(self._LLM_CONCURRENCY)
+
+        async def summarize(cat: str, contents: list[str]) -> None:
+            existing = summaries.get(cat, (None, None))[0]
+            items_text = "\n".join([f"- {c}" for c in contents])
+            async with sem:
+                updated = await invoke(
+                    self._llm,
+                    _render_evolve_summary(
+                        category=cat,
+                        existing=existing or "No existing summary.",
+                        new_items=items_text,
+                    ),
+                )
             await self._storage.save_category(user_id, cat, updated)
-            stats["summarized"] += 1
+
+        await asyncio.gather(*(summarize(cat, contents) for cat, contents in by_cat.items()))
+        stats["summarized"] += len(by_cat)
 
         return stats
 
@@ -127,8 +327,11 @@ class MaintenanceRunner:
         now = _now()
         cutoff = now - timedelta(days=30)
 
-        for cat, contents in by_cat.items():
-            last_updated = await self._storage.load_persistent_updated_at(user_id, cat)
+        persistent = await self._load_persistent_summaries(user_id, list(by_cat))
+        sem = asyncio.Semaphore(self._LLM_CONCURRENCY)
+
+        async def append(cat: str, contents: list) -> bool:
+            existing_persistent, last_updated = persistent.get(cat, (None, None))
             if last_updated:
                 lower_bound = last_updated - timedelta(days=30)
                 window_items = [
@@ -138,68 +341,65 @@ class MaintenanceRunner:
                 window_items = contents
 
             if not window_items:
-                continue
-
-            items_text = "\n".join(f"- {c.content}" for c in window_items)
-            chunk = await invoke(
-                self._llm,
-                EVOLVE_SUMMARY.format(
-                    category=cat,
-                    existing="No existing summary.",
-                    new_items=items_text,
-                ),
-            )
-            existing_persistent = await self._storage.load_persistent_category(user_id, cat) or ""
+                return False
+
+            items_text = "\n".join([f"- {c.content}" for c in window_items])
+            async with sem:
+                chunk = await invoke(
+                    self._llm,
+                    _render_evolve_summary(
+                        category=cat,
+                        existing="No existing summary.",
+                        new_items=items_text,
+                    ),
+                )
             stamp = now.date().isoformat()
             block = f"### {stamp}\n{chunk.strip()}"
             updated = block if not existing_persistent else f"{existing_persistent}\n\n{block}"
             await self._storage.save_persistent_category(user_id, cat, updated)
-            stats["persistent_appended"] += 1
+            return True
+
+        appended = await asyncio.gather(*(append(cat, contents) for cat, contents in by_cat.items()))
+        stats["persistent_appended"] += sum(appended)
 
         stale = await self._storage.get_items_not_accessed_since(user_id, days=90)
-        for item in stale:
-            item.archived = True
-            await self._storage.update_item(item)
-            if self._vector:
-                await self._vector.delete([item.id])
-            stats["archived"] += 1
+        stale_ids = [item.id for item in stale]
+        await self._archive(stale)
+        if self._vector:
+            await self._vector.delete(stale_ids)
+        stats["archived"] += len(stale_ids)
 
         return stats
 
     async def monthly(self, user_id: str) -> dict:
-        stats = {"reindexed": 0, "dead_archived": 0}
+        stats = {"reindexed": 0, "reembedded": 0, "dead_archived": 0}
 
         if self._embed and self._vector:
             items = await self._storage.get_all_items(user_id)
-            for item in items:
-                result = self._embed(item.content)
-                if asyncio.iscoroutine(result):
-                    embedding = await result
-                else:
-                    embedding = result
-                item.embedding = embedding
-                await self._storage.update_item(item)
-                await self._vector.add(
-                    id=item.id, text=item.content, embedding=embedding,
-                    metadata={
-                        "user_id": user_id,
-                        "category": item.category,
-                        "type": "item",
-                        "created_at": item.created_at.isoformat(),
-                        "accessed_at": item.accessed_at.isoformat(),
-                    },
-                )
-                stats["reindexed"] += 1
+            # Unchanged items keep their stored embedding; only new or edited
+            # content goes back to the embedder.
+            get_stale = getattr(self._storage, "get_stale_embedding_ids", None)
+            if get_stale is not None:
+                stale_ids = await get_stale(user_id)
+                changed = [item for item in items if item.id in stale_ids]
+            else:
+                changed = items
+            vectors = await self._embed_batch([item.content for item in changed])
+            for item, vec in zip(changed, vectors):
+                item.embedding = vec
+            await self._update_items(changed)
+            stats["reembedded"] += len(changed)
+            await _index_items(self._vector, items, user_id)
+            stats["reindexed"] += len(items)
 
             await self._vector.rebuild()
 
         stale_items = await self._storage.get_items_not_accessed_since(user_id, days=180)
-        for item in stale_items:
-            item.archived = True
-            await self._storage.update_item(item)
-            if self._vector:
-                await self._vector.delete([item.id])
-            stats["dead_archived"] += 1
+        stale_ids = [item.id for item in stale_items]
+        await self._archive(stale_items)
+        if self._vector:
+            await self._vector.delete(stale_ids)
+        stats["dead_archived"] += len(stale_ids)
 
         return stats
 
@@ -209,6 +409,101 @@ class MaintenanceRunner:
         m = await self.monthly(user_id)
         return {"nightly": n, "weekly": w, "monthly": m}
 
+    async def _embedding_matrix(
+        self, user_id: str, by_id: dict[str, MemoryItem],
+    ) -> tuple[list[str], np.ndarray, bool]:
+        # The vector store already holds unit rows; use them when it covers
+        # every embedded item, else build the matrix from storage.
+        get_normalized = getattr(self._vector, "get_normalized_matrix", None)
+        if get_normalized is not None:
+            ids, mat = await get_normalized(user_id)
+            keep = [k for k, i in enumerate(ids) if i in by_id]
+            expected = sum(1 for i in by_id.values() if i.embedding is not None and len(i.embedding))
+            if len(keep) == expected:
+                return [ids[k] for k in keep], mat[keep], True
+        get_matrix = getattr(self._storage, "get_embedding_matrix", None)
+        if get_matrix is None:
+            embedded = [i for i in by_id.values() if i.embedding is not None and len(i.embedding)]
+            if not embedded:
+                return [], np.empty((0, 0), dtype=np.float32), False
+            mat = np.array([i.embedding for i in embedded], dtype=np.float32)
+            return [i.id for i in embedded], mat, False
+        ids, mat = await get_matrix(user_id)
+        if not all(i in by_id for i in ids):
+            keep = [k for k, i in enumerate(ids) if i in by_id]
+            ids, mat = [ids[k] for k in keep], mat[keep]
+        return ids, mat, False
+
+    async def _update_items(self, items: list[MemoryItem]) -> None:
+        update_items = getattr(self._storage, "update_items", None)
+        if update_items is not None:
+            await update_items(items)
+            return
+        sem = asyncio.Semaphore(self._MAX_CONCURRENCY)
+
+        async def one(item: MemoryItem) -> None:
+            async with sem:
+                await self._storage.update_item(item)
+
+        await asyncio.gather(*(one(item) for item in items))
+
+    async def _archive(self, items: list[MemoryItem]) -> None:
+        bulk_archive = getattr(self._storage, "bulk_archive", None)
+        if bulk_archive is not None:
+            await bulk_archive([item.id for item in items])
+            return
+        for item in items:
+            item.archived = True
+        await self._update_items(items)
+
+    async def _load_summaries(
+        self, user_id: str, categories: list[str]
+    ) -> dict[str, tuple[str | None, str | None]]:
+        if not categories:
+            return {}
+        load_summaries = getattr(self._storage, "load_summaries", None)
+        if load_summaries is not None:
+            return await load_summaries(user_id, categories)
+        general = await asyncio.gather(
+            *(self._storage.load_category(user_id, c) for c in categories)
+        )
+        return {c: (g, None) for c, g in zip(categories, general)}
+
+    async def _load_persistent_summaries(
+        self, user_id: str, categories: list[str]
+    ) -> dict[str, tuple[str | None, datetime | None]]:
+        load_persistent = getattr(self._storage, "load_persistent_summaries", None)
+        if load_persistent is not None:
+            return await load_persistent(user_id, categories)
+        loaded = await asyncio.gather(
+            *(self._storage.load_persistent_category(user_id, c) for c in categories),
+            *(self._storage.load_persistent_updated_at(user_id, c) for c in categories),
+        )
+        n = len(categories)
+        return {c: (s, t) for c, s, t in zip(categories, loaded[:n], loaded[n:])}
+
+    async def _embed_batch(self, texts: list[str]) -> list[list[float]]:
+        if not texts:
+            return []
+        if self._embed_many is not None:
+            if self._embed_many_is_async:
+                return await self._embed_many(texts)
+            result = self._embed_many(texts)
+            return await result if inspect.isawaitable(result) else result
+
+        sem = asyncio.Semaphore(self._MAX_CONCURRENCY)
+
+        async def one(text: str) -> list[float]:
+            async with sem:
+                if self._embed_is_async:
+                    return await self._embed(text)
+                result = self._embed(text)
+                return await result if inspect.isawaitable(result) else result
+
+        unique = list(dict.fromkeys(texts))
+        vectors = dict(zip(unique, await asyncio.gather(*(one(t) for t in unique))))
+        return [vectors[t] for t in texts]
+
 
 class Maintenance:
     def __init__(
@@ -221,6 +516,7 @@ class Maintenance:
         storage: Storage | None = None,
         vector_store: VectorStore | None = None,
         embed: EmbedCallable | None = None,
+        dedup_quantize: str | None = None,
     ):
         self.user_id = user_id
         self._storage = storage or SQLiteStore(db_path)
@@ -231,7 +527,7 @@ class Maintenance:
             created_vector = True
         self._vector = vector_store
         self._owns_vector = created_vector
-        self._runner = MaintenanceRunner(self._storage, llm, self._vector, embed)
+        self._runner = MaintenanceRunner(self._storage, llm, self._vector, embed, dedup_quantize)
 
     async def run(self, schedule: str = "all") -> dict:
         if schedule == "all":
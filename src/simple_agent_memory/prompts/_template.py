@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+from string import Formatter
+from typing import Any, Callable
+
+
+class Prompt(str):
+    # Rendered prompt that remembers its static leading text, so provider
+    # clients can mark that prefix for server-side prompt caching.
+    stable_prefix: str = ""
+
+
+def compile_prompt(template: str) -> Callable[..., str]:
+    # Parse the template once; rendering is then a plain join, several times
+    # cheaper than str.format re-parsing a multi-KB prompt on every call.
+    parsed = list(Formatter().parse(template))
+    if any(spec or conversion or (field is not None and not field.isidentifier())
+           for _, field, spec, conversion in parsed):
+        # Format specs and indexed fields need str.format itself; the
+        # result still carries its static prefix.
+        head = parsed[0][0] if parsed else ""
+
+        def render_format(**values: Any) -> Prompt:
+            prompt = Prompt(template.format(**values))
+            prompt.stable_prefix = head
+            return prompt
+
+        return render_format
+
+    pairs: list[tuple[str, str]] = []
+    pending = ""
+    for literal, field, _, _ in parsed:
+        pending += literal
+        if field is not None:
+            pairs.append((pending, field))
+            pending = ""
+    tail = pending
+    prefix = pairs[0][0] if pairs else tail
+
+    if len(pairs) == 1:
+        # Most templates have a single field: one concatenation, no list.
+        (head, name), = pairs
+
+        def render_one(**values: Any) -> Prompt:
+            value = values[name]
+            prompt = Prompt(head + (value if type(value) is str else format(value)) + tail)
+            prompt.stable_prefix = prefix
+            return prompt
+
+        return render_one
+
+    def render(**values: Any) -> Prompt:
+        parts: list[str] = []
+        for literal, name in pairs:
+            value = values[name]
+            parts.append(literal)
+            parts.append(value if type(value) is str else format(value))
+        parts.append(tail)
+        prompt = Prompt("".join(parts))
+        prompt.stable_prefix = prefix
+        return prompt
+
+    return render
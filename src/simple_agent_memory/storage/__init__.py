@@ -1,4 +1,4 @@
-from .base import Storage
+from .base import BulkStorage, Storage
 from .sqlite_store import SQLiteStore
 
-__all__ = ["Storage", "SQLiteStore"]
+__all__ = ["BulkStorage", "Storage", "SQLiteStore"]
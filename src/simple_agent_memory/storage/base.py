@@ -3,6 +3,8 @@ from __future__ import annotations
 from datetime import datetime
 from typing import Protocol, runtime_checkable
 
+import numpy as np
+
 from ..types import Checkpoint, MemoryItem, Triplet
 
 
@@ -46,3 +48,31 @@ class Storage(Protocol):
     async def get_all_triplets(self, user_id: str) -> list[Triplet]: ...
 
     async def close(self) -> None: ...
+
+
+@runtime_checkable
+class BulkStorage(Storage, Protocol):
+    # Optional batch and maintenance helpers. Callers look each one up with
+    # getattr and fall back to the Storage methods above when it is missing.
+    async def find_resource(self, user_id: str, content: str) -> str | None: ...
+    async def save_resources(self, user_id: str, contents: list[str]) -> list[str]: ...
+
+    async def save_items(self, items: list[MemoryItem]) -> None: ...
+    async def get_items_by_ids(self, item_ids: list[str]) -> list[MemoryItem]: ...
+    async def search_items_decayed(
+        self, user_id: str, query: str, *, score: float, half_life_days: float,
+        access_weight: float, now: datetime, limit: int = 50,
+    ) -> list[tuple[MemoryItem, float]]: ...
+    async def update_items(self, items: list[MemoryItem]) -> None: ...
+    async def touch_items(self, item_ids: list[str], at: datetime) -> None: ...
+    async def bulk_archive(self, item_ids: list[str]) -> None: ...
+    async def get_embedding_matrix(self, user_id: str) -> tuple[list[str], np.ndarray]: ...
+    async def get_stale_embedding_ids(self, user_id: str) -> set[str]: ...
+    async def get_item_ids_updated_since(self, user_id: str, since: datetime) -> set[str]: ...
+    async def load_merge_scan_at(self, user_id: str) -> datetime | None: ...
+    async def save_merge_scan_at(self, user_id: str, at: datetime) -> None: ...
+
+    async def load_summaries(self, user_id: str, categories: list[str]) -> dict[str, tuple[str | None, str | None]]: ...
+    async def load_persistent_summaries(self, user_id: str, categories: list[str]) -> dict[str, tuple[str | None, datetime | None]]: ...
+
+    async def save_triplets(self, user_id: str, triplets: list[Triplet]) -> None: ...
@@ -1,13 +1,21 @@
 from __future__ import annotations
 
+import asyncio
+import hashlib
 import json
 import re
+import sqlite3
+from collections import Counter
 from datetime import datetime, timezone
 from pathlib import Path
 
 import aiosqlite
+import numpy as np
 
-from ..types import Checkpoint, MemoryItem, Triplet, _id, _now
+from .. import _json
+from .._tokens import count_tokens
+from ..types import Checkpoint, Embedding, MemoryItem, Triplet, _id, _now
+from ..vector.quantize import dequantize_int8, quantize_int8
 
 DEFAULT_DB_DIR = Path.home() / ".simple_agent_memory"
 
@@ -16,7 +24,8 @@ CREATE TABLE IF NOT EXISTS resources (
     id TEXT PRIMARY KEY,
     user_id TEXT NOT NULL,
     content TEXT NOT NULL,
-    created_at TEXT NOT NULL
+    created_at TEXT NOT NULL,
+    content_hash TEXT
 );
 CREATE TABLE IF NOT EXISTS items (
     id TEXT PRIMARY KEY,
@@ -25,10 +34,15 @@ CREATE TABLE IF NOT EXISTS items (
     category TEXT NOT NULL DEFAULT 'general',
     source_id TEXT,
     embedding TEXT,
+    embedding_f32 BLOB,
+    embedding_i8 BLOB,
+    embedded_hash TEXT,
     access_count INTEGER DEFAULT 0,
     created_at TEXT NOT NULL,
     accessed_at TEXT NOT NULL,
-    archived INTEGER DEFAULT 0
+    archived INTEGER DEFAULT 0,
+    updated_at TEXT,
+    tokens INTEGER
 );
 CREATE TABLE IF NOT EXISTS categories (
     user_id TEXT NOT NULL,
@@ -39,10 +53,14 @@ CREATE TABLE IF NOT EXISTS categories (
     persistent_updated_at TEXT,
     PRIMARY KEY (user_id, category)
 );
+CREATE TABLE IF NOT EXISTS maintenance_state (
+    user_id TEXT PRIMARY KEY,
+    last_merge_scan_at TEXT
+);
 CREATE TABLE IF NOT EXISTS checkpoints (
     thread_id TEXT NOT NULL,
     step_id TEXT NOT NULL,
-    state TEXT NOT NULL,
+    state BLOB NOT NULL,
     timestamp TEXT NOT NULL,
     PRIMARY KEY (thread_id, step_id)
 );
@@ -58,33 +76,140 @@ CREATE TABLE IF NOT EXISTS triplets (
 );
 CREATE INDEX IF NOT EXISTS idx_items_user ON items(user_id);
 CREATE INDEX IF NOT EXISTS idx_items_category ON items(user_id, category);
+CREATE INDEX IF NOT EXISTS idx_items_user_active_created ON items(user_id, created_at DESC) WHERE archived = 0;
+CREATE INDEX IF NOT EXISTS idx_items_user_active_access ON items(user_id, accessed_at DESC) WHERE archived = 0;
+CREATE INDEX IF NOT EXISTS idx_items_user_active_count ON items(user_id, access_count DESC) WHERE archived = 0;
 CREATE INDEX IF NOT EXISTS idx_triplets_user ON triplets(user_id);
 CREATE INDEX IF NOT EXISTS idx_triplets_subject ON triplets(user_id, subject);
 CREATE INDEX IF NOT EXISTS idx_resources_user ON resources(user_id);
 """
 
+# External-content FTS5 index mirroring {table}.content, kept in sync by
+# triggers. recursive_triggers must be on so INSERT OR REPLACE fires the
+# delete trigger for the row it replaces.
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE {table}_fts USING fts5(
+    content, content='{table}', content_rowid='rowid', tokenize='porter unicode61'
+);
+CREATE TRIGGER IF NOT EXISTS {table}_fts_ai AFTER INSERT ON {table} BEGIN
+    INSERT INTO {table}_fts(rowid, content) VALUES (new.rowid, new.content);
+END;
+CREATE TRIGGER IF NOT EXISTS {table}_fts_ad AFTER DELETE ON {table} BEGIN
+    INSERT INTO {table}_fts({table}_fts, rowid, content) VALUES ('delete', old.rowid, old.content);
+END;
+CREATE TRIGGER IF NOT EXISTS {table}_fts_au AFTER UPDATE OF content ON {table} BEGIN
+    INSERT INTO {table}_fts({table}_fts, rowid, content) VALUES ('delete', old.rowid, old.content);
+    INSERT INTO {table}_fts(rowid, content) VALUES (new.rowid, new.content);
+END;
+INSERT INTO {table}_fts({table}_fts) VALUES ('rebuild');
+"""
+
+INSERT_ITEM_SQL = (
+    "INSERT OR REPLACE INTO items (id, user_id, content, category, source_id, embedding_f32, "
+    "embedding_i8, embedded_hash, access_count, created_at, accessed_at, archived, updated_at, tokens) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+)
+
+# Restating an active fact refreshes it instead of adding a duplicate row.
+INSERT_TRIPLET_SQL = (
+    "INSERT INTO triplets (user_id, subject, predicate, object, timestamp, active, status) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?) "
+    "ON CONFLICT (user_id, subject, predicate, object) WHERE active = 1 "
+    "DO UPDATE SET timestamp = excluded.timestamp, status = excluded.status"
+)
+
+# embedded_hash records the content an embedding was computed from, so it
+# only moves when the embedding itself changes.
+UPDATE_ITEM_SQL = (
+    "UPDATE items SET content=?, category=?, embedding=NULL, "
+    "embedded_hash = CASE WHEN COALESCE(embedding_f32, embedding_i8) IS ? THEN embedded_hash ELSE ? END, "
+    "embedding_f32=?, embedding_i8=?, "
+    "access_count=?, accessed_at=?, archived=?, "
+    # updated_at tracks content and embedding changes only, so counter and
+    # archive writes do not put an item back into the next dedup scan.
+    "updated_at = CASE WHEN updated_at IS NOT NULL AND content IS ? "
+    "AND COALESCE(embedding_f32, embedding_i8) IS ? THEN updated_at ELSE ? END, "
+    "tokens=? WHERE id=?"
+)
+
 
 def _ts(dt: datetime) -> str:
     return dt.isoformat()
 
 
+def _content_hash(content: str) -> str:
+    return hashlib.blake2b(content.encode(), digest_size=16).hexdigest()
+
+
 def _parse_ts(s: str) -> datetime:
     dt = datetime.fromisoformat(s)
     return dt.astimezone(timezone.utc) if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
 
 
+def _embedding_blob(embedding: Embedding | None, quantize: str | None = None) -> bytes | None:
+    # float32 bytes, or with "int8" a float32 scale followed by the int8 row.
+    if embedding is None or len(embedding) == 0:
+        return None
+    if quantize == "int8":
+        q, scales = quantize_int8(embedding)
+        return scales.tobytes() + q.tobytes()
+    return np.asarray(embedding, dtype=np.float32).tobytes()
+
+
+def _load_embedding(row: aiosqlite.Row) -> np.ndarray | None:
+    # Older rows may still carry the JSON text column instead of a blob.
+    if row["embedding_f32"] is not None:
+        return np.frombuffer(row["embedding_f32"], dtype=np.float32)
+    if row["embedding_i8"] is not None:
+        blob = row["embedding_i8"]
+        scale = np.frombuffer(blob, dtype=np.float32, count=1)
+        return dequantize_int8(np.frombuffer(blob, dtype=np.int8, offset=4)[None, :], scale)[0]
+    if row["embedding"]:
+        return np.asarray(json.loads(row["embedding"]), dtype=np.float32)
+    return None
+
+
 def _row_to_item(row: aiosqlite.Row) -> MemoryItem:
+    embedding = _load_embedding(row)
     return MemoryItem(
         id=row["id"],
         user_id=row["user_id"],
         content=row["content"],
         category=row["category"],
         source_id=row["source_id"] or "",
-        embedding=json.loads(row["embedding"]) if row["embedding"] else None,
+        embedding=embedding.tolist() if embedding is not None else None,
         access_count=row["access_count"],
         created_at=_parse_ts(row["created_at"]),
         accessed_at=_parse_ts(row["accessed_at"]),
         archived=bool(row["archived"]),
+        tokens=row["tokens"],
+    )
+
+
+def _embedded_hash(item: MemoryItem, blob: bytes | None) -> str | None:
+    return _content_hash(item.content) if blob is not None else None
+
+
+def _item_insert_row(item: MemoryItem, quantize: str | None = None) -> tuple:
+    blob = _embedding_blob(item.embedding, quantize)
+    f32, i8 = (None, blob) if quantize == "int8" else (blob, None)
+    return (
+        item.id, item.user_id, item.content, item.category, item.source_id,
+        f32, i8, _embedded_hash(item, blob),
+        item.access_count, _ts(item.created_at), _ts(item.accessed_at), int(item.archived), _ts(_now()),
+        count_tokens(item.content),
+    )
+
+
+def _item_update_row(item: MemoryItem, quantize: str | None = None) -> tuple:
+    blob = _embedding_blob(item.embedding, quantize)
+    f32, i8 = (None, blob) if quantize == "int8" else (blob, None)
+    return (
+        item.content, item.category,
+        blob, _embedded_hash(item, blob), f32, i8,
+        item.access_count, _ts(item.accessed_at), int(item.archived),
+        item.content, blob, _ts(_now()),
+        count_tokens(item.content), item.id,
     )
 
 
@@ -97,6 +222,29 @@ def _keyword_terms(query: str) -> list[str]:
     return terms[:8]
 
 
+def _fts_query(terms: list[str]) -> str:
+    # Each term becomes a quoted prefix phrase, so "6:15" matches the
+    # adjacent tokens 6 and 15 and "python" also matches "pythonic".
+    phrases = [t.replace('"', '""') for t in terms if any(c.isalnum() for c in t)]
+    return " OR ".join(f'"{p}"*' for p in phrases)
+
+
+def _row_to_checkpoint(row: aiosqlite.Row) -> Checkpoint:
+    # State is JSON bytes; rows written before that hold JSON text, which
+    # the same loader accepts.
+    return Checkpoint(
+        thread_id=row["thread_id"], step_id=row["step_id"],
+        state=_json.loads(row["state"]), timestamp=_parse_ts(row["timestamp"]),
+    )
+
+
+def _triplet_row(user_id: str, triplet: Triplet) -> tuple:
+    return (
+        user_id, triplet.subject, triplet.predicate, triplet.object,
+        _ts(triplet.timestamp), int(triplet.active), triplet.status,
+    )
+
+
 def _row_to_triplet(row: aiosqlite.Row) -> Triplet:
     return Triplet(
         subject=row["subject"],
@@ -109,40 +257,102 @@ def _row_to_triplet(row: aiosqlite.Row) -> Triplet:
 
 
 class SQLiteStore:
-    def __init__(self, db_path: str | Path | None = None):
+    # Access bookkeeping is written behind: touches coalesce in memory and
+    # go out in one transaction after a short delay, once enough pile up,
+    # or before the next other storage call.
+    _TOUCH_FLUSH_DELAY = 0.05
+    _TOUCH_FLUSH_MAX = 128
+
+    def __init__(self, db_path: str | Path | None = None, quantize: str | None = None):
+        if quantize not in (None, "int8"):
+            raise ValueError(f"Unsupported quantize mode: {quantize!r}")
         if db_path is None:
             DEFAULT_DB_DIR.mkdir(parents=True, exist_ok=True)
             db_path = DEFAULT_DB_DIR / "memory.db"
         self._db_path = str(db_path)
+        self._quantize = quantize
         self._db: aiosqlite.Connection | None = None
+        self._fts = False
+        self._touches: dict[str, tuple[int, datetime]] = {}
+        self._touch_flusher: asyncio.Task | None = None
+        self._touch_writes: set[asyncio.Task] = set()
+        self._open_lock = asyncio.Lock()
 
     async def _conn(self) -> aiosqlite.Connection:
         if self._db is None:
-            self._db = await aiosqlite.connect(self._db_path)
-            self._db.row_factory = aiosqlite.Row
-            await self._db.execute("PRAGMA journal_mode=WAL")
-            await self._db.executescript(SCHEMA)
-            await self._ensure_triplet_status(self._db)
-            await self._ensure_category_persistent(self._db)
-            await self._db.commit()
+            # Concurrent first calls share one connection and all wait for
+            # the schema to be in place.
+            async with self._open_lock:
+                if self._db is None:
+                    self._db = await self._open()
+        # Pending and in-flight touches land before any other read or write.
+        if self._touch_writes:
+            await asyncio.wait(list(self._touch_writes))
+        if self._touches:
+            await self._flush_touches(self._db)
         return self._db
 
+    async def _open(self) -> aiosqlite.Connection:
+        db = await aiosqlite.connect(self._db_path)
+        db.row_factory = aiosqlite.Row
+        await db.execute("PRAGMA journal_mode=WAL")
+        # Durable across application crashes under WAL; only an OS crash
+        # can drop the last commits.
+        await db.execute("PRAGMA synchronous=NORMAL")
+        await db.execute("PRAGMA recursive_triggers=ON")
+        # Keep hot pages and temp b-trees in memory; reads go through mmap.
+        await db.execute("PRAGMA temp_store=MEMORY")
+        await db.execute("PRAGMA mmap_size=268435456")
+        await db.execute("PRAGMA cache_size=-65536")
+        await db.executescript(SCHEMA)
+        await self._ensure_triplet_status(db)
+        await self._ensure_category_persistent(db)
+        await self._ensure_resource_hash(db)
+        await self._ensure_item_columns(db)
+        self._fts = await self._ensure_fts(db)
+        await self._ensure_stats(db)
+        await db.commit()
+        return db
+
     async def close(self) -> None:
+        # Let a delayed flush finish its write rather than dropping it.
+        flusher, self._touch_flusher = self._touch_flusher, None
+        if flusher is not None and not flusher.done():
+            flusher.cancel()
+            await asyncio.gather(flusher, return_exceptions=True)
+        if self._touches or self._touch_writes:
+            await self._conn()
         if self._db:
+            await self._db.execute("PRAGMA optimize")
             await self._db.close()
             self._db = None
 
     # ── Resources ──
 
     async def save_resource(self, user_id: str, content: str) -> str:
+        return (await self.save_resources(user_id, [content]))[0]
+
+    async def save_resources(self, user_id: str, contents: list[str]) -> list[str]:
+        if not contents:
+            return []
         db = await self._conn()
-        rid = _id()
-        await db.execute(
-            "INSERT INTO resources (id, user_id, content, created_at) VALUES (?, ?, ?, ?)",
-            (rid, user_id, content, _ts(_now())),
+        ids = [_id() for _ in contents]
+        stamp = _ts(_now())
+        await db.executemany(
+            "INSERT INTO resources (id, user_id, content, created_at, content_hash) VALUES (?, ?, ?, ?, ?)",
+            [(rid, user_id, content, stamp, _content_hash(content)) for rid, content in zip(ids, contents)],
         )
         await db.commit()
-        return rid
+        return ids
+
+    async def find_resource(self, user_id: str, content: str) -> str | None:
+        db = await self._conn()
+        cur = await db.execute(
+            "SELECT id FROM resources WHERE user_id = ? AND content_hash = ? AND content = ? LIMIT 1",
+            (user_id, _content_hash(content), content),
+        )
+        row = await cur.fetchone()
+        return row["id"] if row else None
 
     async def get_resource(self, resource_id: str) -> str | None:
         db = await self._conn()
@@ -155,24 +365,34 @@ class SQLiteStore:
         if not terms:
             return []
         db = await self._conn()
-        clauses = " OR ".join("content LIKE ?" for _ in terms)
+        if self._fts:
+            match = _fts_query(terms)
+            if not match:
+                return []
+            cur = await db.execute(
+                "SELECT r.content FROM resources_fts f JOIN resources r ON r.rowid = f.rowid "
+                "WHERE resources_fts MATCH ? AND r.user_id = ? ORDER BY bm25(resources_fts) LIMIT 20",
+                (match, user_id),
+            )
+            return [row["content"] for row in await cur.fetchall()]
+        clauses = " OR ".join(["content LIKE ?"] * len(terms))
         params = [user_id] + [f"%{t}%" for t in terms]
         sql = f"SELECT content FROM resources WHERE user_id = ? AND ({clauses}) ORDER BY created_at DESC LIMIT 20"
         cur = await db.execute(sql, params)
-        return [row["content"] async for row in cur]
+        return [row["content"] for row in await cur.fetchall()]
 
     # ── Items ──
 
     async def save_item(self, item: MemoryItem) -> None:
         db = await self._conn()
-        await db.execute(
-            "INSERT OR REPLACE INTO items (id, user_id, content, category, source_id, embedding, access_count, created_at, accessed_at, archived) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
-            (
-                item.id, item.user_id, item.content, item.category, item.source_id,
-                json.dumps(item.embedding) if item.embedding else None,
-                item.access_count, _ts(item.created_at), _ts(item.accessed_at), int(item.archived),
-            ),
-        )
+        await db.execute(INSERT_ITEM_SQL, _item_insert_row(item, self._quantize))
+        await db.commit()
+
+    async def save_items(self, items: list[MemoryItem]) -> None:
+        if not items:
+            return
+        db = await self._conn()
+        await db.executemany(INSERT_ITEM_SQL, [_item_insert_row(item, self._quantize) for item in items])
         await db.commit()
 
     async def get_items(self, user_id: str, category: str | None = None, limit: int = 100) -> list[MemoryItem]:
@@ -187,7 +407,7 @@ class SQLiteStore:
                 "SELECT * FROM items WHERE user_id = ? AND archived = 0 ORDER BY created_at DESC LIMIT ?",
                 (user_id, limit),
             )
-        return [_row_to_item(row) async for row in cur]
+        return [_row_to_item(row) for row in await cur.fetchall()]
 
     async def get_item_by_id(self, item_id: str) -> MemoryItem | None:
         db = await self._conn()
@@ -198,30 +418,140 @@ class SQLiteStore:
         row = await cur.fetchone()
         return _row_to_item(row) if row else None
 
+    async def get_items_by_ids(self, item_ids: list[str]) -> list[MemoryItem]:
+        if not item_ids:
+            return []
+        db = await self._conn()
+        placeholders = ",".join("?" * len(item_ids))
+        cur = await db.execute(
+            f"SELECT * FROM items WHERE id IN ({placeholders}) AND archived = 0",
+            item_ids,
+        )
+        return [_row_to_item(row) for row in await cur.fetchall()]
+
     async def search_items(self, user_id: str, query: str) -> list[MemoryItem]:
         terms = _keyword_terms(query)
         if not terms:
             return []
         db = await self._conn()
-        clauses = " OR ".join("content LIKE ?" for _ in terms)
+        if self._fts:
+            match = _fts_query(terms)
+            if not match:
+                return []
+            cur = await db.execute(
+                "SELECT i.* FROM items_fts f JOIN items i ON i.rowid = f.rowid "
+                "WHERE items_fts MATCH ? AND i.user_id = ? AND i.archived = 0 "
+                "ORDER BY bm25(items_fts) LIMIT 50",
+                (match, user_id),
+            )
+            return [_row_to_item(row) for row in await cur.fetchall()]
+        clauses = " OR ".join(["content LIKE ?"] * len(terms))
         params = [user_id] + [f"%{t}%" for t in terms]
         sql = (
             "SELECT * FROM items WHERE user_id = ? AND archived = 0 "
             f"AND ({clauses}) ORDER BY created_at DESC LIMIT 50"
         )
         cur = await db.execute(sql, params)
-        return [_row_to_item(row) async for row in cur]
+        return [_row_to_item(row) for row in await cur.fetchall()]
+
+    async def search_items_decayed(
+        self,
+        user_id: str,
+        query: str,
+        *,
+        score: float,
+        half_life_days: float,
+        access_weight: float,
+        now: datetime,
+        limit: int = 50,
+    ) -> list[tuple[MemoryItem, float]]:
+        # Same matching as search_items, ranked by the recency-decayed score
+        # so the LIMIT keeps the hits retrieval would rank highest.
+        terms = _keyword_terms(query)
+        if not terms:
+            return []
+        db = await self._conn()
+        decayed = (
+            "? / (1.0 + (julianday(?) - (julianday(i.created_at) + "
+            "MAX(julianday(i.accessed_at) - julianday(i.created_at), 0) * ?)) / ?) AS decayed"
+        )
+        params: list = [score, _ts(now), access_weight, half_life_days]
+        if self._fts:
+            match = _fts_query(terms)
+            if not match:
+                return []
+            sql = (
+                f"SELECT i.*, {decayed} FROM items_fts f JOIN items i ON i.rowid = f.rowid "
+                "WHERE items_fts MATCH ? AND i.user_id = ? AND i.archived = 0 "
+                "ORDER BY decayed DESC LIMIT ?"
+            )
+            params += [match, user_id, limit]
+        else:
+            clauses = " OR ".join(["i.content LIKE ?"] * len(terms))
+            sql = (
+                f"SELECT i.*, {decayed} FROM items i WHERE i.user_id = ? AND i.archived = 0 "
+                f"AND ({clauses}) ORDER BY decayed DESC LIMIT ?"
+            )
+            params += [user_id, *[f"%{t}%" for t in terms], limit]
+        cur = await db.execute(sql, params)
+        return [(_row_to_item(row), row["decayed"]) for row in await cur.fetchall()]
 
     async def update_item(self, item: MemoryItem) -> None:
         db = await self._conn()
-        await db.execute(
-            "UPDATE items SET content=?, category=?, embedding=?, access_count=?, accessed_at=?, archived=? WHERE id=?",
-            (
-                item.content, item.category,
-                json.dumps(item.embedding) if item.embedding else None,
-                item.access_count, _ts(item.accessed_at), int(item.archived), item.id,
-            ),
-        )
+        await db.execute(UPDATE_ITEM_SQL, _item_update_row(item, self._quantize))
+        await db.commit()
+
+    async def update_items(self, items: list[MemoryItem]) -> None:
+        if not items:
+            return
+        db = await self._conn()
+        await db.executemany(UPDATE_ITEM_SQL, [_item_update_row(item, self._quantize) for item in items])
+        await db.commit()
+
+    async def touch_items(self, item_ids: list[str], at: datetime) -> None:
+        # Increment in SQL so concurrent retrieves cannot lose each other's hits;
+        # an id listed k times gains k accesses.
+        if not item_ids:
+            return
+        for item_id, n in Counter(item_ids).items():
+            count, last = self._touches.get(item_id, (0, at))
+            self._touches[item_id] = (count + n, max(last, at))
+        if len(self._touches) >= self._TOUCH_FLUSH_MAX:
+            await self._conn()
+        elif self._touch_flusher is None or self._touch_flusher.done():
+            self._touch_flusher = asyncio.ensure_future(self._flush_touches_later())
+
+    async def _flush_touches_later(self) -> None:
+        # Flushes on cancellation too, so touches still land when the loop
+        # shuts down (asyncio.run cancels and awaits leftover tasks) without
+        # close() having been called.
+        try:
+            await asyncio.sleep(self._TOUCH_FLUSH_DELAY)
+        finally:
+            if self._touches or self._touch_writes:
+                await self._conn()
+
+    async def _flush_touches(self, db: aiosqlite.Connection) -> None:
+        # Swap first so touches arriving mid-flush wait for the next one. The
+        # write is shielded so cancelling a delayed flush cannot drop it.
+        touches, self._touches = self._touches, {}
+        task = asyncio.ensure_future(self._write_touches(db, touches))
+        self._touch_writes.add(task)
+        task.add_done_callback(self._touch_writes.discard)
+        await asyncio.shield(task)
+
+    async def _write_touches(self, db: aiosqlite.Connection, touches: dict[str, tuple[int, datetime]]) -> None:
+        # One UPDATE per distinct (hits, time); usually a handful at most.
+        groups: dict[tuple[int, str], list[str]] = {}
+        for item_id, (n, at) in touches.items():
+            groups.setdefault((n, _ts(at)), []).append(item_id)
+        for (n, stamp), ids in groups.items():
+            placeholders = ",".join("?" * len(ids))
+            await db.execute(
+                "UPDATE items SET access_count = access_count + ?, accessed_at = ? "
+                f"WHERE id IN ({placeholders})",
+                (n, stamp, *ids),
+            )
         await db.commit()
 
     async def delete_items(self, item_ids: list[str]) -> None:
@@ -232,6 +562,14 @@ class SQLiteStore:
         await db.execute(f"DELETE FROM items WHERE id IN ({placeholders})", item_ids)
         await db.commit()
 
+    async def bulk_archive(self, item_ids: list[str]) -> None:
+        if not item_ids:
+            return
+        db = await self._conn()
+        placeholders = ",".join("?" * len(item_ids))
+        await db.execute(f"UPDATE items SET archived = 1 WHERE id IN ({placeholders})", item_ids)
+        await db.commit()
+
     async def get_items_older_than(self, user_id: str, days: int) -> list[MemoryItem]:
         db = await self._conn()
         cutoff = _ts(_now().replace(day=_now().day))  # simplified
@@ -241,7 +579,7 @@ class SQLiteStore:
             "SELECT * FROM items WHERE user_id = ? AND archived = 0 AND created_at < ? ORDER BY created_at",
             (user_id, cutoff),
         )
-        return [_row_to_item(row) async for row in cur]
+        return [_row_to_item(row) for row in await cur.fetchall()]
 
     async def get_items_not_accessed_since(self, user_id: str, days: int) -> list[MemoryItem]:
         from datetime import timedelta
@@ -251,7 +589,7 @@ class SQLiteStore:
             "SELECT * FROM items WHERE user_id = ? AND archived = 0 AND accessed_at < ?",
             (user_id, cutoff),
         )
-        return [_row_to_item(row) async for row in cur]
+        return [_row_to_item(row) for row in await cur.fetchall()]
 
     async def get_high_access_items(self, user_id: str, min_count: int = 5) -> list[MemoryItem]:
         db = await self._conn()
@@ -259,14 +597,74 @@ class SQLiteStore:
             "SELECT * FROM items WHERE user_id = ? AND archived = 0 AND access_count >= ? ORDER BY access_count DESC",
             (user_id, min_count),
         )
-        return [_row_to_item(row) async for row in cur]
+        return [_row_to_item(row) for row in await cur.fetchall()]
 
     async def get_all_items(self, user_id: str) -> list[MemoryItem]:
         db = await self._conn()
         cur = await db.execute(
             "SELECT * FROM items WHERE user_id = ? AND archived = 0", (user_id,)
         )
-        return [_row_to_item(row) async for row in cur]
+        return [_row_to_item(row) for row in await cur.fetchall()]
+
+    async def get_embedding_matrix(self, user_id: str) -> tuple[list[str], np.ndarray]:
+        db = await self._conn()
+        cur = await db.execute(
+            "SELECT id, embedding, embedding_f32, embedding_i8 FROM items WHERE user_id = ? "
+            "AND archived = 0 AND COALESCE(embedding_f32, embedding_i8, embedding) IS NOT NULL",
+            (user_id,),
+        )
+        rows = await cur.fetchall()
+        ids: list[str] = []
+        mat: np.ndarray | None = None
+        for row in rows:
+            vec = _load_embedding(row)
+            if mat is None:
+                mat = np.empty((len(rows), vec.shape[0]), dtype=np.float32)
+            if vec.shape[0] != mat.shape[1]:
+                continue
+            mat[len(ids)] = vec
+            ids.append(row["id"])
+        if mat is None:
+            return [], np.empty((0, 0), dtype=np.float32)
+        return ids, mat[:len(ids)]
+
+    async def get_stale_embedding_ids(self, user_id: str) -> set[str]:
+        # Items with no embedding, or whose content changed after it was embedded.
+        db = await self._conn()
+        cur = await db.execute(
+            "SELECT id, content, embedded_hash FROM items WHERE user_id = ? AND archived = 0",
+            (user_id,),
+        )
+        return {
+            row["id"] for row in await cur.fetchall()
+            if row["embedded_hash"] != _content_hash(row["content"])
+        }
+
+    async def get_item_ids_updated_since(self, user_id: str, since: datetime) -> set[str]:
+        db = await self._conn()
+        cur = await db.execute(
+            "SELECT id FROM items WHERE user_id = ? AND archived = 0 "
+            "AND (updated_at IS NULL OR updated_at > ?)",
+            (user_id, _ts(since)),
+        )
+        return {row["id"] for row in await cur.fetchall()}
+
+    async def load_merge_scan_at(self, user_id: str) -> datetime | None:
+        db = await self._conn()
+        cur = await db.execute(
+            "SELECT last_merge_scan_at FROM maintenance_state WHERE user_id = ?", (user_id,)
+        )
+        row = await cur.fetchone()
+        return _parse_ts(row["last_merge_scan_at"]) if row and row["last_merge_scan_at"] else None
+
+    async def save_merge_scan_at(self, user_id: str, at: datetime) -> None:
+        db = await self._conn()
+        await db.execute(
+            "INSERT INTO maintenance_state (user_id, last_merge_scan_at) VALUES (?, ?) "
+            "ON CONFLICT(user_id) DO UPDATE SET last_merge_scan_at = excluded.last_merge_scan_at",
+            (user_id, _ts(at)),
+        )
+        await db.commit()
 
     # ── Categories ──
 
@@ -324,12 +722,49 @@ class SQLiteStore:
             return None
         return _parse_ts(row["persistent_updated_at"])
 
+    async def load_summaries(
+        self, user_id: str, categories: list[str]
+    ) -> dict[str, tuple[str | None, str | None]]:
+        if not categories:
+            return {}
+        db = await self._conn()
+        placeholders = ",".join("?" * len(categories))
+        cur = await db.execute(
+            f"SELECT category, summary, persistent_summary FROM categories "
+            f"WHERE user_id = ? AND category IN ({placeholders})",
+            (user_id, *categories),
+        )
+        return {
+            row["category"]: (row["summary"], row["persistent_summary"] or None)
+            for row in await cur.fetchall()
+        }
+
+    async def load_persistent_summaries(
+        self, user_id: str, categories: list[str]
+    ) -> dict[str, tuple[str | None, datetime | None]]:
+        if not categories:
+            return {}
+        db = await self._conn()
+        placeholders = ",".join("?" * len(categories))
+        cur = await db.execute(
+            f"SELECT category, persistent_summary, persistent_updated_at FROM categories "
+            f"WHERE user_id = ? AND category IN ({placeholders})",
+            (user_id, *categories),
+        )
+        return {
+            row["category"]: (
+                row["persistent_summary"] or None,
+                _parse_ts(row["persistent_updated_at"]) if row["persistent_updated_at"] else None,
+            )
+            for row in await cur.fetchall()
+        }
+
     async def list_categories(self, user_id: str) -> list[str]:
         db = await self._conn()
         cur = await db.execute(
             "SELECT category FROM categories WHERE user_id = ? ORDER BY category", (user_id,)
         )
-        return [row["category"] async for row in cur]
+        return [row["category"] for row in await cur.fetchall()]
 
     # ── Checkpoints ──
 
@@ -337,7 +772,7 @@ class SQLiteStore:
         db = await self._conn()
         await db.execute(
             "INSERT OR REPLACE INTO checkpoints (thread_id, step_id, state, timestamp) VALUES (?, ?, ?, ?)",
-            (checkpoint.thread_id, checkpoint.step_id, json.dumps(checkpoint.state), _ts(checkpoint.timestamp)),
+            (checkpoint.thread_id, checkpoint.step_id, _json.dumps(checkpoint.state), _ts(checkpoint.timestamp)),
         )
         await db.commit()
 
@@ -348,12 +783,7 @@ class SQLiteStore:
             (thread_id,),
         )
         row = await cur.fetchone()
-        if not row:
-            return None
-        return Checkpoint(
-            thread_id=row["thread_id"], step_id=row["step_id"],
-            state=json.loads(row["state"]), timestamp=_parse_ts(row["timestamp"]),
-        )
+        return _row_to_checkpoint(row) if row else None
 
     async def get_checkpoint_at_step(self, thread_id: str, step_id: str) -> Checkpoint | None:
         db = await self._conn()
@@ -362,36 +792,27 @@ class SQLiteStore:
             (thread_id, step_id),
         )
         row = await cur.fetchone()
-        if not row:
-            return None
-        return Checkpoint(
-            thread_id=row["thread_id"], step_id=row["step_id"],
-            state=json.loads(row["state"]), timestamp=_parse_ts(row["timestamp"]),
-        )
+        return _row_to_checkpoint(row) if row else None
 
     async def list_checkpoint_steps(self, thread_id: str) -> list[str]:
         db = await self._conn()
         cur = await db.execute(
             "SELECT step_id FROM checkpoints WHERE thread_id = ? ORDER BY timestamp", (thread_id,)
         )
-        return [row["step_id"] async for row in cur]
+        return [row["step_id"] for row in await cur.fetchall()]
 
     # ── Triplets ──
 
     async def save_triplet(self, user_id: str, triplet: Triplet) -> None:
         db = await self._conn()
-        await db.execute(
-            "INSERT INTO triplets (user_id, subject, predicate, object, timestamp, active, status) VALUES (?, ?, ?, ?, ?, ?, ?)",
-            (
-                user_id,
-                triplet.subject,
-                triplet.predicate,
-                triplet.object,
-                _ts(triplet.timestamp),
-                int(triplet.active),
-                triplet.status,
-            ),
-        )
+        await db.execute(INSERT_TRIPLET_SQL, _triplet_row(user_id, triplet))
+        await db.commit()
+
+    async def save_triplets(self, user_id: str, triplets: list[Triplet]) -> None:
+        if not triplets:
+            return
+        db = await self._conn()
+        await db.executemany(INSERT_TRIPLET_SQL, [_triplet_row(user_id, t) for t in triplets])
         await db.commit()
 
     async def get_triplets(self, user_id: str, subject: str | None = None) -> list[Triplet]:
@@ -405,7 +826,7 @@ class SQLiteStore:
             cur = await db.execute(
                 "SELECT * FROM triplets WHERE user_id = ? AND active = 1", (user_id,)
             )
-        return [_row_to_triplet(row) async for row in cur]
+        return [_row_to_triplet(row) for row in await cur.fetchall()]
 
     async def deactivate_triplet(self, user_id: str, subject: str, predicate: str) -> None:
         db = await self._conn()
@@ -417,18 +838,79 @@ class SQLiteStore:
 
     async def _ensure_triplet_status(self, db: aiosqlite.Connection) -> None:
         cur = await db.execute("PRAGMA table_info(triplets)")
-        cols = [row["name"] async for row in cur]
+        cols = [row["name"] for row in await cur.fetchall()]
         if "status" not in cols:
             await db.execute("ALTER TABLE triplets ADD COLUMN status TEXT DEFAULT 'current'")
+        await db.execute(
+            "CREATE INDEX IF NOT EXISTS idx_triplets_active ON triplets(user_id, subject, predicate) WHERE active = 1"
+        )
+        cur = await db.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_triplets_active_unique'"
+        )
+        if await cur.fetchone() is None:
+            # Older databases may hold repeated active facts; keep the newest.
+            await db.execute(
+                "UPDATE triplets SET active = 0 WHERE active = 1 AND id NOT IN ("
+                "SELECT MAX(id) FROM triplets WHERE active = 1 GROUP BY user_id, subject, predicate, object)"
+            )
+            await db.execute(
+                "CREATE UNIQUE INDEX IF NOT EXISTS idx_triplets_active_unique "
+                "ON triplets(user_id, subject, predicate, object) WHERE active = 1"
+            )
 
     async def _ensure_category_persistent(self, db: aiosqlite.Connection) -> None:
         cur = await db.execute("PRAGMA table_info(categories)")
-        cols = [row["name"] async for row in cur]
+        cols = [row["name"] for row in await cur.fetchall()]
         if "persistent_summary" not in cols:
             await db.execute("ALTER TABLE categories ADD COLUMN persistent_summary TEXT")
         if "persistent_updated_at" not in cols:
             await db.execute("ALTER TABLE categories ADD COLUMN persistent_updated_at TEXT")
 
+    async def _ensure_resource_hash(self, db: aiosqlite.Connection) -> None:
+        cur = await db.execute("PRAGMA table_info(resources)")
+        cols = [row["name"] for row in await cur.fetchall()]
+        if "content_hash" not in cols:
+            await db.execute("ALTER TABLE resources ADD COLUMN content_hash TEXT")
+        await db.execute(
+            "CREATE INDEX IF NOT EXISTS idx_resources_hash ON resources(user_id, content_hash)"
+        )
+
+    async def _ensure_item_columns(self, db: aiosqlite.Connection) -> None:
+        cur = await db.execute("PRAGMA table_info(items)")
+        cols = [row["name"] for row in await cur.fetchall()]
+        if "embedding_f32" not in cols:
+            await db.execute("ALTER TABLE items ADD COLUMN embedding_f32 BLOB")
+        if "embedding_i8" not in cols:
+            await db.execute("ALTER TABLE items ADD COLUMN embedding_i8 BLOB")
+        if "updated_at" not in cols:
+            await db.execute("ALTER TABLE items ADD COLUMN updated_at TEXT")
+        if "embedded_hash" not in cols:
+            await db.execute("ALTER TABLE items ADD COLUMN embedded_hash TEXT")
+        if "tokens" not in cols:
+            await db.execute("ALTER TABLE items ADD COLUMN tokens INTEGER")
+
+    async def _ensure_fts(self, db: aiosqlite.Connection) -> bool:
+        # Creates and backfills the FTS mirrors on first use; without FTS5
+        # in the SQLite build, searches keep using LIKE.
+        for table in ("items", "resources"):
+            cur = await db.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (f"{table}_fts",)
+            )
+            if await cur.fetchone():
+                continue
+            try:
+                await db.executescript(FTS_SCHEMA.format(table=table))
+            except sqlite3.OperationalError:
+                return False
+        return True
+
+    async def _ensure_stats(self, db: aiosqlite.Connection) -> None:
+        # Gather planner statistics once per database so the partial indexes
+        # get picked; PRAGMA optimize on close keeps them current afterwards.
+        cur = await db.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'")
+        if await cur.fetchone() is None:
+            await db.execute("ANALYZE")
+
     async def _get_category_row(self, db: aiosqlite.Connection, user_id: str, category: str) -> aiosqlite.Row | None:
         cur = await db.execute(
             "SELECT summary, updated_at, persistent_summary, persistent_updated_at "
@@ -442,4 +924,4 @@ class SQLiteStore:
         cur = await db.execute(
             "SELECT * FROM triplets WHERE user_id = ? AND active = 1", (user_id,)
         )
-        return [_row_to_triplet(row) async for row in cur]
+        return [_row_to_triplet(row) for row in await cur.fetchall()]
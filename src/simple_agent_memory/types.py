@@ -1,12 +1,18 @@
 from __future__ import annotations
 
+import inspect
 from dataclasses import dataclass, field
 from datetime import datetime, timezone
 from typing import Any, Awaitable, Callable, Union
 from uuid import uuid4
 
+import numpy as np
+
+from ._tokens import count_tokens
+
 LLMCallable = Callable[[str], Union[str, Awaitable[str]]]
-EmbedCallable = Callable[[str], Union[list[float], Awaitable[list[float]]]]
+Embedding = Union[list[float], np.ndarray]
+EmbedCallable = Callable[[str], Union[Embedding, Awaitable[Embedding]]]
 
 
 def _now() -> datetime:
@@ -17,6 +23,10 @@ def _id() -> str:
     return uuid4().hex
 
 
+def _is_async_callable(fn: Any) -> bool:
+    return inspect.iscoroutinefunction(fn) or inspect.iscoroutinefunction(getattr(fn, "__call__", None))
+
+
 @dataclass
 class MemoryItem:
     id: str = field(default_factory=_id)
@@ -24,11 +34,12 @@ class MemoryItem:
     content: str = ""
     category: str = "general"
     source_id: str = ""
-    embedding: list[float] | None = None
+    embedding: Embedding | None = None
     access_count: int = 0
     created_at: datetime = field(default_factory=_now)
     accessed_at: datetime = field(default_factory=_now)
     archived: bool = False
+    tokens: int | None = None
 
 
 @dataclass
@@ -58,3 +69,10 @@ class RetrievalResult:
     item_id: str | None = None
     created_at: datetime | None = None
     accessed_at: datetime | None = None
+    token_est: int = -1
+    sort_key: int = 0
+    timestamp_iso: str = ""
+
+    def __post_init__(self) -> None:
+        if self.token_est < 0:
+            self.token_est = count_tokens(self.text)
@@ -1,4 +1,6 @@
-from .base import VectorStore
+from .base import BulkVectorStore, VectorStore
 from .numpy_store import NumpyVectorStore
+from .quantize import dequantize_int8, quantize_int8
+from .usearch_store import USearchVectorStore
 
-__all__ = ["VectorStore", "NumpyVectorStore"]
+__all__ = ["BulkVectorStore", "VectorStore", "NumpyVectorStore", "USearchVectorStore", "quantize_int8", "dequantize_int8"]
@@ -1,6 +1,9 @@
 from __future__ import annotations
 
-from typing import Any, Protocol, runtime_checkable
+from typing import TYPE_CHECKING, Any, Protocol, runtime_checkable
+
+if TYPE_CHECKING:
+    import numpy as np
 
 
 @runtime_checkable
@@ -10,3 +13,12 @@ class VectorStore(Protocol):
     async def delete(self, ids: list[str]) -> None: ...
     async def rebuild(self) -> None: ...
     async def close(self) -> None: ...
+
+
+@runtime_checkable
+class BulkVectorStore(VectorStore, Protocol):
+    # Optional batch and maintenance helpers. Callers look each one up with
+    # getattr and take a slower path (add, or the storage's embeddings) when
+    # it is missing.
+    async def add_many(self, ids: list[str], texts: list[str], embeddings: list[list[float]], metadatas: list[dict[str, Any] | None] | None = None) -> None: ...
+    async def get_normalized_matrix(self, user_id: str) -> tuple[list[str], np.ndarray]: ...
@@ -6,6 +6,8 @@ from typing import Any
 import aiosqlite
 import numpy as np
 
+from .quantize import quantize_int8
+
 SCHEMA = """
 CREATE TABLE IF NOT EXISTS vectors (
     id TEXT PRIMARY KEY,
@@ -15,15 +17,30 @@ CREATE TABLE IF NOT EXISTS vectors (
 );
 """
 
+_SCORE_BLOCK = 4096
+
+
+def _unit_rows(embeddings: np.ndarray) -> np.ndarray:
+    sq = np.einsum("ij,ij->i", embeddings, embeddings)
+    inv = np.divide(1.0, np.sqrt(sq), out=np.zeros_like(sq), where=sq > 0)
+    return embeddings * inv[:, None]
+
 
 class NumpyVectorStore:
-    def __init__(self, db_path: str):
+    def __init__(self, db_path: str, quantize: str | None = None):
+        if quantize not in (None, "int8"):
+            raise ValueError(f"Unsupported quantize mode: {quantize!r}")
         self._db_path = db_path
+        # Disk keeps the raw float32 vectors; memory keeps them unit-normalised
+        # (then int8-quantised with "int8"), so search is a single matvec.
+        self._quantize = quantize
         self._db: aiosqlite.Connection | None = None
         self._ids: list[str] = []
         self._texts: list[str] = []
         self._embeddings: np.ndarray | None = None
         self._metadata: list[dict[str, Any]] = []
+        # Per-key metadata columns for vectorised filtering, built on demand.
+        self._columns: dict[str, np.ndarray] = {}
         self._loaded = False
 
     async def _conn(self) -> aiosqlite.Connection:
@@ -43,37 +60,57 @@ class NumpyVectorStore:
         self._ids = [r["id"] for r in rows]
         self._texts = [r["text"] for r in rows]
         self._embeddings = (
-            np.array([np.frombuffer(r["embedding"], dtype=np.float32) for r in rows])
+            self._encode(_unit_rows(np.array([np.frombuffer(r["embedding"], dtype=np.float32) for r in rows])))
             if rows else None
         )
         self._metadata = [json.loads(r["metadata"]) if r["metadata"] else {} for r in rows]
+        self._columns.clear()
         self._loaded = True
 
     async def add(self, id: str, text: str, embedding: list[float], metadata: dict[str, Any] | None = None) -> None:
+        await self.add_many([id], [text], [embedding], [metadata])
+
+    async def add_many(
+        self,
+        ids: list[str],
+        texts: list[str],
+        embeddings: list[list[float]],
+        metadatas: list[dict[str, Any] | None] | None = None,
+    ) -> None:
+        if not ids:
+            return
+        metadatas = metadatas or [None] * len(ids)
         db = await self._conn()
-        emb = np.array(embedding, dtype=np.float32)
-        meta = json.dumps(metadata) if metadata else None
-        await db.execute(
+        embs = np.array(embeddings, dtype=np.float32).reshape(len(ids), -1)
+        await db.executemany(
             "INSERT OR REPLACE INTO vectors (id, text, embedding, metadata) VALUES (?, ?, ?, ?)",
-            (id, text, emb.tobytes(), meta),
+            [
+                (id, text, emb.tobytes(), json.dumps(meta) if meta else None)
+                for id, text, emb, meta in zip(ids, texts, embs, metadatas)
+            ],
         )
         await db.commit()
 
-        # Update in-memory index
-        if id in self._ids:
-            idx = self._ids.index(id)
-            self._texts[idx] = text
-            self._metadata[idx] = metadata or {}
-            if self._embeddings is not None:
-                self._embeddings[idx] = emb
-        else:
-            self._ids.append(id)
-            self._texts.append(text)
-            self._metadata.append(metadata or {})
+        # Update in-memory index; a repeated id within the batch keeps its last row.
+        self._columns.clear()
+        embs = self._encode(_unit_rows(embs))
+        positions = {id: i for i, id in enumerate(self._ids)}
+        appended: list[int] = []
+        for row in {id: row for row, id in enumerate(ids)}.values():
+            idx = positions.get(ids[row])
+            if idx is None:
+                self._ids.append(ids[row])
+                self._texts.append(texts[row])
+                self._metadata.append(metadatas[row] or {})
+                appended.append(row)
+                continue
+            self._texts[idx] = texts[row]
+            self._metadata[idx] = metadatas[row] or {}
             if self._embeddings is not None:
-                self._embeddings = np.vstack([self._embeddings, emb.reshape(1, -1)])
-            else:
-                self._embeddings = emb.reshape(1, -1)
+                self._embeddings[idx] = embs[row]
+        if appended:
+            new = embs[appended]
+            self._embeddings = new if self._embeddings is None else np.vstack([self._embeddings, new])
 
     async def search(self, embedding: list[float], top_k: int = 20, filter: dict[str, Any] | None = None) -> list[tuple[str, float, dict[str, Any]]]:
         await self._load()
@@ -81,17 +118,19 @@ class NumpyVectorStore:
             return []
 
         query = np.array(embedding, dtype=np.float32)
-        norms = np.linalg.norm(self._embeddings, axis=1) * np.linalg.norm(query)
-        norms = np.where(norms == 0, 1e-10, norms)
-        scores = self._embeddings @ query / norms
+        scores = self._scores(query)
 
         if filter:
             mask = np.ones(len(self._ids), dtype=bool)
             for k, v in filter.items():
-                mask &= np.array([m.get(k) == v for m in self._metadata])
+                mask &= self._column(k) == v
             scores = np.where(mask, scores, -1.0)
 
-        top_indices = np.argsort(scores)[::-1][:top_k]
+        k = min(top_k, len(scores))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top_indices = top[np.argsort(-scores[top], kind="stable")]
         results: list[tuple[str, float, dict[str, Any]]] = []
         for i in top_indices:
             if scores[i] <= 0:
@@ -101,6 +140,47 @@ class NumpyVectorStore:
             results.append((self._ids[i], float(scores[i]), meta))
         return results
 
+    def _column(self, key: str) -> np.ndarray:
+        col = self._columns.get(key)
+        if col is None:
+            col = self._columns[key] = np.empty(len(self._metadata), dtype=object)
+            col[:] = [m.get(key) for m in self._metadata]
+        return col
+
+    async def get_normalized_matrix(self, user_id: str) -> tuple[list[str], np.ndarray]:
+        # Unit rows of this user's memory items, e.g. for nightly dedup.
+        await self._load()
+        if self._embeddings is None:
+            return [], np.empty((0, 0), dtype=np.float32)
+        rows = [
+            i for i, m in enumerate(self._metadata)
+            if m.get("user_id") == user_id and m.get("type") == "item"
+        ]
+        mat = self._embeddings[rows]
+        if mat.dtype != np.float32:
+            mat = _unit_rows(mat.astype(np.float32))
+        return [self._ids[i] for i in rows], mat
+
+    def _encode(self, embeddings: np.ndarray) -> np.ndarray:
+        if self._quantize == "int8":
+            return quantize_int8(embeddings)[0]
+        return embeddings
+
+    def _scores(self, query: np.ndarray) -> np.ndarray:
+        query_norm = np.sqrt(query @ query)
+        if query_norm == 0:
+            return np.zeros(len(self._embeddings), dtype=np.float32)
+        query = query / query_norm
+        if self._embeddings.dtype == np.float32:
+            return self._embeddings @ query
+        # Quantization rescales each row, so int8 rows are renormalised;
+        # upcast in blocks to avoid a full float32 copy of the matrix.
+        scores = np.empty(len(self._embeddings), dtype=np.float32)
+        for start in range(0, len(scores), _SCORE_BLOCK):
+            block = self._embeddings[start:start + _SCORE_BLOCK].astype(np.float32)
+            scores[start:start + len(block)] = _unit_rows(block) @ query
+        return scores
+
     async def delete(self, ids: list[str]) -> None:
         if not ids:
             return
@@ -0,0 +1,15 @@
+from __future__ import annotations
+
+import numpy as np
+
+
+def quantize_int8(vectors: np.ndarray | list) -> tuple[np.ndarray, np.ndarray]:
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    q = np.rint(vectors / scales[:, None]).astype(np.int8)
+    return q, scales.astype(np.float32)
+
+
+def dequantize_int8(q: np.ndarray, scales: np.ndarray) -> np.ndarray:
+    return q.astype(np.float32) * scales[:, None]
@@ -0,0 +1,198 @@
+from __future__ import annotations
+
+import json
+from typing import Any
+
+import aiosqlite
+import numpy as np
+
+try:
+    from usearch.index import Index
+except ImportError:
+    Index = None
+
+from .numpy_store import SCHEMA, _unit_rows
+
+
+class USearchVectorStore:
+    # HNSW index over the same SQLite table NumpyVectorStore uses; SQLite
+    # stays the source of truth and the graph is rebuilt from it on load.
+    # Filters are applied to an over-fetched candidate list, widened until
+    # top_k matches are found or the index is exhausted.
+    _OVERFETCH = 4
+
+    def __init__(
+        self,
+        db_path: str,
+        connectivity: int = 16,
+        expansion_add: int = 64,
+        expansion_search: int = 100,
+        quantize: str | None = None,
+    ):
+        if quantize not in (None, "int8"):
+            raise ValueError(f"Unsupported quantize mode: {quantize!r}")
+        if Index is None:
+            raise ImportError("USearchVectorStore requires usearch: pip install 'simple-agent-memory[hnsw]'")
+        self._db_path = db_path
+        self._connectivity = connectivity
+        self._expansion_add = expansion_add
+        self._expansion_search = expansion_search
+        self._dtype = "i8" if quantize == "int8" else "f32"
+        self._db: aiosqlite.Connection | None = None
+        self._index: Index | None = None
+        self._keys: dict[str, int] = {}
+        self._rows: dict[int, tuple[str, str, dict[str, Any]]] = {}
+        self._next_key = 0
+        self._loaded = False
+
+    async def _conn(self) -> aiosqlite.Connection:
+        if self._db is None:
+            self._db = await aiosqlite.connect(self._db_path)
+            self._db.row_factory = aiosqlite.Row
+            await self._db.executescript(SCHEMA)
+            await self._db.commit()
+        return self._db
+
+    def _new_index(self, ndim: int) -> Index:
+        return Index(
+            ndim=ndim,
+            metric="cos",
+            dtype=self._dtype,
+            connectivity=self._connectivity,
+            expansion_add=self._expansion_add,
+            expansion_search=self._expansion_search,
+        )
+
+    async def _load(self) -> None:
+        if self._loaded:
+            return
+        db = await self._conn()
+        cur = await db.execute("SELECT id, text, embedding, metadata FROM vectors")
+        rows = await cur.fetchall()
+        self._index = None
+        self._keys.clear()
+        self._rows.clear()
+        self._next_key = 0
+        self._loaded = True
+        if rows:
+            self._insert(
+                [r["id"] for r in rows],
+                [r["text"] for r in rows],
+                np.array([np.frombuffer(r["embedding"], dtype=np.float32) for r in rows]),
+                [json.loads(r["metadata"]) if r["metadata"] else {} for r in rows],
+            )
+
+    def _insert(
+        self, ids: list[str], texts: list[str], embs: np.ndarray, metadatas: list[dict[str, Any]]
+    ) -> None:
+        if self._index is None:
+            self._index = self._new_index(embs.shape[1])
+        # A repeated id keeps its last row; replaced ids get fresh keys.
+        latest = {id: row for row, id in enumerate(ids)}
+        stale = [self._keys[id] for id in latest if id in self._keys]
+        if stale:
+            self._index.remove(np.array(stale, dtype=np.uint64))
+            for key in stale:
+                del self._rows[key]
+        keys = np.arange(self._next_key, self._next_key + len(latest), dtype=np.uint64)
+        self._next_key += len(latest)
+        for key, (id, row) in zip(keys.tolist(), latest.items()):
+            self._keys[id] = key
+            self._rows[key] = (id, texts[row], metadatas[row])
+        self._index.add(keys, _unit_rows(embs[list(latest.values())]))
+
+    async def add(self, id: str, text: str, embedding: list[float], metadata: dict[str, Any] | None = None) -> None:
+        await self.add_many([id], [text], [embedding], [metadata])
+
+    async def add_many(
+        self,
+        ids: list[str],
+        texts: list[str],
+        embeddings: list[list[float]],
+        metadatas: list[dict[str, Any] | None] | None = None,
+    ) -> None:
+        if not ids:
+            return
+        await self._load()
+        metadatas = metadatas or [None] * len(ids)
+        db = await self._conn()
+        embs = np.array(embeddings, dtype=np.float32).reshape(len(ids), -1)
+        await db.executemany(
+            "INSERT OR REPLACE INTO vectors (id, text, embedding, metadata) VALUES (?, ?, ?, ?)",
+            [
+                (id, text, emb.tobytes(), json.dumps(meta) if meta else None)
+                for id, text, emb, meta in zip(ids, texts, embs, metadatas)
+            ],
+        )
+        await db.commit()
+        self._insert(ids, texts, embs, [meta or {} for meta in metadatas])
+
+    async def search(self, embedding: list[float], top_k: int = 20, filter: dict[str, Any] | None = None) -> list[tuple[str, float, dict[str, Any]]]:
+        await self._load()
+        if self._index is None or not self._rows or top_k <= 0:
+            return []
+        query = np.asarray(embedding, dtype=np.float32)
+        if not (query @ query):
+            return []
+        query = query / np.sqrt(query @ query)
+
+        total = len(self._rows)
+        count = min(total, top_k * self._OVERFETCH if filter else top_k)
+        while True:
+            matches = self._index.search(query, count)
+            results: list[tuple[str, float, dict[str, Any]]] = []
+            for key, distance in zip(matches.keys.tolist(), matches.distances.tolist()):
+                row = self._rows.get(key)
+                score = 1.0 - distance
+                if row is None or not score > 0:
+                    continue
+                id, text, meta = row
+                if filter and any(meta.get(k) != v for k, v in filter.items()):
+                    continue
+                meta = dict(meta)
+                meta.setdefault("text", text)
+                results.append((id, score, meta))
+                if len(results) == top_k:
+                    return results
+            if count >= total:
+                return results
+            count = min(total, count * 2)
+
+    async def get_normalized_matrix(self, user_id: str) -> tuple[list[str], np.ndarray]:
+        db = await self._conn()
+        cur = await db.execute("SELECT id, embedding, metadata FROM vectors")
+        ids: list[str] = []
+        vecs: list[np.ndarray] = []
+        for row in await cur.fetchall():
+            meta = json.loads(row["metadata"]) if row["metadata"] else {}
+            if meta.get("user_id") == user_id and meta.get("type") == "item":
+                ids.append(row["id"])
+                vecs.append(np.frombuffer(row["embedding"], dtype=np.float32))
+        if not vecs:
+            return [], np.empty((0, 0), dtype=np.float32)
+        return ids, _unit_rows(np.array(vecs))
+
+    async def delete(self, ids: list[str]) -> None:
+        if not ids:
+            return
+        db = await self._conn()
+        placeholders = ",".join("?" * len(ids))
+        await db.execute(f"DELETE FROM vectors WHERE id IN ({placeholders})", ids)
+        await db.commit()
+        if not self._loaded:
+            return
+        keys = [self._keys.pop(id) for id in ids if id in self._keys]
+        if keys:
+            self._index.remove(np.array(keys, dtype=np.uint64))
+            for key in keys:
+                del self._rows[key]
+
+    async def rebuild(self) -> None:
+        # Fresh graph without the tombstones left by removals.
+        self._loaded = False
+        await self._load()
+
+    async def close(self) -> None:
+        if self._db:
+            await self._db.close()
+            self._db = None
@@ -1,6 +1,8 @@
+import inspect
 import json
 import pytest
 from pathlib import Path
+from typing import Any, Callable
 
 from simple_agent_memory.storage.sqlite_store import SQLiteStore
 from simple_agent_memory.vector.numpy_store import NumpyVectorStore
@@ -30,6 +32,27 @@ async def vector_store(tmp_vec_db):
     await store.close()
 
 
+class BaseStore:
+    """Wraps a store, hiding the optional bulk helpers SQLiteStore adds on top
+    of the Storage protocol."""
+
+    OPTIONAL = frozenset({
+        "save_items", "save_resources", "save_triplets", "find_resource",
+        "get_items_by_ids", "search_items_decayed", "update_items", "touch_items",
+        "bulk_archive", "get_embedding_matrix", "get_stale_embedding_ids",
+        "get_item_ids_updated_since", "load_merge_scan_at", "save_merge_scan_at",
+        "load_summaries", "load_persistent_summaries",
+    })
+
+    def __init__(self, inner):
+        self._inner = inner
+
+    def __getattr__(self, name):
+        if name in self.OPTIONAL:
+            raise AttributeError(name)
+        return getattr(self._inner, name)
+
+
 def make_mock_llm(responses: dict[str, str] | None = None):
     """Creates a mock LLM that returns canned responses based on prompt keywords."""
     default_responses = {
@@ -66,6 +89,27 @@ def make_mock_llm(responses: dict[str, str] | None = None):
     return mock_llm
 
 
+def make_recording_llm(responses: dict[str, str] | Callable[[str], Any] | None = None):
+    """Creates an LLM that records every prompt it is sent.
+
+    Replies come from make_mock_llm(responses), or from responses itself when
+    it is a callable (sync or async). Returns (llm, prompts).
+    """
+    base = responses if callable(responses) else make_mock_llm(responses)
+    prompts: list[str] = []
+
+    if inspect.iscoroutinefunction(base):
+        async def llm(prompt: str) -> str:
+            prompts.append(prompt)
+            return await base(prompt)
+    else:
+        def llm(prompt: str) -> str:
+            prompts.append(prompt)
+            return base(prompt)
+
+    return llm, prompts
+
+
 def make_mock_embed(dim: int = 64):
     """Creates a deterministic mock embedding function."""
     import hashlib
@@ -86,6 +130,11 @@ def mock_llm():
     return make_mock_llm()
 
 
+@pytest.fixture
+def recording_llm():
+    return make_recording_llm()
+
+
 @pytest.fixture
 def mock_embed():
     return make_mock_embed()
@@ -31,3 +31,299 @@ async def test_retrieve_empty_returns_empty(storage, mock_llm):
     fm = FileMemory("u1", storage, mock_llm)
     result = await fm.retrieve("anything")
     assert result == ""
+
+
+@pytest.mark.asyncio
+async def test_memorize_batches_embeddings(storage, vector_store, mock_llm, mock_embed):
+    batches: list[list[str]] = []
+
+    def embed(text: str) -> list[float]:
+        raise AssertionError("memorize should use embed_many")
+
+    def embed_many(texts: list[str]) -> list[list[float]]:
+        batches.append(texts)
+        return [mock_embed(t) for t in texts]
+
+    embed.embed_many = embed_many
+    fm = FileMemory("u1", storage, mock_llm, vector_store=vector_store, embed=embed)
+    items = await fm.memorize("I prefer Python for scripting and I work at Acme")
+
+    assert batches == [[i.content for i in items]]
+    assert all(i.embedding for i in items)
+
+
+@pytest.mark.asyncio
+async def test_retrieve_insufficient_summaries_adds_items(storage):
+    from tests.conftest import make_mock_llm
+
+    llm = make_mock_llm({"enough information": "NO", "Convert this user": "Python"})
+    fm = FileMemory("u1", storage, llm)
+    await fm.memorize("I prefer Python for scripting")
+    await MaintenanceRunner(storage, llm).nightly("u1")
+
+    result = await fm.retrieve("Python")
+    assert "## Detailed Items" in result
+    assert "User prefers Python" in result
+
+
+def test_clean_summary_drops_repeated_category_headings():
+    text = "# Work\n\n## work\nWorks at Acme\n# Notes\nlikes tea\n"
+    assert FileMemory._clean_summary("Work", text) == "Works at Acme\n# Notes\nlikes tea"
+    assert FileMemory._clean_summary("Work", text) is FileMemory._clean_summary("Work", text)
+    assert FileMemory._clean_summary("Work", "  ##  Work  \nAcme") == "Acme"
+
+
+@pytest.mark.asyncio
+async def test_retrieve_skips_category_that_fails_to_load(storage, mock_llm, monkeypatch):
+    from tests.conftest import BaseStore
+
+    await storage.save_category("u1", "work", "Works at Acme")
+    await storage.save_category("u1", "health", "Runs daily")
+    original = storage.load_category
+
+    async def flaky_load(user_id: str, category: str):
+        if category == "health":
+            raise RuntimeError("disk error")
+        return await original(user_id, category)
+
+    monkeypatch.setattr(storage, "load_category", flaky_load)
+    fm = FileMemory("u1", BaseStore(storage), mock_llm)
+    result = await fm.retrieve("job", level="summaries", categories=["work", "health"])
+    assert "Works at Acme" in result
+    assert "Runs daily" not in result
+
+
+@pytest.mark.asyncio
+async def test_retrieve_surfaces_bulk_summary_load_errors(storage, mock_llm, monkeypatch):
+    async def broken_batch(user_id: str, categories: list[str]):
+        raise RuntimeError("database is locked")
+
+    monkeypatch.setattr(storage, "load_summaries", broken_batch)
+    fm = FileMemory("u1", storage, mock_llm)
+    with pytest.raises(RuntimeError, match="locked"):
+        await fm.retrieve("job", level="summaries", categories=["work"])
+
+
+@pytest.mark.asyncio
+async def test_memorize_embeds_each_distinct_text_once(storage, vector_store, mock_llm, mock_embed):
+    calls: list[str] = []
+
+    def embed(text: str) -> list[float]:
+        calls.append(text)
+        return mock_embed(text)
+
+    fm = FileMemory("u1", storage, mock_llm, vector_store=vector_store, embed=embed, tool_mode=True)
+    items = await fm.memorize("", items=[{"content": "likes tea"}, {"content": "likes tea"}, {"content": "runs"}])
+
+    assert sorted(calls) == ["likes tea", "runs"]
+    assert items[0].embedding == items[1].embedding
+
+
+def test_format_summaries_orders_and_labels_sections():
+    out = FileMemory._format_summaries({"work": "# work\nAcme", "diet": "Vegan"}, {"work": "Engineer"})
+    assert out == (
+        "## diet\nGeneral summary (all items):\nVegan\n\n"
+        "## work\nGeneral summary (all items):\nAcme\n\n"
+        "Persistent summary (long-lived items):\nEngineer"
+    )
+    assert FileMemory._format_section("work", "Acme", None) is FileMemory._format_section("work", "Acme", None)
+
+
+@pytest.mark.asyncio
+async def test_sufficiency_gate_skips_llm_on_clear_similarity(storage, mock_embed, recording_llm):
+    llm, prompts = recording_llm
+    await storage.save_category("u1", "preferences", "Likes Python")
+    fm = FileMemory("u1", storage, llm, embed=mock_embed, sufficiency_gate=(-1.0, 0.99))
+    assert "Likes Python" in await fm.retrieve("Likes Python", categories=["preferences"])
+    assert not any("enough information" in p for p in prompts)
+
+    fm = FileMemory("u1", storage, llm, embed=mock_embed, sufficiency_gate=(0.99, 1.0))
+    await fm.retrieve("Unrelated question", categories=["preferences"])
+    assert not any("enough information" in p for p in prompts)
+
+
+@pytest.mark.asyncio
+async def test_query_embedded_once_across_gate_and_semantic(storage, vector_store, mock_embed):
+    calls: list[str] = []
+
+    def embed(text: str) -> list[float]:
+        calls.append(text)
+        return mock_embed(text)
+
+    await storage.save_category("u1", "preferences", "Prefers Python")
+    fm = FileMemory("u1", storage, lambda p: "NO", vector_store=vector_store, embed=embed,
+                    sufficiency_gate=(-1.0, 0.99))
+    await fm.retrieve("Likes Python", level="auto_then_semantic", categories=["preferences"],
+                      search_query="Likes Python")
+    await fm.retrieve("Likes Python", level="semantic", search_query="Likes Python")
+    assert calls.count("Likes Python") == 1
+
+
+@pytest.mark.asyncio
+async def test_select_categories_keeps_only_known_names(storage):
+    fm = FileMemory("u1", storage, lambda p: '["work", "unknown", {"x": 1}, "health"]')
+    assert await fm._select_categories("q", ["health", "work"]) == ["work", "health"]
+
+
+@pytest.mark.asyncio
+async def test_resources_level_searches_while_selecting_categories(storage, monkeypatch):
+    import asyncio
+
+    await storage.save_category("u1", "work", "Works at Acme")
+    await storage.save_resource("u1", "Talked about Acme roadmap")
+    events: list[str] = []
+    original = storage.search_resources
+
+    async def search_resources(user_id: str, query: str):
+        events.append("search")
+        return await original(user_id, query)
+
+    async def llm(prompt: str) -> str:
+        await asyncio.sleep(0.01)
+        events.append("llm")
+        return '["work"]'
+
+    monkeypatch.setattr(storage, "search_resources", search_resources)
+    fm = FileMemory("u1", storage, llm)
+    result = await fm.retrieve("roadmap", level="resources", search_query="Acme")
+
+    assert events == ["search", "llm"]
+    assert "Works at Acme" in result and "## Raw Context" in result
+
+
+@pytest.mark.asyncio
+async def test_category_list_is_cached_briefly(storage, mock_llm, monkeypatch):
+    await storage.save_category("u1", "work", "Works at Acme")
+    calls = 0
+    original = storage.list_categories
+
+    async def counting(user_id: str):
+        nonlocal calls
+        calls += 1
+        return await original(user_id)
+
+    monkeypatch.setattr(storage, "list_categories", counting)
+    fm = FileMemory("u1", storage, mock_llm, tool_mode=True)
+    await fm.retrieve("job", level="summaries")
+    await fm.retrieve("job", level="summaries")
+    assert calls == 1
+
+
+@pytest.mark.asyncio
+async def test_async_embed_is_awaited_directly(storage, vector_store, mock_embed):
+    async def embed(text: str) -> list[float]:
+        return mock_embed(text)
+
+    fm = FileMemory("u1", storage, vector_store=vector_store, embed=embed, tool_mode=True)
+    assert fm._embed_is_async
+    await fm.memorize("", items=[{"content": "Likes Python", "category": "preferences"}])
+    assert "Likes Python" in await fm.retrieve("Likes Python", level="semantic")
+
+
+@pytest.mark.asyncio
+async def test_retrieve_cache_reuses_result_until_memorize(storage, monkeypatch):
+    calls = 0
+    original = storage.search_items
+
+    async def counting(user_id: str, query: str):
+        nonlocal calls
+        calls += 1
+        return await original(user_id, query)
+
+    monkeypatch.setattr(storage, "search_items", counting)
+    fm = FileMemory("u1", storage, tool_mode=True, retrieve_cache_ttl=60)
+    await fm.memorize("", items=[{"content": "Likes Python", "category": "preferences"}])
+    first = await fm.retrieve("Python", level="items")
+    assert await fm.retrieve("Python", level="items") == first
+    assert calls == 1
+
+    await fm.memorize("", items=[{"content": "Python 3.12", "category": "preferences"}])
+    assert "Python 3.12" in await fm.retrieve("Python", level="items")
+    assert calls == 2
+
+
+def test_async_callable_objects_are_detected(storage):
+    class Embedder:
+        async def __call__(self, text: str) -> list[float]:
+            return [1.0]
+
+    assert FileMemory("u1", storage, embed=Embedder(), tool_mode=True)._embed_is_async
+    assert not FileMemory("u1", storage, embed=lambda t: [1.0], tool_mode=True)._embed_is_async
+
+
+@pytest.mark.asyncio
+async def test_classify_splits_long_extractions(storage):
+    import json
+
+    from tests.conftest import make_recording_llm
+
+    contents = [f"Fact {i}" for i in range(25)]
+
+    def reply(prompt: str) -> str:
+        if "Extract discrete" in prompt:
+            return json.dumps([{"content": c} for c in contents])
+        batch = [line[2:] for line in prompt.splitlines() if line.startswith("- Fact")]
+        return json.dumps([{"content": c, "category": "notes"} for c in batch])
+
+    llm, prompts = make_recording_llm(reply)
+    fm = FileMemory("u1", storage, llm)
+    items = await fm.memorize("many facts")
+    assert sum("Classify each" in p for p in prompts) == 3
+    assert [i.content for i in items] == contents
+
+
+@pytest.mark.asyncio
+async def test_llm_cache_keys_on_query_and_summaries(storage, mock_embed):
+    from simple_agent_memory.llm_cache import SemanticCache
+    from tests.conftest import make_recording_llm
+
+    llm, prompts = make_recording_llm({"Convert this user": "rephrased"})
+    cache = SemanticCache(mock_embed)
+    fm = FileMemory("u1", storage, llm, llm_cache=cache)
+    assert await fm._is_sufficient("Where do I work?", {"work": "Acme"}, {}) is True
+    assert await fm._is_sufficient("Where do I work?", {"work": "Acme"}, {}) is True
+    assert len(prompts) == 1
+    # Different summaries are a different question, even for the same query.
+    assert await fm._is_sufficient("Where do I work?", {"work": "Initech"}, {}) is True
+    assert len(prompts) == 2
+
+    assert await fm._generate_query("a fresh message") == "rephrased"
+    assert await cache.get("a fresh message", kind="query") == (True, "rephrased")
+
+
+@pytest.mark.asyncio
+async def test_semantic_retrieve_works_without_optional_storage_methods(
+    storage, vector_store, mock_llm, mock_embed
+):
+    from tests.conftest import BaseStore
+
+    def embed(text: str) -> list[float]:
+        # "employer" lands on the Acme item, so only the vector side finds it.
+        return mock_embed("Acme" if "Acme" in text or text == "employer" else text)
+
+    fm = FileMemory("u1", BaseStore(storage), mock_llm, vector_store=vector_store, embed=embed)
+    items = await fm.memorize("I prefer Python for scripting and I work at Acme")
+    acme = next(i for i in items if "Acme" in i.content)
+
+    result = await fm.retrieve("employer", level="semantic", search_query="employer")
+    assert "User works at Acme" in result
+    assert (await storage.get_item_by_id(acme.id)).access_count == 1
+
+    # Keyword hits are decayed in Python when storage cannot do it.
+    result = await fm.retrieve("Python", level="semantic", search_query="Python")
+    assert "User prefers Python" in result
+
+
+@pytest.mark.asyncio
+async def test_select_categories_cache_keys_on_query_and_category_list(storage, mock_embed):
+    from simple_agent_memory.llm_cache import SemanticCache
+    from tests.conftest import make_recording_llm
+
+    llm, prompts = make_recording_llm({"select which": '["work"]'})
+    cache = SemanticCache(mock_embed)
+    fm = FileMemory("u1", storage, llm, llm_cache=cache)
+    assert await fm._select_categories("Where do I work?", ["work", "food"]) == ["work"]
+    assert await fm._select_categories("Where do I work?", ["work", "food"]) == ["work"]
+    assert len(prompts) == 1
+    assert await fm._select_categories("Where do I work?", ["work", "travel"]) == ["work"]
+    assert len(prompts) == 2
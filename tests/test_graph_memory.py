@@ -34,3 +34,147 @@ async def test_conflict_resolution(storage, vector_store, mock_llm, mock_embed):
     triplets = await storage.get_triplets("u1", subject="User")
     active_work = [t for t in triplets if t.predicate == "works_at"]
     assert len(active_work) >= 1
+
+
+@pytest.mark.asyncio
+async def test_vector_search_reuses_query_embedding(storage, vector_store, mock_embed):
+    calls: list[str] = []
+
+    def embed(text: str) -> list[float]:
+        calls.append(text)
+        return mock_embed(text)
+
+    gm = GraphMemory("u1", storage, vector_store, embed=embed, tool_mode=True)
+    await gm.memorize("I prefer Python")
+    for _ in range(2):
+        assert await gm.retrieve("Python?", level="vector_only")
+    assert calls.count("Python?") == 1
+
+
+@pytest.mark.asyncio
+async def test_entity_expansion_follows_each_hop_once(storage, vector_store, mock_embed, monkeypatch):
+    gm = GraphMemory("u1", storage, vector_store, embed=mock_embed, tool_mode=True)
+    await gm.memorize("", triplets=[
+        {"subject": "User", "predicate": "works_at", "object": "Acme"},
+        {"subject": "User", "predicate": "visited", "object": "Acme"},
+        {"subject": "Acme", "predicate": "located_in", "object": "Berlin"},
+        {"subject": "Berlin", "predicate": "in", "object": "Germany"},
+    ])
+    subjects: list[str] = []
+    original = storage.get_triplets
+
+    async def counting(user_id: str, subject: str | None = None):
+        subjects.append(subject)
+        return await original(user_id, subject=subject)
+
+    monkeypatch.setattr(storage, "get_triplets", counting)
+    results = await gm.retrieve("", entities=["User", "User"], level="graph_only", expand="full")
+    texts = [r.text for r in results]
+    assert "Berlin in Germany (current)" in texts
+    assert sorted(subjects) == ["Acme", "Berlin", "User"]
+
+
+@pytest.mark.asyncio
+async def test_skip_duplicates_avoids_reextracting_same_text(storage, vector_store, recording_llm, mock_embed):
+    llm, prompts = recording_llm
+    gm = GraphMemory("u1", storage, vector_store, llm, mock_embed, skip_duplicates=True)
+    assert len(await gm.memorize("I prefer Python and work at Acme")) == 2
+    calls = len(prompts)
+    assert await gm.memorize("I prefer Python and work at Acme") == []
+    assert len(prompts) == calls
+    assert len(await storage.get_triplets("u1")) == 2
+
+
+@pytest.mark.asyncio
+async def test_skip_duplicates_requires_find_resource(storage, vector_store, mock_llm, mock_embed):
+    from simple_agent_memory.long_term.file_memory import FileMemory
+    from tests.conftest import BaseStore
+
+    with pytest.raises(ValueError, match="find_resource"):
+        GraphMemory("u1", BaseStore(storage), vector_store, mock_llm, mock_embed, skip_duplicates=True)
+    with pytest.raises(ValueError, match="find_resource"):
+        FileMemory("u1", BaseStore(storage), mock_llm, skip_duplicates=True)
+
+
+def test_merge_results_dedupes_normalized_text_and_keeps_top_scores():
+    from simple_agent_memory.types import RetrievalResult
+
+    graph = [RetrievalResult(text="User likes tea", score=0.5)]
+    vector = [RetrievalResult(text=f"fact {i}", score=i / 100) for i in range(30)]
+    vector.append(RetrievalResult(text="  user likes TEA ", score=0.9))
+    merged = GraphMemory._merge_results(graph, vector)
+    assert len(merged) == 20
+    assert merged[0].text == "User likes tea"
+    assert [r.score for r in merged] == sorted((r.score for r in merged), reverse=True)
+
+
+@pytest.mark.asyncio
+async def test_predicate_filter_only_runs_for_larger_subgraphs(storage, vector_store, recording_llm, mock_embed):
+    llm, prompts = recording_llm
+    gm = GraphMemory("u1", storage, vector_store, llm, mock_embed)
+    await gm.memorize("I prefer Python and work at Acme")
+    await gm.retrieve("What does the user prefer?", level="graph_only")
+    assert not any("Available predicates" in p for p in prompts)
+
+    extra = [{"subject": "User", "predicate": f"rel_{i}", "object": f"Thing {i}"} for i in range(6)]
+    await GraphMemory("u1", storage, vector_store, embed=mock_embed, tool_mode=True).memorize("", triplets=extra)
+    await gm.retrieve("What does the user prefer?", level="graph_only")
+    assert any("Available predicates" in p for p in prompts)
+
+
+def test_rank_graph_results_orders_by_status_then_score():
+    from simple_agent_memory.types import Triplet
+
+    results = [
+        GraphMemory._graph_result(Triplet("User", "lived_in", "Paris", status="past"), 0.8),
+        GraphMemory._graph_result(Triplet("User", "lives_in", "Berlin", status="uncertain"), 0.8),
+        GraphMemory._graph_result(Triplet("User", "works_at", "Acme"), 0.6),
+        GraphMemory._graph_result(Triplet("User", "likes", "tea"), 0.8),
+    ]
+    ranked = [r.text for r in GraphMemory._rank_graph_results(results)]
+    assert ranked == [
+        "User likes tea (current)",
+        "User works_at Acme (current)",
+        "User lives_in Berlin (uncertain)",
+        "User lived_in Paris (past)",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_memorize_indexes_conversation_after_conflict_checks(storage, vector_store, mock_llm, mock_embed):
+    gm = GraphMemory("u1", storage, vector_store, mock_llm, mock_embed)
+    await gm.memorize("I prefer Python and work at Acme")
+    await gm.memorize("I prefer Python and work at Acme")
+    hits = await vector_store.search(mock_embed("I prefer Python and work at Acme"), top_k=5)
+    assert len(hits) == 2
+
+
+@pytest.mark.asyncio
+async def test_memorize_batch_replaces_conflicts_within_one_call(storage, vector_store, mock_embed):
+    import json
+
+    from tests.conftest import make_mock_llm
+
+    llm = make_mock_llm({
+        "Extract knowledge graph": json.dumps([
+            {"subject": "User", "predicate": "works_at", "object": "Google"},
+            {"subject": "User", "predicate": "works_at", "object": "OpenAI"},
+        ]),
+        "replace": "YES",
+    })
+    gm = GraphMemory("u1", storage, vector_store, llm, mock_embed)
+    saved = await gm.memorize("I worked at Google, now OpenAI")
+
+    assert [t.object for t in saved] == ["Google", "OpenAI"]
+    assert [t.object for t in await storage.get_triplets("u1")] == ["OpenAI"]
+
+
+@pytest.mark.asyncio
+async def test_batch_save_triplets_and_resources(storage):
+    from simple_agent_memory.types import Triplet
+
+    await storage.save_triplets("u1", [Triplet("A", "likes", "B"), Triplet("A", "likes", "C")])
+    assert sorted(t.object for t in await storage.get_triplets("u1", subject="A")) == ["B", "C"]
+
+    ids = await storage.save_resources("u1", ["first text", "second text"])
+    assert [await storage.get_resource(i) for i in ids] == ["first text", "second text"]
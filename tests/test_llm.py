@@ -0,0 +1,213 @@
+import asyncio
+
+import pytest
+
+from simple_agent_memory.llm import invoke, parse_bool_response, parse_json_response
+from simple_agent_memory.llm_cache import SemanticCache
+from tests.conftest import make_recording_llm
+
+
+@pytest.mark.asyncio
+async def test_semantic_cache_skips_llm_on_similar_prompt(mock_embed):
+    cache = SemanticCache(mock_embed, threshold=0.95)
+    llm, calls = make_recording_llm(lambda prompt: '["work"]')
+
+    first = await parse_json_response(llm, "Which categories?", cache=cache)
+    second = await parse_json_response(llm, "Which categories?", cache=cache)
+
+    assert first == second == ["work"]
+    assert len(calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_semantic_cache_separates_kinds(mock_embed):
+    cache = SemanticCache(mock_embed)
+    await cache.put("same prompt", ["x"], kind="json")
+    hit, _ = await cache.get("same prompt", kind="bool")
+    assert not hit
+
+    llm, calls = make_recording_llm(lambda prompt: "YES")
+    assert await parse_bool_response(llm, "same prompt", cache=cache) is True
+    assert await parse_bool_response(llm, "same prompt", cache=cache) is True
+    assert len(calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_semantic_cache_put_replaces_matching_entry(mock_embed):
+    cache = SemanticCache(mock_embed)
+    await cache.put("same prompt", 1)
+    await cache.put("same prompt", 2)
+    await cache.put("same prompt", 3, kind="bool")
+    assert len(cache) == 2
+    assert await cache.get("same prompt") == (True, 2)
+
+
+@pytest.mark.asyncio
+async def test_semantic_cache_roundtrip(tmp_path, mock_embed):
+    cache = SemanticCache(mock_embed, maxsize=2)
+    await cache.put("a", 1)
+    await cache.put("b", 2)
+    await cache.put("c", 3)
+    assert len(cache) == 2
+
+    path = tmp_path / "cache.npz"
+    cache.save(path)
+    restored = SemanticCache(mock_embed, maxsize=2)
+    restored.load(path)
+    assert await restored.get("c") == (True, 3)
+    assert (await restored.get("a"))[0] is False
+
+
+@pytest.mark.asyncio
+async def test_exact_cache_reuses_identical_prompt():
+    llm, calls = make_recording_llm(lambda prompt: "NO")
+    assert await parse_bool_response(llm, "Is it enough?") is False
+    assert await parse_bool_response(llm, "Is it enough?") is False
+    assert len(calls) == 1
+
+    assert await invoke(llm, "Is it enough?") == "NO"
+    assert len(calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_parse_json_strips_fences_and_retries():
+    llm, calls = make_recording_llm(lambda prompt: '```json\n{"a": [1, 2]}\n```')
+    assert await parse_json_response(llm, "fenced") == {"a": [1, 2]}
+
+    responses = iter(["not json", "[1]"])
+    assert await parse_json_response(lambda p: next(responses), "retry") == [1]
+
+
+@pytest.mark.asyncio
+async def test_parse_bool_matches_whole_word_yes():
+    assert await parse_bool_response(lambda p: "yes.", "bool a") is True
+    assert await parse_bool_response(lambda p: "NO, see yesterday's note", "bool b") is False
+
+
+@pytest.mark.asyncio
+async def test_invoke_shares_concurrent_identical_calls():
+    async def reply(prompt: str) -> str:
+        await asyncio.sleep(0.01)
+        return "done"
+
+    llm, calls = make_recording_llm(reply)
+    results = await asyncio.gather(*(invoke(llm, "same") for _ in range(5)))
+    assert results == ["done"] * 5
+    assert len(calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_invoke_runs_sync_llm_off_the_loop():
+    import threading
+
+    loop_thread = threading.get_ident()
+    seen: list[int] = []
+
+    def llm(prompt: str) -> str:
+        seen.append(threading.get_ident())
+        return "ok"
+
+    assert await invoke(llm, "threaded") == "ok"
+    assert seen and seen[0] != loop_thread
+
+
+@pytest.mark.asyncio
+async def test_cancelling_one_caller_keeps_shared_call_for_others():
+    started = asyncio.Event()
+    release = asyncio.Event()
+
+    async def reply(prompt: str) -> str:
+        started.set()
+        await release.wait()
+        return "done"
+
+    llm, calls = make_recording_llm(reply)
+    first = asyncio.create_task(invoke(llm, "shared"))
+    second = asyncio.create_task(invoke(llm, "shared"))
+    await started.wait()
+    first.cancel()
+    await asyncio.sleep(0)
+    release.set()
+
+    assert await second == "done"
+    assert first.cancelled()
+    assert calls == ["shared"]
+
+    release.clear()
+    started.clear()
+    only = asyncio.create_task(invoke(llm, "abandoned"))
+    await started.wait()
+    only.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await only
+    # With no callers left the request itself is cancelled, so a new call starts afresh.
+    release.set()
+    assert await invoke(llm, "abandoned") == "done"
+    assert calls == ["shared", "abandoned", "abandoned"]
+
+
+@pytest.mark.asyncio
+async def test_json_cache_keeps_only_parsed_replies_and_no_strong_refs():
+    import gc
+    import weakref
+
+    replies = iter(["not json", '["fixed"]'])
+    llm, calls = make_recording_llm(lambda prompt: next(replies))
+    assert await parse_json_response(llm, "malformed first") == ["fixed"]
+    assert await parse_json_response(llm, "malformed first") == ["fixed"]
+    assert len(calls) == 2
+
+    ref = weakref.ref(llm)
+    del llm
+    gc.collect()
+    assert ref() is None
+
+
+
+@pytest.mark.asyncio
+async def test_exact_cache_works_for_bound_methods_and_can_be_bypassed():
+    import gc
+    import weakref
+
+    class Client:
+        def __init__(self):
+            self.calls: list[str] = []
+
+        def complete(self, prompt: str) -> str:
+            self.calls.append(prompt)
+            return '["a"]' if "json" in prompt else "YES"
+
+    client = Client()
+    assert await parse_json_response(client.complete, "bound json") == ["a"]
+    assert await parse_json_response(client.complete, "bound json") == ["a"]
+    assert await parse_bool_response(client.complete, "bound bool") is True
+    assert await parse_bool_response(client.complete, "bound bool") is True
+    assert client.calls == ["bound json", "bound bool"]
+
+    # Sampling callers opt out and get a fresh reply each time.
+    assert await parse_json_response(client.complete, "bound json", exact_cache=False) == ["a"]
+    assert await parse_bool_response(client.complete, "bound bool", exact_cache=False) is True
+    assert len(client.calls) == 4
+
+    ref = weakref.ref(client)
+    del client
+    gc.collect()
+    assert ref() is None
+
+@pytest.mark.asyncio
+async def test_invoke_awaits_async_callable_objects():
+    import threading
+
+    loop_thread = threading.get_ident()
+
+    class Client:
+        def __init__(self):
+            self.threads: list[int] = []
+
+        async def __call__(self, prompt: str) -> str:
+            self.threads.append(threading.get_ident())
+            return "object"
+
+    client = Client()
+    assert await invoke(client, "callable object") == "object"
+    assert client.threads == [loop_thread]
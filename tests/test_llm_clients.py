@@ -0,0 +1,125 @@
+import json
+
+import httpx
+import pytest
+
+from simple_agent_memory.llm_clients import _http
+from simple_agent_memory.llm_clients.embeddings import create_ollama_async_embedder
+from simple_agent_memory.llm_clients.ollama import create_ollama_client
+
+
+def _transport(seen: list[dict]):
+    def handler(request: httpx.Request) -> httpx.Response:
+        assert request.headers["content-type"] == "application/json"
+        body = json.loads(request.content)
+        seen.append(body)
+        if "input" in body:
+            return httpx.Response(200, json={"embeddings": [[float(len(t))] for t in body["input"]]})
+        return httpx.Response(200, json={"message": {"content": "hi " + body["messages"][0]["content"]}})
+
+    return httpx.MockTransport(handler)
+
+
+def test_sync_client_posts_encoded_json(monkeypatch):
+    seen: list[dict] = []
+    monkeypatch.setattr(_http, "_CLIENT", httpx.Client(transport=_transport(seen)))
+    assert create_ollama_client("m")("there") == "hi there"
+    assert seen[0]["model"] == "m"
+
+
+@pytest.mark.asyncio
+async def test_async_embedder_posts_encoded_json(monkeypatch):
+    import asyncio
+
+    seen: list[dict] = []
+    monkeypatch.setattr(_http, "_ASYNC_CLIENT", httpx.AsyncClient(transport=_transport(seen)))
+    monkeypatch.setattr(_http, "_ASYNC_LOOP", asyncio.get_running_loop())
+    embed = create_ollama_async_embedder("m")
+    assert await embed.embed_many(["ab", "abcd"]) == [[2.0], [4.0]]
+    assert seen == [{"model": "m", "input": ["ab", "abcd"]}]
+
+
+def test_embedder_as_numpy_returns_cached_float32(monkeypatch):
+    import numpy as np
+    from simple_agent_memory.llm_clients.embeddings import create_ollama_embedder
+
+    seen: list[dict] = []
+    monkeypatch.setattr(_http, "_CLIENT", httpx.Client(transport=_transport(seen)))
+    embed = create_ollama_embedder("m", as_numpy=True)
+    vec = embed("abc")
+    assert isinstance(vec, np.ndarray) and vec.dtype == np.float32
+    assert not vec.flags.writeable
+    assert embed("abc") is vec
+    assert len(seen) == 1
+
+
+def test_anthropic_prompt_cache_marks_template_prefix():
+    from simple_agent_memory.llm_clients.anthropic import _content
+    from simple_agent_memory.prompts import GENERATE_QUERY
+    from simple_agent_memory.prompts._template import compile_prompt
+
+    prompt = compile_prompt(GENERATE_QUERY)(message="where do I work?")
+    assert _content(prompt, False) is prompt
+    prefix, rest = _content(prompt, True)
+    assert prefix["cache_control"] == {"type": "ephemeral"}
+    assert "cache_control" not in rest
+    assert prefix["text"] + rest["text"] == prompt
+    assert _content("free-form", True) == [
+        {"type": "text", "text": "free-form", "cache_control": {"type": "ephemeral"}}
+    ]
+
+
+@pytest.mark.asyncio
+async def test_async_embed_cache_survives_one_caller_being_cancelled():
+    import asyncio
+
+    from simple_agent_memory.llm_clients.embeddings import _cached_async
+
+    started = asyncio.Event()
+    release = asyncio.Event()
+    calls: list[list[str]] = []
+
+    async def embed_many(texts: list[str]) -> list[list[float]]:
+        calls.append(texts)
+        started.set()
+        await release.wait()
+        return [[float(len(t))] for t in texts]
+
+    embed = _cached_async(embed_many, 16)
+    first = asyncio.create_task(embed("x"))
+    await started.wait()
+    second = asyncio.create_task(embed("x"))
+    await asyncio.sleep(0)
+    first.cancel()
+    await asyncio.sleep(0)
+    release.set()
+    assert await second == [1.0]
+    assert first.cancelled()
+    assert calls == [["x"]]
+
+    # Once nobody waits, the request is cancelled and the next call retries.
+    release.clear()
+    lone = asyncio.create_task(embed("yy"))
+    await asyncio.sleep(0)
+    lone.cancel()
+    await asyncio.sleep(0)
+    release.set()
+    assert await embed("yy") == [2.0]
+    assert calls[1:] == [["yy"], ["yy"]]
+
+
+@pytest.mark.asyncio
+async def test_embed_cache_rejects_short_backend_replies():
+    from simple_agent_memory.llm_clients.embeddings import _cached, _cached_async
+
+    async def short_async(texts: list[str]) -> list[list[float]]:
+        return [[1.0]]
+
+    embed = _cached_async(short_async, 16)
+    for _ in range(2):
+        with pytest.raises(ValueError, match="1 vectors for 2 texts"):
+            await embed.embed_many(["a", "b"])
+
+    sync_embed = _cached(lambda texts: [[1.0]], 16)
+    with pytest.raises(ValueError, match="1 vectors for 2 texts"):
+        sync_embed.embed_many(["a", "b"])
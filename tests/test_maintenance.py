@@ -33,3 +33,347 @@ async def test_run_all(storage, mock_llm):
     assert "nightly" in stats
     assert "weekly" in stats
     assert "monthly" in stats
+
+
+def test_duplicate_pairs_upper_triangle_above_threshold():
+    import numpy as np
+
+    from simple_agent_memory.maintenance import _duplicate_pairs
+
+    vecs = np.array([[1, 0], [0.99, 0.01], [0, 1], [0, 2], [0, 0]], dtype=np.float32)
+    assert _duplicate_pairs(vecs, 0.95).tolist() == [[0, 1], [2, 3]]
+
+
+@pytest.mark.asyncio
+async def test_nightly_merges_near_duplicates(storage, mock_llm):
+    items = [
+        MemoryItem(user_id="u1", content="Likes Python", embedding=[1.0, 0.0]),
+        MemoryItem(user_id="u1", content="Likes python", embedding=[0.99, 0.01]),
+        MemoryItem(user_id="u1", content="Likes tea", embedding=[0.0, 1.0]),
+    ]
+    for item in items:
+        await storage.save_item(item)
+    stats = await MaintenanceRunner(storage, mock_llm).nightly("u1")
+    assert stats["merged"] == 1
+    remaining = {i.id for i in await storage.get_all_items("u1")}
+    assert remaining == {items[0].id, items[2].id}
+
+
+def test_duplicate_pairs_int8_matches_float():
+    import numpy as np
+
+    from simple_agent_memory.maintenance import _duplicate_pairs
+
+    rng = np.random.default_rng(0)
+    base = rng.normal(size=(40, 32)).astype(np.float32)
+    vecs = np.concatenate([base, base + rng.normal(scale=0.02, size=base.shape).astype(np.float32)])
+    assert _duplicate_pairs(vecs, 0.95, "int8").tolist() == _duplicate_pairs(vecs, 0.95).tolist()
+    with pytest.raises(ValueError):
+        MaintenanceRunner(None, None, dedup_quantize="int4")
+
+
+@pytest.mark.asyncio
+async def test_nightly_summarizes_merged_items_without_rereading(storage, recording_llm, monkeypatch):
+    items = [
+        MemoryItem(user_id="u1", content="Likes Python", category="prefs", embedding=[1.0, 0.0]),
+        MemoryItem(user_id="u1", content="Likes python", category="prefs", embedding=[0.99, 0.01]),
+    ]
+    for item in items:
+        await storage.save_item(item)
+    llm, prompts = recording_llm
+    reads = 0
+    original = storage.get_all_items
+
+    async def counting(user_id: str):
+        nonlocal reads
+        reads += 1
+        return await original(user_id)
+
+    monkeypatch.setattr(storage, "get_all_items", counting)
+    await MaintenanceRunner(storage, llm).nightly("u1")
+    summary_prompt = prompts[-1]
+    assert "User prefers Python and works at Acme." in summary_prompt
+    assert "Likes python" not in summary_prompt
+    assert reads == 1
+
+
+@pytest.mark.asyncio
+async def test_monthly_reindexes_concurrently(storage, mock_llm, vector_store):
+    import asyncio
+
+    active = peak = 0
+
+    async def embed(text: str) -> list[float]:
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.01)
+        active -= 1
+        return [float(len(text)), 1.0]
+
+    items = [MemoryItem(user_id="u1", content="x" * (i + 1)) for i in range(5)]
+    for item in items:
+        await storage.save_item(item)
+    stats = await MaintenanceRunner(storage, mock_llm, vector_store, embed).monthly("u1")
+    assert stats["reindexed"] == 5
+    assert peak > 1
+    stored = await storage.get_item_by_id(items[2].id)
+    assert stored.embedding == [3.0, 1.0]
+
+
+@pytest.mark.asyncio
+async def test_monthly_prefers_embed_many(storage, mock_llm, vector_store):
+    batches: list[list[str]] = []
+
+    def embed(text: str) -> list[float]:
+        raise AssertionError("per-item embed should not be used")
+
+    def embed_many(texts: list[str]) -> list[list[float]]:
+        batches.append(texts)
+        return [[1.0, 0.0] for _ in texts]
+
+    embed.embed_many = embed_many
+    for i in range(3):
+        await storage.save_item(MemoryItem(user_id="u1", content=f"Item {i}"))
+    await MaintenanceRunner(storage, mock_llm, vector_store, embed).monthly("u1")
+    assert len(batches) == 1 and len(batches[0]) == 3
+
+
+def test_group_pairs_joins_chains_under_lowest_index():
+    import numpy as np
+
+    from simple_agent_memory.maintenance import _group_pairs
+
+    pairs = np.array([[0, 3], [1, 2], [2, 4], [3, 5]], dtype=np.int64)
+    assert _group_pairs(pairs, 7).tolist() == [0, 1, 1, 0, 1, 0, 6]
+    assert _group_pairs(np.empty((0, 2), dtype=np.int64), 2).tolist() == [0, 1]
+
+
+def test_duplicate_pairs_rows_only_scores_given_rows():
+    import numpy as np
+
+    from simple_agent_memory.maintenance import _duplicate_pairs
+
+    vecs = np.array([[1, 0], [0.99, 0.01], [0, 1], [0, 2], [0.98, 0.02]], dtype=np.float32)
+    assert sorted(_duplicate_pairs(vecs, 0.95, rows=np.array([4])).tolist()) == [[0, 4], [1, 4]]
+    assert sorted(_duplicate_pairs(vecs, 0.95, rows=np.array([1, 4])).tolist()) == [[0, 1], [0, 4], [1, 4]]
+    full = _duplicate_pairs(vecs, 0.95).tolist()
+    assert sorted(_duplicate_pairs(vecs, 0.95, rows=np.arange(5)).tolist()) == sorted(full)
+
+
+@pytest.mark.asyncio
+async def test_nightly_only_rescans_updated_items(storage, mock_llm, monkeypatch):
+    import simple_agent_memory.maintenance as maintenance
+
+    seen_rows = []
+    original = maintenance._duplicate_pairs
+
+    def spy(vecs, threshold, quantize=None, rows=None, **kwargs):
+        seen_rows.append(None if rows is None else sorted(rows.tolist()))
+        return original(vecs, threshold, quantize, rows, **kwargs)
+
+    monkeypatch.setattr(maintenance, "_duplicate_pairs", spy)
+    for content, vec in [("Likes tea", [0.0, 1.0]), ("Likes Go", [1.0, 0.0])]:
+        await storage.save_item(MemoryItem(user_id="u1", content=content, embedding=vec))
+    runner = MaintenanceRunner(storage, mock_llm)
+    await runner.nightly("u1")
+
+    new = MemoryItem(user_id="u1", content="Likes go", embedding=[0.99, 0.01])
+    await storage.save_item(new)
+    stats = await runner.nightly("u1")
+
+    assert seen_rows[0] is None
+    assert len(seen_rows[1]) == 1
+    assert stats["merged"] == 1
+
+
+@pytest.mark.asyncio
+async def test_nightly_does_not_rescan_promoted_items(storage, mock_llm, monkeypatch):
+    import simple_agent_memory.maintenance as maintenance
+
+    seen_rows = []
+    original = maintenance._duplicate_pairs
+
+    def spy(vecs, threshold, quantize=None, rows=None, **kwargs):
+        seen_rows.append(None if rows is None else sorted(rows.tolist()))
+        return original(vecs, threshold, quantize, rows, **kwargs)
+
+    monkeypatch.setattr(maintenance, "_duplicate_pairs", spy)
+    hot = MemoryItem(user_id="u1", content="Likes tea", embedding=[0.0, 1.0], access_count=5)
+    await storage.save_item(hot)
+    await storage.save_item(MemoryItem(user_id="u1", content="Likes Go", embedding=[1.0, 0.0]))
+    runner = MaintenanceRunner(storage, mock_llm)
+    for _ in range(3):
+        stats = await runner.nightly("u1")
+        assert stats["promoted"] == 1
+
+    assert seen_rows == [None, [], []]
+
+
+@pytest.mark.asyncio
+async def test_nightly_summarizes_categories_concurrently(storage):
+    import asyncio
+
+    active = peak = 0
+
+    async def llm(prompt: str) -> str:
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.01)
+        active -= 1
+        return "summary"
+
+    for cat in ("work", "food", "travel"):
+        await storage.save_item(MemoryItem(user_id="u1", content=f"About {cat}", category=cat))
+    stats = await MaintenanceRunner(storage, llm).nightly("u1")
+    assert stats["summarized"] == 3
+    assert peak > 1
+    assert await storage.load_category("u1", "food") == "summary"
+
+
+@pytest.mark.asyncio
+async def test_monthly_reembeds_only_changed_content(storage, mock_llm, vector_store):
+    embedded: list[str] = []
+
+    def embed(text: str) -> list[float]:
+        embedded.append(text)
+        return [1.0, float(len(text))]
+
+    kept = MemoryItem(user_id="u1", content="Likes tea", embedding=[0.0, 1.0])
+    edited = MemoryItem(user_id="u1", content="Works at Acme", embedding=[1.0, 0.0])
+    bare = MemoryItem(user_id="u1", content="No vector yet")
+    for item in (kept, edited, bare):
+        await storage.save_item(item)
+    edited.content = "Works at Initech"
+    await storage.update_item(edited)
+
+    stats = await MaintenanceRunner(storage, mock_llm, vector_store, embed).monthly("u1")
+    assert sorted(embedded) == ["No vector yet", "Works at Initech"]
+    assert stats["reembedded"] == 2 and stats["reindexed"] == 3
+    assert await storage.get_stale_embedding_ids("u1") == set()
+
+
+def test_duplicate_pairs_gpu_path_matches_cpu(monkeypatch):
+    from types import SimpleNamespace
+
+    import numpy as np
+
+    import simple_agent_memory.maintenance as maintenance
+
+    rng = np.random.default_rng(0)
+    vecs = rng.normal(size=(40, 8)).astype(np.float32)
+    vecs[5] = vecs[3] * 2
+    vecs[7] = 0
+    expected = maintenance._duplicate_pairs(vecs, 0.95).tolist()
+    expected_int8 = maintenance._duplicate_pairs(vecs, 0.95, "int8").tolist()
+
+    fake_cp = SimpleNamespace(
+        asarray=np.asarray, einsum=np.einsum, where=np.where, sqrt=np.sqrt,
+        triu=np.triu, argwhere=np.argwhere, asnumpy=np.asarray,
+    )
+    monkeypatch.setattr(maintenance, "cp", fake_cp)
+    monkeypatch.setattr(maintenance, "_GPU_MIN_BYTES", 0)
+    monkeypatch.setattr(maintenance, "_GPU_BLOCK", 16)
+    assert maintenance._duplicate_pairs(vecs, 0.95).tolist() == expected
+    assert maintenance._duplicate_pairs(vecs, 0.95, "int8").tolist() == expected_int8
+    assert [3, 5] in expected
+
+
+def test_duplicate_pairs_gpu_failure_falls_back_to_cpu(monkeypatch):
+    from types import SimpleNamespace
+
+    import numpy as np
+
+    import simple_agent_memory.maintenance as maintenance
+
+    rng = np.random.default_rng(1)
+    vecs = rng.normal(size=(30, 8)).astype(np.float32)
+    vecs[4] = vecs[2] * 0.5
+    expected = maintenance._duplicate_pairs(vecs, 0.95, "int8").tolist()
+
+    def no_device(*args, **kwargs):
+        raise RuntimeError("no CUDA device")
+
+    monkeypatch.setattr(maintenance, "cp", SimpleNamespace(asarray=no_device))
+    monkeypatch.setattr(maintenance, "_GPU_MIN_BYTES", 0)
+    assert maintenance._duplicate_pairs(vecs, 0.95, "int8").tolist() == expected
+    assert [2, 4] in expected
+
+
+@pytest.mark.asyncio
+async def test_nightly_uses_vector_store_matrix_when_complete(storage, mock_llm, vector_store, monkeypatch):
+    from simple_agent_memory.maintenance import _item_metadata
+
+    items = [
+        MemoryItem(user_id="u1", content="Likes Python", embedding=[1.0, 0.0]),
+        MemoryItem(user_id="u1", content="Likes python", embedding=[0.99, 0.01]),
+    ]
+    for item in items:
+        await storage.save_item(item)
+        await vector_store.add(item.id, item.content, item.embedding, _item_metadata(item, "u1"))
+
+    async def unexpected(user_id):
+        raise AssertionError("storage matrix should not be read")
+
+    monkeypatch.setattr(storage, "get_embedding_matrix", unexpected)
+    stats = await MaintenanceRunner(storage, mock_llm, vector_store).nightly("u1")
+    assert stats["merged"] == 1
+
+
+def test_vector_db_path_sits_next_to_db():
+    from simple_agent_memory.maintenance import _vector_db_path
+
+    assert _vector_db_path("/data/memory.db") == "/data/memory_vectors.db"
+    assert _vector_db_path("/data/memory") == "/data/memory_vectors.db"
+    assert _vector_db_path("/data/archive.v2.sqlite") == "/data/archive.v2_vectors.sqlite"
+
+
+@pytest.mark.asyncio
+async def test_weekly_appends_to_existing_persistent_summary(storage, mock_llm):
+    from datetime import datetime, timezone
+
+    await storage.save_persistent_category("u1", "work", "Earlier block")
+    old = MemoryItem(user_id="u1", content="Works at Acme", category="work")
+    old.created_at = old.accessed_at = datetime(2020, 1, 1, tzinfo=timezone.utc)
+    await storage.save_item(old)
+    # Make the stored window open far enough back to include the item.
+    db = await storage._conn()
+    await db.execute("UPDATE categories SET persistent_updated_at = '2020-01-15T00:00:00+00:00'")
+    await db.commit()
+
+    stats = await MaintenanceRunner(storage, mock_llm).weekly("u1")
+    assert stats["persistent_appended"] == 1
+    summary = await storage.load_persistent_category("u1", "work")
+    assert summary.startswith("Earlier block\n\n### ")
+
+
+def test_unique_sentences_drops_repeats_across_items():
+    from simple_agent_memory.maintenance import _unique_sentences
+
+    contents = ["Likes Python. Works at Acme!", "likes python.  Lives in Paris", "  "]
+    assert _unique_sentences(contents) == ["Likes Python.", "Works at Acme!", "Lives in Paris"]
+
+
+@pytest.mark.asyncio
+async def test_run_all_works_without_optional_storage_methods(storage, mock_llm, vector_store):
+    from datetime import datetime, timezone
+
+    from tests.conftest import BaseStore
+
+    items = [
+        MemoryItem(user_id="u1", content="Likes Python", category="prefs", embedding=[1.0, 0.0]),
+        MemoryItem(user_id="u1", content="Likes python", category="prefs", embedding=[0.99, 0.01]),
+        MemoryItem(user_id="u1", content="Old fact", category="notes", embedding=[0.0, 1.0]),
+    ]
+    items[2].created_at = items[2].accessed_at = datetime(2020, 1, 1, tzinfo=timezone.utc)
+    for item in items:
+        await storage.save_item(item)
+
+    runner = MaintenanceRunner(BaseStore(storage), mock_llm, vector_store, lambda t: [1.0, 0.5])
+    stats = await runner.run_all("u1")
+    assert stats["nightly"]["merged"] == 1
+    assert stats["weekly"]["persistent_appended"] == 1
+    assert stats["weekly"]["archived"] == 1
+    assert stats["monthly"]["reembedded"] == 1
+    assert [i.id for i in await storage.get_all_items("u1")] == [items[0].id]
@@ -0,0 +1,26 @@
+from string import Formatter
+
+import pytest
+
+import simple_agent_memory.prompts as prompts
+from simple_agent_memory.prompts._template import compile_prompt
+
+
+@pytest.mark.parametrize("name", prompts.__all__)
+def test_compiled_prompt_matches_str_format(name):
+    template = getattr(prompts, name)
+    fields = {f for _, f, _, _ in Formatter().parse(template) if f}
+    values = {f: f"<{f} {{braces}}>" for f in fields}
+    assert compile_prompt(template)(**values) == template.format(**values)
+
+
+def test_compiled_prompt_with_format_spec_keeps_prefix():
+    prompt = compile_prompt("Score: {value:.2f} for {name}")(value=0.5, name="x")
+    assert prompt == "Score: 0.50 for x"
+    assert prompt.stable_prefix == "Score: "
+
+
+def test_compiled_single_field_prompt_formats_non_strings():
+    render = compile_prompt("Items: {n}!")
+    assert render(n=3) == "Items: 3!"
+    assert render(n="x").stable_prefix == "Items: "
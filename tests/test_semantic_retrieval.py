@@ -37,3 +37,201 @@ async def test_semantic_retrieve_includes_vector(storage, vector_store, mock_llm
     result = await fm.retrieve("irrelevant", level="semantic", search_query="Vector text")
 
     assert "Vector text" in result
+
+
+@pytest.mark.asyncio
+async def test_semantic_retrieve_touches_vector_only_hits(storage, vector_store, mock_llm, mock_embed):
+    item = MemoryItem(user_id="u1", content="Enjoys hiking on weekends", category="hobbies")
+    await storage.save_item(item)
+    await vector_store.add(
+        id=item.id,
+        text=item.content,
+        embedding=mock_embed("weekend plans"),
+        metadata={"user_id": "u1", "type": "item"},
+    )
+
+    fm = FileMemory("u1", storage, mock_llm, vector_store=vector_store, embed=mock_embed)
+    result = await fm.retrieve("irrelevant", level="semantic", search_query="weekend plans")
+
+    assert "Enjoys hiking" in result
+    assert (await storage.get_item_by_id(item.id)).access_count == 1
+
+
+@pytest.mark.asyncio
+async def test_then_semantic_counts_hits_from_both_paths(storage, vector_store, mock_llm, mock_embed):
+    item = MemoryItem(user_id="u1", content="User prefers Python for scripting", category="preferences")
+    await storage.save_item(item)
+    await storage.save_category("u1", "preferences", "Likes Python")
+
+    fm = FileMemory("u1", storage, mock_llm, vector_store=vector_store, embed=mock_embed, tool_mode=True)
+    result = await fm.retrieve("q", level="items_then_semantic", search_query="Python")
+
+    assert "## Retrieved Items" in result
+    assert "RELEVANT MEMORIES" in result
+    assert (await storage.get_item_by_id(item.id)).access_count == 2
+
+
+@pytest.mark.asyncio
+async def test_keyword_hits_survive_a_failing_vector_search(storage, vector_store, mock_llm, mock_embed):
+    item = MemoryItem(user_id="u1", content="User prefers Python for scripting", category="preferences")
+    await storage.save_item(item)
+
+    async def broken_search(*args, **kwargs):
+        raise RuntimeError("index unavailable")
+
+    vector_store.search = broken_search
+    fm = FileMemory("u1", storage, mock_llm, vector_store=vector_store, embed=mock_embed)
+    result = await fm.retrieve("irrelevant", level="semantic", search_query="Python")
+
+    assert "User prefers Python" in result
+
+
+def test_decayed_scores_favor_recent_access(storage):
+    from datetime import datetime, timedelta
+
+    from simple_agent_memory.types import RetrievalResult, _now
+
+    now = _now()
+    old = now - timedelta(days=60)
+    fm = FileMemory("u1", storage, tool_mode=True)
+    results = [
+        RetrievalResult(text="stale", score=0.9, created_at=old, accessed_at=old),
+        RetrievalResult(text="used", score=0.9, created_at=old, accessed_at=now),
+        RetrievalResult(text="naive", score=0.9, timestamp=datetime.utcnow()),
+    ]
+    stale, used, naive = fm._decayed_scores(results, now)
+    assert stale < used < naive
+    assert naive == pytest.approx(0.9, rel=1e-3)
+    assert stale == pytest.approx(0.9 / (1 + 60 / fm._DECAY_HALF_LIFE_DAYS), rel=1e-3)
+
+
+@pytest.mark.asyncio
+async def test_vector_metadata_times_prefer_posix_floats(storage, vector_store, mock_embed):
+    fm = FileMemory("u1", storage, vector_store=vector_store, embed=mock_embed, tool_mode=True)
+    [item] = await fm.memorize("", items=[{"content": "Likes Python"}])
+    [(_, _, meta)] = await vector_store.search(mock_embed("Likes Python"), top_k=1)
+    assert meta["created_at_ts"] == item.created_at.timestamp()
+    assert FileMemory._meta_time(meta, "created_at") == item.created_at
+
+    legacy = {"created_at": "2024-01-02T03:04:05"}
+    assert FileMemory._meta_time(legacy, "created_at").isoformat() == "2024-01-02T03:04:05+00:00"
+    assert FileMemory._meta_time(legacy, "accessed_at") is None
+
+
+@pytest.mark.asyncio
+async def test_vector_hits_reuse_stored_iso_timestamp(storage, vector_store, mock_embed):
+    fm = FileMemory("u1", storage, vector_store=vector_store, embed=mock_embed, tool_mode=True)
+    [item] = await fm.memorize("", items=[{"content": "Likes Python"}])
+    [(result, _, _)] = await fm._vector_candidates("Likes Python", item.created_at)
+    assert result.timestamp_iso == item.created_at.isoformat() == result.timestamp.isoformat()
+    assert f"[{item.created_at.isoformat()}]" in FileMemory._format_context([result])
+
+
+@pytest.mark.asyncio
+async def test_vector_hits_decay_from_posix_floats(storage, vector_store, mock_embed, monkeypatch):
+    from datetime import timedelta
+
+    from simple_agent_memory.long_term import file_memory
+
+    fm = FileMemory("u1", storage, vector_store=vector_store, embed=mock_embed, tool_mode=True)
+    [item] = await fm.memorize("", items=[{"content": "Likes Python"}])
+    later = item.created_at + timedelta(days=30)
+    [(result, _, _)] = await fm._vector_candidates("Likes Python", later)
+    expected = fm._decayed_scores([result], later)[0]
+
+    def no_round_trip(dt):
+        raise AssertionError("POSIX metadata should not go through datetime")
+
+    monkeypatch.setattr(file_memory, "_posix", no_round_trip)
+    [(_, _, decayed)] = await fm._vector_candidates("Likes Python", later)
+    assert decayed == pytest.approx(expected)
+    assert decayed < result.score
+
+
+def test_top_order_matches_full_sort_within_budget():
+    import numpy as np
+
+    rng = np.random.default_rng(0)
+    scores = rng.random(200)
+    tokens = rng.integers(20, 60, size=200)
+    order = FileMemory._top_order(scores, tokens, max_tokens=400)
+    full = np.argsort(-scores, kind="stable")
+    assert len(order) < len(full)
+    assert list(order) == list(full[:len(order)])
+
+
+@pytest.mark.asyncio
+async def test_semantic_context_stops_at_token_budget(storage):
+    for i in range(5):
+        await storage.save_item(MemoryItem(user_id="u1", content=f"Python note {i} " + "x" * 40))
+    fm = FileMemory("u1", storage, tool_mode=True)
+    selected, _ = await fm._semantic_hits("Python", search_query="Python", use_llm_query=False, max_tokens=30)
+    assert len(selected) == 2
+    assert all(r.token_est == len(r.text) >> 2 for r in selected)
+
+
+@pytest.mark.asyncio
+async def test_stored_token_counts_drive_the_budget(storage):
+    item = MemoryItem(user_id="u1", content="Python note " + "x" * 40)
+    await storage.save_item(item)
+    assert (await storage.get_item_by_id(item.id)).tokens == len(item.content) >> 2
+
+    db = await storage._conn()
+    await db.execute("UPDATE items SET tokens = 3 WHERE id = ?", (item.id,))
+    await db.commit()
+    fm = FileMemory("u1", storage, tool_mode=True)
+    selected, _ = await fm._semantic_hits("Python", search_query="Python", use_llm_query=False)
+    assert [r.token_est for r in selected] == [3]
+
+
+@pytest.mark.asyncio
+async def test_generated_search_query_is_reused(storage, recording_llm):
+    llm, prompts = recording_llm
+    fm = FileMemory("u1", storage, llm)
+    await fm.retrieve("Which scripting language again?", level="semantic")
+    await fm.retrieve("Which scripting language again?", level="semantic")
+    assert sum("Convert this user" in p for p in prompts) == 1
+
+
+@pytest.mark.asyncio
+async def test_sql_decay_matches_python_decay(storage):
+    from datetime import timedelta
+
+    from simple_agent_memory.types import RetrievalResult, _now
+
+    now = _now()
+    fm = FileMemory("u1", storage, tool_mode=True)
+    fresh = MemoryItem(user_id="u1", content="Python fresh", created_at=now - timedelta(days=1), accessed_at=now)
+    stale = MemoryItem(
+        user_id="u1", content="Python stale",
+        created_at=now - timedelta(days=90), accessed_at=now - timedelta(days=45),
+    )
+    for item in (stale, fresh):
+        await storage.save_item(item)
+
+    hits = await storage.search_items_decayed(
+        "u1", "python", score=0.8, half_life_days=fm._DECAY_HALF_LIFE_DAYS,
+        access_weight=fm._ACCESS_WEIGHT, now=now,
+    )
+    assert [item.id for item, _ in hits] == [fresh.id, stale.id]
+    expected = fm._decayed_scores(
+        [RetrievalResult(text=i.content, score=0.8, created_at=i.created_at, accessed_at=i.accessed_at)
+         for i, _ in hits],
+        now,
+    )
+    assert [score for _, score in hits] == pytest.approx(expected.tolist(), rel=1e-6)
+
+
+def test_format_context_layout():
+    from datetime import datetime, timezone
+
+    from simple_agent_memory.types import RetrievalResult
+
+    ts = datetime(2024, 1, 2, tzinfo=timezone.utc)
+    memories = [RetrievalResult(text="First", score=0.5, timestamp=ts), RetrievalResult(text="Second", score=1.0, timestamp=ts)]
+    assert FileMemory._format_context(memories) == (
+        "=== RELEVANT MEMORIES ===\n\n"
+        "[2024-01-02T00:00:00+00:00] (confidence: 0.50)\nFirst\n\n"
+        "[2024-01-02T00:00:00+00:00] (confidence: 1.00)\nSecond\n\n"
+        "=== END MEMORIES ==="
+    )
@@ -63,6 +63,20 @@ async def test_checkpoint_roundtrip(storage):
     assert steps == ["s1", "s2"]
 
 
+@pytest.mark.asyncio
+async def test_checkpoint_state_reads_legacy_text_rows(storage):
+    await storage.save_checkpoint(Checkpoint(thread_id="t1", step_id="s1", state={1: "one"}))
+    assert (await storage.get_latest_checkpoint("t1")).state == {"1": "one"}
+
+    db = await storage._conn()
+    await db.execute(
+        "INSERT INTO checkpoints (thread_id, step_id, state, timestamp) VALUES (?, ?, ?, ?)",
+        ("t2", "s1", '{"messages": ["old"]}', "2024-01-01T00:00:00+00:00"),
+    )
+    await db.commit()
+    assert (await storage.get_checkpoint_at_step("t2", "s1")).state == {"messages": ["old"]}
+
+
 @pytest.mark.asyncio
 async def test_triplet_save_and_query(storage):
     t = Triplet(subject="User", predicate="works_at", object="Acme")
@@ -91,3 +105,323 @@ async def test_delete_items(storage):
     remaining = await storage.get_items("u1")
     assert len(remaining) == 1
     assert remaining[0].id == item2.id
+
+
+@pytest.mark.asyncio
+async def test_update_items_bulk(storage):
+    items = [MemoryItem(user_id="u1", content=f"Item {i}", category="test") for i in range(3)]
+    for item in items:
+        await storage.save_item(item)
+    for item in items:
+        item.access_count = 7
+    await storage.update_items(items)
+    stored = await storage.get_items("u1")
+    assert [i.access_count for i in stored] == [7, 7, 7]
+
+
+@pytest.mark.asyncio
+async def test_save_item_accepts_ndarray_embedding(storage):
+    import numpy as np
+
+    item = MemoryItem(user_id="u1", content="vec", embedding=np.array([0.5, 0.25], dtype=np.float32))
+    await storage.save_item(item)
+    stored = await storage.get_item_by_id(item.id)
+    assert stored.embedding == [0.5, 0.25]
+
+
+@pytest.mark.asyncio
+async def test_int8_embeddings_are_compact_and_legacy_json_still_loads(tmp_path):
+    import sqlite3
+
+    from simple_agent_memory.storage import SQLiteStore
+
+    path = tmp_path / "i8.db"
+    store = SQLiteStore(path, quantize="int8")
+    try:
+        item = MemoryItem(user_id="u1", content="vec", embedding=[0.5, -1.0, 0.25, 0.0])
+        await store.save_item(item)
+        stored = await store.get_item_by_id(item.id)
+        assert stored.embedding == pytest.approx([0.5, -1.0, 0.25, 0.0], abs=0.01)
+        assert await store.get_stale_embedding_ids("u1") == set()
+    finally:
+        await store.close()
+
+    conn = sqlite3.connect(path)
+    assert conn.execute("SELECT length(embedding_i8), embedding FROM items").fetchone() == (8, None)
+    conn.execute(
+        "INSERT INTO items (id, user_id, content, embedding, created_at, accessed_at) VALUES "
+        "('old', 'u1', 'legacy', '[1.0, 2.0]', '2024-01-01T00:00:00+00:00', '2024-01-01T00:00:00+00:00')"
+    )
+    conn.commit()
+    conn.close()
+
+    store = SQLiteStore(path)
+    try:
+        assert (await store.get_item_by_id("old")).embedding == [1.0, 2.0]
+    finally:
+        await store.close()
+
+
+@pytest.mark.asyncio
+async def test_save_items_writes_batch(storage):
+    items = [MemoryItem(user_id="u1", content=f"Batch {i}", embedding=[float(i), 1.0]) for i in range(3)]
+    await storage.save_items(items)
+    await storage.save_items([])
+    stored = await storage.get_items_by_ids([i.id for i in items])
+    assert sorted(i.content for i in stored) == ["Batch 0", "Batch 1", "Batch 2"]
+    assert await storage.get_stale_embedding_ids("u1") == set()
+
+
+@pytest.mark.asyncio
+async def test_active_item_queries_use_partial_indexes(storage):
+    db = await storage._conn()
+    cur = await db.execute(
+        "EXPLAIN QUERY PLAN SELECT * FROM items WHERE user_id = ? AND archived = 0 "
+        "AND access_count >= ? ORDER BY access_count DESC",
+        ("u1", 5),
+    )
+    plan = " ".join(row["detail"] for row in await cur.fetchall())
+    assert "idx_items_user_active_count" in plan
+
+
+@pytest.mark.asyncio
+async def test_get_items_by_ids_skips_archived_and_unknown(storage):
+    items = [MemoryItem(user_id="u1", content=f"Item {i}") for i in range(3)]
+    items[2].archived = True
+    for item in items:
+        await storage.save_item(item)
+    found = await storage.get_items_by_ids([items[0].id, items[2].id, "missing", items[1].id])
+    assert {i.id for i in found} == {items[0].id, items[1].id}
+    assert await storage.get_items_by_ids([]) == []
+
+
+@pytest.mark.asyncio
+async def test_touch_items_increments_in_place(storage):
+    from datetime import datetime, timezone
+
+    items = [MemoryItem(user_id="u1", content=f"Item {i}", access_count=3) for i in range(2)]
+    for item in items:
+        await storage.save_item(item)
+    at = datetime(2030, 1, 1, tzinfo=timezone.utc)
+    await storage.touch_items([items[0].id, items[1].id, items[0].id], at)
+    first, second = [await storage.get_item_by_id(i.id) for i in items]
+    assert (first.access_count, second.access_count) == (5, 4)
+    assert first.accessed_at == at
+
+
+@pytest.mark.asyncio
+async def test_load_summaries_batches_both_kinds(storage):
+    await storage.save_category("u1", "work", "Works at Acme")
+    await storage.save_persistent_category("u1", "work", "Prefers async")
+    await storage.save_category("u1", "health", "Runs daily")
+    rows = await storage.load_summaries("u1", ["work", "health", "missing"])
+    assert rows == {"work": ("Works at Acme", "Prefers async"), "health": ("Runs daily", None)}
+    assert await storage.load_summaries("u1", []) == {}
+
+
+@pytest.mark.asyncio
+async def test_find_resource_matches_exact_content_per_user(storage):
+    rid = await storage.save_resource("u1", "Hello there")
+    assert await storage.find_resource("u1", "Hello there") == rid
+    assert await storage.find_resource("u1", "Hello there!") is None
+    assert await storage.find_resource("u2", "Hello there") is None
+
+
+@pytest.mark.asyncio
+async def test_bulk_archive_hides_items(storage):
+    items = [MemoryItem(user_id="u1", content=f"Item {i}") for i in range(3)]
+    for item in items:
+        await storage.save_item(item)
+    await storage.bulk_archive([items[0].id, items[2].id])
+    await storage.bulk_archive([])
+    remaining = await storage.get_items("u1")
+    assert [i.id for i in remaining] == [items[1].id]
+
+
+@pytest.mark.asyncio
+async def test_get_embedding_matrix_is_contiguous_float32(storage):
+    items = [
+        MemoryItem(user_id="u1", content="a", embedding=[1.0, 0.0]),
+        MemoryItem(user_id="u1", content="b"),
+        MemoryItem(user_id="u1", content="c", embedding=[0.5, 0.25]),
+        MemoryItem(user_id="u2", content="d", embedding=[0.0, 1.0]),
+    ]
+    for item in items:
+        await storage.save_item(item)
+    ids, mat = await storage.get_embedding_matrix("u1")
+    assert sorted(ids) == sorted([items[0].id, items[2].id])
+    assert mat.dtype.name == "float32" and mat.flags.c_contiguous
+    assert mat[ids.index(items[2].id)].tolist() == [0.5, 0.25]
+    assert (await storage.get_embedding_matrix("nobody"))[0] == []
+
+
+@pytest.mark.asyncio
+async def test_load_persistent_summaries_includes_timestamps(storage):
+    await storage.save_persistent_category("u1", "work", "Prefers async")
+    await storage.save_category("u1", "health", "Runs daily")
+    rows = await storage.load_persistent_summaries("u1", ["work", "health", "missing"])
+    assert set(rows) == {"work", "health"}
+    assert rows["work"][0] == "Prefers async"
+    assert rows["work"][1] == await storage.load_persistent_updated_at("u1", "work")
+    assert rows["health"] == (None, None)
+
+
+@pytest.mark.asyncio
+async def test_item_search_index_follows_updates_and_deletes(storage):
+    item = MemoryItem(user_id="u1", content="Drinks green tea", category="prefs")
+    other = MemoryItem(user_id="u1", content="Plays chess on weekends", category="hobby")
+    await storage.save_item(item)
+    await storage.save_item(other)
+    await storage.save_item(item)  # INSERT OR REPLACE must not leave a stale entry
+
+    item.content = "Drinks black coffee"
+    await storage.update_item(item)
+    assert await storage.search_items("u1", "tea") == []
+    assert [i.id for i in await storage.search_items("u1", "coffee")] == [item.id]
+
+    await storage.delete_items([other.id])
+    assert await storage.search_items("u1", "chess") == []
+
+
+@pytest.mark.asyncio
+async def test_search_index_backfills_existing_database(tmp_path):
+    import sqlite3
+
+    from simple_agent_memory.storage import SQLiteStore
+
+    path = tmp_path / "legacy.db"
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE items (id TEXT PRIMARY KEY, user_id TEXT NOT NULL, content TEXT NOT NULL, "
+        "category TEXT NOT NULL DEFAULT 'general', source_id TEXT, embedding TEXT, "
+        "access_count INTEGER DEFAULT 0, created_at TEXT NOT NULL, accessed_at TEXT NOT NULL, "
+        "archived INTEGER DEFAULT 0)"
+    )
+    conn.execute(
+        "INSERT INTO items (id, user_id, content, created_at, accessed_at) "
+        "VALUES ('a', 'u1', 'Speaks fluent Portuguese', '2024-01-01T00:00:00+00:00', '2024-01-01T00:00:00+00:00')"
+    )
+    conn.commit()
+    conn.close()
+
+    store = SQLiteStore(path)
+    try:
+        assert [i.id for i in await store.search_items("u1", "portuguese")] == ["a"]
+        assert store._fts
+    finally:
+        await store.close()
+
+
+@pytest.mark.asyncio
+async def test_touches_are_written_behind_in_one_flush(tmp_path):
+    import asyncio
+    from datetime import datetime, timezone
+
+    from simple_agent_memory.storage import SQLiteStore
+
+    store = SQLiteStore(tmp_path / "touch.db")
+    item = MemoryItem(user_id="u1", content="Likes tea")
+    await store.save_item(item)
+    at = datetime(2030, 1, 1, tzinfo=timezone.utc)
+    for _ in range(3):
+        await store.touch_items([item.id], at)
+    assert store._touches[item.id][0] == 3
+
+    await asyncio.sleep(store._TOUCH_FLUSH_DELAY * 3)
+    assert not store._touches
+    assert (await store.get_item_by_id(item.id)).access_count == 3
+
+    await store.touch_items([item.id], at)
+    await store.close()
+    reopened = SQLiteStore(tmp_path / "touch.db")
+    assert (await reopened.get_item_by_id(item.id)).access_count == 4
+    await reopened.close()
+
+
+@pytest.mark.asyncio
+async def test_reads_wait_for_an_in_flight_touch_flush(storage):
+    import asyncio
+    from datetime import datetime, timezone
+
+    item = MemoryItem(user_id="u1", content="Likes tea")
+    await storage.save_item(item)
+    await storage.touch_items([item.id, item.id], datetime(2030, 1, 1, tzinfo=timezone.utc))
+    # The first call starts the flush; the read must not overtake its write.
+    _, stored = await asyncio.gather(storage._conn(), storage.get_item_by_id(item.id))
+    assert stored.access_count == 2
+
+
+def test_touches_are_flushed_when_the_loop_shuts_down_without_close(tmp_path):
+    import asyncio
+    import sqlite3
+    from datetime import datetime, timezone
+
+    from simple_agent_memory.storage import SQLiteStore
+
+    store = SQLiteStore(tmp_path / "shutdown.db")
+    item = MemoryItem(user_id="u1", content="Likes tea")
+
+    async def main():
+        await store.save_item(item)
+        await store.touch_items([item.id], datetime(2030, 1, 1, tzinfo=timezone.utc))
+
+    asyncio.run(main())
+    try:
+        assert not store._touches
+        conn = sqlite3.connect(tmp_path / "shutdown.db")
+        assert conn.execute("SELECT access_count FROM items").fetchone() == (1,)
+        conn.close()
+    finally:
+        asyncio.run(store.close())
+
+
+@pytest.mark.asyncio
+async def test_restated_triplet_refreshes_the_active_row(tmp_path):
+    import sqlite3
+    from datetime import timedelta
+
+    from simple_agent_memory.storage import SQLiteStore
+    from simple_agent_memory.types import Triplet
+
+    path = tmp_path / "triplets.db"
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE triplets (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id TEXT NOT NULL, "
+        "subject TEXT NOT NULL, predicate TEXT NOT NULL, object TEXT NOT NULL, "
+        "timestamp TEXT NOT NULL, active INTEGER DEFAULT 1, status TEXT DEFAULT 'current')"
+    )
+    conn.executemany(
+        "INSERT INTO triplets (user_id, subject, predicate, object, timestamp) VALUES (?, ?, ?, ?, ?)",
+        [("u1", "User", "likes", "Python", "2024-01-01T00:00:00+00:00")] * 2,
+    )
+    conn.commit()
+    conn.close()
+
+    store = SQLiteStore(path)
+    try:
+        [legacy] = await store.get_triplets("u1")
+        later = Triplet("User", "likes", "Python", timestamp=legacy.timestamp + timedelta(days=1), status="past")
+        await store.save_triplet("u1", later)
+        await store.save_triplet("u1", Triplet("User", "likes", "Go"))
+        likes = {t.object: t for t in await store.get_triplets("u1")}
+        assert sorted(likes) == ["Go", "Python"]
+        assert (likes["Python"].timestamp, likes["Python"].status) == (later.timestamp, "past")
+
+        db = await store._conn()
+        cur = await db.execute(
+            "EXPLAIN QUERY PLAN UPDATE triplets SET active = 0 "
+            "WHERE user_id = ? AND subject = ? AND predicate = ? AND active = 1",
+            ("u1", "User", "likes"),
+        )
+        assert "idx_triplets_active" in " ".join(row["detail"] for row in await cur.fetchall())
+    finally:
+        await store.close()
+
+
+def test_bulk_helpers_are_optional_for_storage(storage):
+    from simple_agent_memory.storage import BulkStorage, Storage
+    from tests.conftest import BaseStore
+
+    assert isinstance(storage, BulkStorage)
+    assert isinstance(BaseStore(storage), Storage)
+    assert not isinstance(BaseStore(storage), BulkStorage)
@@ -0,0 +1,161 @@
+import numpy as np
+import pytest
+
+from simple_agent_memory.vector import NumpyVectorStore, dequantize_int8, quantize_int8
+
+
+def test_quantize_int8_roundtrip(mock_embed):
+    vecs = np.array([mock_embed("a"), mock_embed("b"), [0.0] * 64], dtype=np.float32)
+    q, scales = quantize_int8(vecs)
+    assert q.dtype == np.int8
+    restored = dequantize_int8(q, scales)
+    assert np.allclose(restored, vecs, atol=scales.max())
+
+
+@pytest.mark.asyncio
+async def test_int8_store_matches_float_ranking(tmp_path, mock_embed):
+    exact = NumpyVectorStore(str(tmp_path / "f32.db"))
+    quant = NumpyVectorStore(str(tmp_path / "i8.db"), quantize="int8")
+    for i in range(20):
+        text = f"memory {i}"
+        for store in (exact, quant):
+            await store.add(id=str(i), text=text, embedding=mock_embed(text), metadata={"n": i})
+
+    query = mock_embed("memory 7")
+    top_exact = await exact.search(query, top_k=3)
+    top_quant = await quant.search(query, top_k=3)
+    assert top_quant[0][0] == top_exact[0][0] == "7"
+    assert abs(top_quant[0][1] - top_exact[0][1]) < 0.01
+
+    await quant.rebuild()
+    assert quant._embeddings.dtype == np.int8
+    assert (await quant.search(query, top_k=1))[0][0] == "7"
+    await exact.close()
+    await quant.close()
+
+
+def test_unknown_quantize_mode_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        NumpyVectorStore(str(tmp_path / "v.db"), quantize="int4")
+
+
+@pytest.mark.asyncio
+async def test_add_many_matches_reload(tmp_path, mock_embed):
+    store = NumpyVectorStore(str(tmp_path / "v.db"))
+    await store.add(id="a", text="old", embedding=mock_embed("old"))
+    await store.search(mock_embed("old"))
+    await store.add_many(
+        ["a", "b", "b"],
+        ["alpha", "beta", "beta 2"],
+        [mock_embed("alpha"), mock_embed("beta"), mock_embed("beta 2")],
+        [{"n": 1}, {"n": 2}, {"n": 3}],
+    )
+    live = await store.search(mock_embed("beta 2"), top_k=5)
+    await store.rebuild()
+    assert await store.search(mock_embed("beta 2"), top_k=5) == live
+    assert [(rid, meta["text"]) for rid, _, meta in live][:1] == [("b", "beta 2")]
+    assert len(live) <= 2
+    await store.close()
+
+
+@pytest.mark.asyncio
+async def test_normalized_matrix_filters_user_items(tmp_path):
+    for quantize in (None, "int8"):
+        store = NumpyVectorStore(str(tmp_path / f"n{quantize}.db"), quantize=quantize)
+        await store.add("a", "a", [3.0, 4.0], {"user_id": "u1", "type": "item"})
+        await store.add("b", "b", [1.0, 0.0], {"user_id": "u2", "type": "item"})
+        await store.add("c", "c", [0.0, 2.0], {"user_id": "u1", "type": "conversation"})
+        ids, mat = await store.get_normalized_matrix("u1")
+        assert ids == ["a"]
+        assert np.allclose(mat, [[0.6, 0.8]], atol=1e-2)
+        assert (await store.search([3.0, 4.0], top_k=1))[0][0] == "a"
+        await store.close()
+
+
+@pytest.mark.asyncio
+async def test_search_top_k_with_filter_is_ranked(tmp_path):
+    store = NumpyVectorStore(str(tmp_path / "topk.db"))
+    rng = np.random.default_rng(1)
+    vecs = rng.normal(size=(50, 4)).astype(np.float32)
+    await store.add_many(
+        [f"v{i}" for i in range(50)], [f"t{i}" for i in range(50)], vecs,
+        [{"user_id": "u1" if i % 2 else "u2"} for i in range(50)],
+    )
+    query = vecs[7]
+    results = await store.search(query, top_k=5, filter={"user_id": "u1"})
+    unit = vecs / np.linalg.norm(vecs, axis=1, keepdims=True)
+    scores = unit @ (query / np.linalg.norm(query))
+    expected = [f"v{i}" for i in np.argsort(-scores) if i % 2 and scores[i] > 0][:5]
+    assert [rid for rid, _, _ in results] == expected
+    assert all(meta["user_id"] == "u1" for _, _, meta in results)
+    await store.close()
+
+
+class _BruteForceIndex:
+    # Exact stand-in for usearch.index.Index with the calls the store uses.
+    def __init__(self, ndim, metric, dtype, **kwargs):
+        self._vecs: dict[int, np.ndarray] = {}
+
+    def add(self, keys, vectors):
+        self._vecs.update(zip(keys.tolist(), vectors))
+
+    def remove(self, keys):
+        for key in keys.tolist():
+            self._vecs.pop(key)
+
+    def search(self, query, count):
+        from types import SimpleNamespace
+
+        keys = np.array(list(self._vecs), dtype=np.uint64)
+        dists = np.array([1.0 - float(v @ query) for v in self._vecs.values()])
+        order = np.argsort(dists, kind="stable")[:count]
+        return SimpleNamespace(keys=keys[order], distances=dists[order])
+
+
+@pytest.mark.asyncio
+async def test_usearch_store_filters_replaces_and_deletes(tmp_path, monkeypatch):
+    import simple_agent_memory.vector.usearch_store as usearch_store
+
+    monkeypatch.setattr(usearch_store, "Index", _BruteForceIndex)
+    monkeypatch.setattr(usearch_store.USearchVectorStore, "_OVERFETCH", 1)
+    path = str(tmp_path / "hnsw.db")
+    store = usearch_store.USearchVectorStore(path)
+    try:
+        await store.add_many(
+            ["a", "b", "c", "d"], ["A", "B", "C", "D"],
+            [[1.0, 0.0], [0.9, 0.1], [0.8, 0.2], [0.0, 1.0]],
+            [{"user_id": "u2"}, {"user_id": "u2"}, {"user_id": "u1"}, {"user_id": "u1"}],
+        )
+        # The two nearest rows belong to u2, so the candidate list must widen.
+        hits = await store.search([1.0, 0.0], top_k=1, filter={"user_id": "u1"})
+        assert [rid for rid, _, _ in hits] == ["c"]
+
+        await store.add("c", "C2", [0.0, 1.0], {"user_id": "u1"})
+        await store.delete(["a"])
+        hits = await store.search([1.0, 0.0], top_k=3)
+        assert [rid for rid, _, _ in hits] == ["b"]
+    finally:
+        await store.close()
+
+    reopened = usearch_store.USearchVectorStore(path)
+    try:
+        ids = [rid for rid, _, _ in await reopened.search([0.0, 1.0], top_k=5)]
+        # c and d are identical vectors, so their relative order is a tie.
+        assert set(ids[:2]) == {"c", "d"} and ids[2:] == ["b"]
+    finally:
+        await reopened.close()
+
+
+def test_bulk_helpers_are_optional_for_vector_stores(tmp_path):
+    from simple_agent_memory.vector import BulkVectorStore, VectorStore
+
+    class MinimalStore:
+        async def add(self, id, text, embedding, metadata=None): ...
+        async def search(self, embedding, top_k=20, filter=None): return []
+        async def delete(self, ids): ...
+        async def rebuild(self): ...
+        async def close(self): ...
+
+    assert isinstance(MinimalStore(), VectorStore)
+    assert not isinstance(MinimalStore(), BulkVectorStore)
+    assert isinstance(NumpyVectorStore(str(tmp_path / "v.db")), BulkVectorStore)